@@ -0,0 +1,106 @@
+"""
+ai.py
+
+Probability-density AI opponent (requires NumPy).
+
+For every ship still afloat we count, for each cell, how many legal
+placements of that ship would cover it, given what has been revealed.
+Placements that run through unresolved hits are weighted up heavily, so the
+same map drives both hunting (no open hits) and targeting (finishing off a
+damaged ship). Because ships may not touch, the water around a sunk ship is
+ruled out as well.
+"""
+
+import random
+
+import numpy as np
+
+from battleship import BOARD_SIZE, SHIPS
+from simulation import Shooter
+
+UNKNOWN, MISS, HIT, SUNK = 0, 1, 2, 3
+HIT_WEIGHT = 30
+
+
+def _prefix_sums(grid):
+    """Row-wise prefix sums with a leading zero column: (rows, cols + 1)."""
+    out = np.zeros((grid.shape[0], grid.shape[1] + 1), dtype=np.int32)
+    np.cumsum(grid, axis=1, out=out[:, 1:])
+    return out
+
+
+def _coverage(cum_blocked, cum_hits, length):
+    """
+    Per-cell count of horizontal placements of 'length' that avoid every
+    blocked cell, each weighted by how many open hits it covers. Takes the
+    row-wise prefix sums of the blocked and hit masks; one vectorised pass.
+    """
+    rows, cols = cum_blocked.shape[0], cum_blocked.shape[1] - 1
+    if length > cols:
+        return np.zeros((rows, cols), dtype=np.int32)
+    # windows starting at each column: (rows, cols - length + 1)
+    free = (cum_blocked[:, length:] - cum_blocked[:, :-length]) == 0
+    weight = free * (1 + HIT_WEIGHT * (cum_hits[:, length:] - cum_hits[:, :-length]))
+    # spread each window's weight over the cells it covers via a difference array
+    starts = cols - length + 1
+    diff = np.zeros((rows, cols + 1), dtype=np.int32)
+    diff[:, :starts] = weight
+    diff[:, length:length + starts] -= weight
+    return np.cumsum(diff[:, :cols], axis=1)
+
+
+class DensityShooter(Shooter):
+    """Hunt/target shooter driven by a placement-count probability map."""
+
+    def __init__(self, size=BOARD_SIZE, ships=SHIPS, rng=random):
+        super().__init__(size, ships, rng)
+        self.state = np.zeros((size, size), dtype=np.int8)
+        self.sizes = {name: ship_size for name, ship_size in ships}
+        self.remaining = [ship_size for _, ship_size in ships]
+
+    def density(self):
+        """Placement-count map over the board; 0 for cells already resolved."""
+        blocked = (self.state == MISS) | (self.state == SUNK)
+        hits = self.state == HIT
+        rows = (_prefix_sums(blocked), _prefix_sums(hits))
+        cols = (_prefix_sums(blocked.T), _prefix_sums(hits.T))
+        total = np.zeros(self.state.shape, dtype=np.int32)
+        for length in set(self.remaining):
+            count = self.remaining.count(length)
+            total += count * _coverage(*rows, length)
+            total += count * _coverage(*cols, length).T
+        total[self.state != UNKNOWN] = 0
+        return total
+
+    def next_shot(self):
+        density = self.density()
+        best = np.flatnonzero(density == density.max())
+        cell = int(best[self.rng.randrange(len(best))]) if len(best) > 1 else int(best[0])
+        return divmod(cell, self.size)
+
+    def observe(self, row, col, result, sunk_ship_name):
+        if result == 'miss':
+            self.state[row, col] = MISS
+        elif result == 'hit':
+            self.state[row, col] = HIT
+            if sunk_ship_name:
+                self._mark_sunk(row, col, sunk_ship_name)
+
+    def _mark_sunk(self, row, col, ship_name):
+        """
+        Ships never touch, so the run of hits through (row, col) is the ship
+        that just sank; mark it and the water around it as resolved.
+        """
+        ship_size = self.sizes.get(ship_name)
+        if ship_size in self.remaining:
+            self.remaining.remove(ship_size)
+        stack = [(row, col)]
+        while stack:
+            r, c = stack.pop()
+            self.state[r, c] = SUNK
+            for rr, cc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= rr < self.size and 0 <= cc < self.size:
+                    if self.state[rr, cc] == HIT:
+                        stack.append((rr, cc))
+                    elif self.state[rr, cc] == UNKNOWN:
+                        self.state[rr, cc] = MISS
@@ -2,13 +2,15 @@
 battleship.py
 
 Contains core data structures and logic for Battleship, including:
- - Board class for storing ship positions, hits, misses
+ - Board class for storing ship positions, hits, misses (as integer bitboards)
  - Utility function parse_coordinate for translating e.g. 'B5' -> (row, col)
  - A test harness run_single_player_game() to demonstrate the logic in a local, single-player mode
 
 """
 
 import random
+from array import array
+from functools import lru_cache
 
 BOARD_SIZE = 10
 SHIPS = [
@@ -20,18 +22,192 @@ SHIPS = [
 ]
 
 
+@lru_cache(maxsize=None)
+def _edge_masks(size):
+    """
+    Bit masks for a size x size board, where cell (r, c) is bit r*size + c.
+    Returns (full, first_col, last_col); the column masks keep shifted
+    neighbours from wrapping onto the previous / next row.
+    """
+    full = (1 << (size * size)) - 1
+    first_col = 0
+    for r in range(size):
+        first_col |= 1 << (r * size)
+    last_col = first_col << (size - 1)
+    return full, first_col, last_col
+
+
+@lru_cache(maxsize=None)
+def _run_mask(size, ship_size, orientation):
+    """A ship of this length with its first cell at bit 0."""
+    step = 1 if orientation == 0 else size
+    ship = 0
+    for k in range(ship_size):
+        ship |= 1 << (k * step)
+    return ship
+
+
+# bounded: every mask is a size*size-bit int. 8192 entries hold every
+# placement of the standard ship lengths up to CACHED_PLACEMENT_CELLS.
+@lru_cache(maxsize=8192)
+def _segment_masks(size, row, col, ship_size, orientation):
+    """
+    (ship, halo) masks for a ship at (row, col): the cells it covers and
+    their orthogonal neighbours. Assumes the ship fits on the board.
+    """
+    ship = _run_mask(size, ship_size, orientation) << (row * size + col)
+    return ship, _halo(size, ship)
+
+
+def _halo(size, mask):
+    """Orthogonal neighbours of the cells in 'mask', excluding the cells themselves."""
+    full, first_col, last_col = _edge_masks(size)
+    halo = ((mask >> 1) & ~last_col) | ((mask << 1) & ~first_col) \
+        | (mask >> size) | (mask << size)
+    return halo & full & ~mask
+
+
+@lru_cache(maxsize=None)
+def _candidate_placements(size, ship_size):
+    """
+    Every in-bounds placement of a ship of this length as
+    (row, col, orientation, ship_mask, halo_mask).
+    """
+    candidates = []
+    for orientation in (0, 1) if ship_size > 1 else (0,):
+        max_row = size if orientation == 0 else size - ship_size + 1
+        max_col = size - ship_size + 1 if orientation == 0 else size
+        for row in range(max_row):
+            for col in range(max_col):
+                ship, halo = _segment_masks(size, row, col, ship_size, orientation)
+                candidates.append((row, col, orientation, ship, halo))
+    return tuple(candidates)
+
+
+MAX_PLACEMENT_STEPS = 10000
+# boards up to this many cells keep every placement's masks cached (that
+# cache grows with size**4); bigger boards draw placements at random instead
+CACHED_PLACEMENT_CELLS = 32 * 32
+PLACEMENT_SAMPLES = 64
+
+
+def _legal_placements(size, ship_size, blocked, rng):
+    """
+    Yield the placements of a ship of this length that avoid the 'blocked'
+    mask, as (row, col, orientation, ship_mask, halo_mask), in random order.
+    """
+    if ship_size > size:
+        return
+    if size * size <= CACHED_PLACEMENT_CELLS:
+        legal = [cand for cand in _candidate_placements(size, ship_size) if not cand[3] & blocked]
+        while legal:
+            # uniform choice, removed so a backtrack never retries it
+            k = rng.randrange(len(legal))
+            legal[k], legal[-1] = legal[-1], legal[k]
+            yield legal.pop()
+        return
+
+    # Every placement is equally likely to be drawn, so the first legal draw
+    # is a uniform pick among the legal ones. A big board is mostly empty and
+    # a few draws are enough; only a crowded one falls back to a full scan.
+    orientations = (0, 1) if ship_size > 1 else (0,)
+    for _ in range(PLACEMENT_SAMPLES):
+        orientation = rng.choice(orientations)
+        row = rng.randrange(size if orientation == 0 else size - ship_size + 1)
+        col = rng.randrange(size - ship_size + 1 if orientation == 0 else size)
+        ship, halo = _segment_masks(size, row, col, ship_size, orientation)
+        if not ship & blocked:
+            yield row, col, orientation, ship, halo
+    legal = []
+    for orientation in orientations:
+        for row in range(size if orientation == 0 else size - ship_size + 1):
+            for col in range(size - ship_size + 1 if orientation == 0 else size):
+                if not _segment_masks(size, row, col, ship_size, orientation)[0] & blocked:
+                    legal.append((row, col, orientation))
+    rng.shuffle(legal)
+    for row, col, orientation in legal:
+        yield (row, col, orientation) + _segment_masks(size, row, col, ship_size, orientation)
+
+
+def random_layout(size=BOARD_SIZE, ships=SHIPS, rng=random, taken=0, near=0):
+    """
+    Pick a random legal layout for 'ships' and return it as a list of
+    (ship_name, row, col, ship_size, orientation).
+
+    Each ship is drawn uniformly from the placements still legal given the
+    ships before it; if a ship has nowhere left to go we back up and try the
+    previous ship elsewhere. 'taken' / 'near' are masks of cells a ship may
+    not cover / may not be next to. Raises ValueError if the fleet does not
+    fit within MAX_PLACEMENT_STEPS tries.
+    """
+    steps = 0
+    layout = []
+    masks = [(taken, near)]   # taken / near with the first k ships placed
+    pending = []              # per placed-or-placing ship: its untried placements
+    while len(layout) < len(ships):
+        i = len(layout)
+        ship_name, ship_size = ships[i]
+        if len(pending) == i:
+            taken, near = masks[-1]
+            pending.append(_legal_placements(size, ship_size, taken | near, rng))
+        cand = next(pending[-1], None)
+        if cand is None:
+            # nowhere left for this ship: back up and move the previous one
+            pending.pop()
+            if not layout:
+                break
+            layout.pop()
+            masks.pop()
+            continue
+        steps += 1
+        if steps > MAX_PLACEMENT_STEPS:
+            break
+        row, col, orientation, ship, halo = cand
+        taken, near = masks[-1]
+        layout.append((ship_name, row, col, ship_size, orientation))
+        masks.append((taken | ship, near | halo))
+
+    if len(layout) < len(ships):
+        raise ValueError(f"Could not fit {len(ships)} ships on a {size}x{size} board")
+    return layout
+
+
+def random_fleets(n, size=BOARD_SIZE, ships=SHIPS, seed=None):
+    """
+    Bulk version of Board.place_ships_randomly(): return n freshly placed
+    Boards, reproducible for a given seed.
+    """
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(n):
+        board = Board(size)
+        for ship_name, row, col, ship_size, orientation in random_layout(size, ships, rng):
+            board.place_ship(ship_name, row, col, ship_size, orientation)
+        boards.append(board)
+    return boards
+
+
 class Board:
     """
     Represents a single Battleship board with hidden ships.
-    We store:
-      - self.hidden_grid: tracks real positions of ships ('S'), hits ('X'), misses ('o')
-      - self.display_grid: the version we show to the player ('.' for unknown, 'X' for hits, 'o' for misses)
+    The state lives in integer bitboards (bit r*size + c is cell (r, c)):
+      - self.ship_mask: every cell holding a ship
+      - self.hit_mask / self.miss_mask: cells that have been fired at
       - self.placed_ships: a list of dicts, each dict with:
           {
              'name': <ship_name>,
-             'positions': set of (r, c),
+             'mask': the ship's cells as a bitboard,
+             'remaining': number of cells not yet hit,
           }
         used to determine when a specific ship has been fully sunk.
+      - a cell -> ship index (one byte per cell) and a board-wide count of
+        unhit ship cells, so a shot finds its ship and the fleet status in
+        constant time.
+
+    hidden_grid ('S' ships, 'X' hits, 'o' misses, '.' water) and display_grid
+    (no 'S') are read-only list-of-lists copies rendered from the masks on
+    every access; row_symbols() renders a single row. Nothing cell by cell
+    is kept between calls.
 
     In a full 2-player networked game:
       - Each player has their own Board instance.
@@ -41,33 +217,60 @@ class Board:
 
     def __init__(self, size=BOARD_SIZE):
         self.size = size
-        # '.' for empty water
-        self.hidden_grid = [['.' for _ in range(size)] for _ in range(size)]
-        # display_grid is what the player or an observer sees (no 'S')
-        self.display_grid = [['.' for _ in range(size)] for _ in range(size)]
-        self.placed_ships = []  # e.g. [{'name': 'Destroyer', 'positions': {(r, c), ...}}, ...]
-
-    def place_ships_randomly(self, ships=SHIPS):
+        self.ship_mask = 0
+        self.hit_mask = 0
+        self.miss_mask = 0
+        self.placed_ships = []  # e.g. [{'name': 'Destroyer', 'mask': ..., 'remaining': 2}, ...]
+        self.remaining_cells = 0  # unhit ship cells on the whole board
+        self._cell_ship = None    # bit r*size + c -> 1 + index into placed_ships (0: no ship)
+        self._indexed = 0         # how many of placed_ships are in _cell_ship
+
+    @property
+    def hidden_grid(self):
+        return [self.row_symbols(r) for r in range(self.size)]
+
+    @property
+    def display_grid(self):
+        return [self.row_symbols(r, hidden=False) for r in range(self.size)]
+
+    def row_symbols(self, row, hidden=True):
+        """One row of hidden_grid (or of display_grid if not 'hidden'), from the masks."""
+        size = self.size
+        shift = row * size
+        row_bits = (1 << size) - 1
+        hits = self.hit_mask >> shift & row_bits
+        misses = self.miss_mask >> shift & row_bits
+        ships = self.ship_mask >> shift & row_bits if hidden else 0
+        return ['X' if hits >> c & 1 else 'o' if misses >> c & 1 else 'S' if ships >> c & 1 else '.'
+                for c in range(size)]
+
+    def cell_state(self, row, col, hidden=True):
+        """Return one cell's symbol without building the grid views."""
+        bit = 1 << (row * self.size + col)
+        if self.hit_mask & bit:
+            return 'X'
+        if self.miss_mask & bit:
+            return 'o'
+        if hidden and self.ship_mask & bit:
+            return 'S'
+        return '.'
+
+    def place_ships_randomly(self, ships=SHIPS, rng=random):
         """
         Randomly place each ship in 'ships' on the hidden_grid, storing positions for each ship.
         In a networked version, you might parse explicit placements from a player's commands
         (e.g. "PLACE A1 H BATTLESHIP") or prompt the user for board coordinates and placement orientations; 
         the self.place_ships_manually() can be used as a guide.
-        """
-        for ship_name, ship_size in ships:
-            placed = False
-            while not placed:
-                orientation = random.randint(0, 1)  # 0 => horizontal, 1 => vertical
-                row = random.randint(0, self.size - 1)
-                col = random.randint(0, self.size - 1)
 
-                if self.can_place_ship(row, col, ship_size, orientation):
-                    occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
-                    placed = True
+        Placements are drawn from the legal positions left for each ship
+        (see random_layout), so this always finishes quickly; it raises
+        ValueError if the ships cannot fit at all.
+        """
+        taken = self.ship_mask | self.hit_mask | self.miss_mask
+        near = _halo(self.size, self.ship_mask & ~self.hit_mask)
+        for ship_name, row, col, ship_size, orientation in random_layout(
+                self.size, ships, rng, taken, near):
+            self.place_ship(ship_name, row, col, ship_size, orientation)
 
 
     def place_ships_manually(self, ships=SHIPS):
@@ -100,77 +303,123 @@ class Board:
 
                 # Check if we can place the ship
                 if self.can_place_ship(row, col, ship_size, orientation):
-                    occupied_positions = self.do_place_ship(row, col, ship_size, orientation)
-                    self.placed_ships.append({
-                        'name': ship_name,
-                        'positions': occupied_positions
-                    })
+                    self.place_ship(ship_name, row, col, ship_size, orientation)
                     break
                 else:
                     print(f"  [!] Cannot place {ship_name} at {coord_str} (orientation={orientation_str}). Try again.")
 
 
     def can_place_ship(self, row, col, ship_size, orientation):
-            """
-            Check if we can place a ship of length 'ship_size' at (row, col)
-            with the given orientation (0 => horizontal, 1 => vertical).
-            Ensures no overlapping and no orthogonal adjacency to any existing 'S'.
-            """
-            # Boundary check
-            if orientation == 0:  # Horizontal
-                if col + ship_size > self.size:
-                    return False
-                # Check each segment cell and its neighbors
-                for c in range(col, col + ship_size):
-                    # overlap
-                    if self.hidden_grid[row][c] != '.':
-                        return False
-                    # above / below
-                    if row > 0 and self.hidden_grid[row-1][c] == 'S':
-                        return False
-                    if row < self.size-1 and self.hidden_grid[row+1][c] == 'S':
-                        return False
-                # end-caps (left/right of the ship)
-                if col > 0 and self.hidden_grid[row][col-1] == 'S':
-                    return False
-                if col + ship_size < self.size and self.hidden_grid[row][col+ship_size] == 'S':
-                    return False
-                return True
-            else:  # Vertical
-                if row + ship_size > self.size:
-                    return False
-                # Check each segment cell and its neighbors
-                for r in range(row, row + ship_size):
-                    # overlap
-                    if self.hidden_grid[r][col] != '.':
-                        return False
-                    # left / right
-                    if col > 0 and self.hidden_grid[r][col-1] == 'S':
-                        return False
-                    if col < self.size-1 and self.hidden_grid[r][col+1] == 'S':
-                        return False
-                # end-caps (above/below the ship)
-                if row > 0 and self.hidden_grid[row-1][col] == 'S':
-                    return False
-                if row + ship_size < self.size and self.hidden_grid[row+ship_size][col] == 'S':
-                    return False
-                return True
+        """
+        Check if we can place a ship of length 'ship_size' at (row, col)
+        with the given orientation (0 => horizontal, 1 => vertical).
+        Ensures no overlapping and no orthogonal adjacency to any existing 'S'.
+        """
+        # Boundary check
+        if row < 0 or col < 0:
+            return False
+        if orientation == 0:
+            if row >= self.size or col + ship_size > self.size:
+                return False
+        elif col >= self.size or row + ship_size > self.size:
+            return False
+        ship, halo = _segment_masks(self.size, row, col, ship_size, orientation)
+        # overlap with anything already on the board
+        if ship & (self.ship_mask | self.hit_mask | self.miss_mask):
+            return False
+        # orthogonal neighbours (including end-caps) that are unhit ships
+        return not (halo & self.ship_mask & ~self.hit_mask)
 
     def do_place_ship(self, row, col, ship_size, orientation):
         """
         Place the ship on hidden_grid by marking 'S', and return the set of occupied positions.
         """
-        occupied = set()
+        ship, _ = _segment_masks(self.size, row, col, ship_size, orientation)
+        self.remaining_cells += (ship & ~self.ship_mask).bit_count()
+        self.ship_mask |= ship
         if orientation == 0:  # Horizontal
-            for c in range(col, col + ship_size):
-                self.hidden_grid[row][c] = 'S'
-                occupied.add((row, c))
-        else:  # Vertical
-            for r in range(row, row + ship_size):
-                self.hidden_grid[r][col] = 'S'
-                occupied.add((r, col))
+            return {(row, c) for c in range(col, col + ship_size)}
+        return {(r, col) for r in range(row, row + ship_size)}
+
+    def place_ship(self, ship_name, row, col, ship_size, orientation):
+        """
+        do_place_ship() plus recording the ship in placed_ships.
+        Returns the set of occupied positions.
+        """
+        occupied = self.do_place_ship(row, col, ship_size, orientation)
+        self.placed_ships.append({
+            'name': ship_name,
+            'mask': _segment_masks(self.size, row, col, ship_size, orientation)[0],
+            'origin': (row, col),
+            'orientation': orientation,
+        })
+        self._index_new_ships()
         return occupied
 
+    def fleet_placements(self):
+        """
+        The (ship_name, coord, 'H' | 'V') tuples for every ship placed with
+        place_ship(), e.g. to send with format_fleet().
+        """
+        return [(ship['name'], format_coordinate(*ship['origin']), 'HV'[ship['orientation']])
+                for ship in self.placed_ships if 'origin' in ship]
+
+    def snapshot(self):
+        """
+        The board as plain (JSON-serialisable) data: size, the ships placed
+        with place_ship() and the hit / miss bitboards. Cheap to take: the
+        masks are immutable ints, so nothing is copied cell by cell.
+        """
+        return {
+            'size': self.size,
+            'ships': [[ship['name'], *ship['origin'], ship['mask'].bit_count(), ship['orientation']]
+                      for ship in self.placed_ships if 'origin' in ship],
+            'hits': self.hit_mask,
+            'misses': self.miss_mask,
+        }
+
+    @classmethod
+    def restore(cls, snap):
+        """Inverse of snapshot(): a new Board in exactly that state."""
+        board = cls(snap['size'])
+        for ship_name, row, col, ship_size, orientation in snap['ships']:
+            board.place_ship(ship_name, row, col, ship_size, orientation)
+        board.hit_mask = snap['hits']
+        board.miss_mask = snap['misses']
+        board.remaining_cells = (board.ship_mask & ~board.hit_mask).bit_count()
+        for ship in board.placed_ships:
+            ship['remaining'] = (ship['mask'] & ~board.hit_mask).bit_count()
+        return board
+
+    def _index_new_ships(self):
+        """Add ships appended to placed_ships since the last call to the cell index."""
+        if self._cell_ship is None or self._indexed > len(self.placed_ships):
+            # first ship, or placed_ships was replaced wholesale; start over
+            self._cell_ship = bytearray(self.size * self.size)
+            self._indexed = 0
+        if len(self.placed_ships) > 255 and isinstance(self._cell_ship, bytearray):
+            # more ships than one byte can number
+            self._cell_ship = array('H', list(self._cell_ship))
+        for ship_idx in range(self._indexed, len(self.placed_ships)):
+            ship = self.placed_ships[ship_idx]
+            mask = self._ship_cells(ship)
+            ship['remaining'] = (mask & ~self.hit_mask).bit_count()
+            while mask:
+                low = mask & -mask
+                self._cell_ship[low.bit_length() - 1] = ship_idx + 1
+                mask ^= low
+        self._indexed = len(self.placed_ships)
+
+    def _ship_cells(self, ship):
+        """A ship's bitboard (computed once for dicts added with 'positions' instead)."""
+        mask = ship.get('mask')
+        if mask is None:
+            mask = 0
+            for (r, c) in ship['positions']:
+                mask |= 1 << (r * self.size + c)
+            ship['mask'] = mask
+        return mask
+
     def fire_at(self, row, col):
         """
         Fire at (row, col). Return a tuple (result, sunk_ship_name).
@@ -182,50 +431,54 @@ class Board:
 
         The server can use this result to inform the firing player.
         """
-        cell = self.hidden_grid[row][col]
-        if cell == 'S':
+        result, sunk_ship_name, _ = self.fire(row, col)
+        return (result, sunk_ship_name)
+
+    def fire(self, row, col):
+        """
+        Like fire_at(), but return (result, sunk_ship_name, fleet_sunk) so the
+        caller learns whether the whole fleet is gone without another check.
+        """
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            raise ValueError("Coordinate out of range")
+        bit = 1 << (row * self.size + col)
+        if (self.hit_mask | self.miss_mask) & bit:
+            return ('already_shot', None, False)
+        if self.ship_mask & bit:
+            if self._indexed != len(self.placed_ships):
+                self._index_new_ships()
             # Mark a hit
-            self.hidden_grid[row][col] = 'X'
-            self.display_grid[row][col] = 'X'
+            self.hit_mask |= bit
+            self.remaining_cells -= 1
             # Check if that hit sank a ship
             sunk_ship_name = self._mark_hit_and_check_sunk(row, col)
-            if sunk_ship_name:
-                return ('hit', sunk_ship_name)  # A ship has just been sunk
-            else:
-                return ('hit', None)
-        elif cell == '.':
-            # Mark a miss
-            self.hidden_grid[row][col] = 'o'
-            self.display_grid[row][col] = 'o'
-            return ('miss', None)
-        elif cell == 'X' or cell == 'o':
-            return ('already_shot', None)
-        else:
-            # In principle, this branch shouldn't happen if 'S', '.', 'X', 'o' are all possibilities
-            return ('already_shot', None)
+            return ('hit', sunk_ship_name, self.remaining_cells == 0)
+        # Mark a miss
+        self.miss_mask |= bit
+        return ('miss', None, False)
 
     def _mark_hit_and_check_sunk(self, row, col):
         """
-        Remove (row, col) from the relevant ship's positions.
-        If that ship's positions become empty, return the ship name (it's sunk).
+        Count the hit against the ship covering (row, col).
+        If that ship has no cells left, return the ship name (it's sunk).
         Otherwise return None.
         """
-        for ship in self.placed_ships:
-            if (row, col) in ship['positions']:
-                ship['positions'].remove((row, col))
-                if len(ship['positions']) == 0:
-                    return ship['name']
-                break
+        if self._cell_ship is None:
+            return None  # ships marked with do_place_ship() alone
+        ship_idx = self._cell_ship[row * self.size + col] - 1
+        if ship_idx < 0:
+            return None
+        ship = self.placed_ships[ship_idx]
+        ship['remaining'] -= 1
+        if ship['remaining'] == 0:
+            return ship['name']
         return None
 
     def all_ships_sunk(self):
         """
-        Check if all ships are sunk (i.e. every ship's positions are empty).
+        Check if all ships are sunk (i.e. no ship cell is left unhit).
         """
-        for ship in self.placed_ships:
-            if len(ship['positions']) > 0:
-                return False
-        return True
+        return self.remaining_cells == 0
 
     def print_display_grid(self, show_hidden_board=False):
         """
@@ -242,32 +495,164 @@ class Board:
         - 'o' for misses,
         - '.' for empty water.
         """
-        # Decide which grid to print
-        grid_to_print = self.hidden_grid if show_hidden_board else self.display_grid
-
         # Column headers (1 .. N)
         print("  " + "".join(str(i + 1).rjust(2) for i in range(self.size)))
         # Each row labeled with A, B, C, ...
         for r in range(self.size):
-            row_label = chr(ord('A') + r)
-            row_str = " ".join(grid_to_print[r][c] for c in range(self.size))
-            print(f"{row_label:2} {row_str}")
+            label = row_label(r)
+            row_str = " ".join(self.row_symbols(r, hidden=show_hidden_board))
+            print(f"{label:2} {row_str}")
+
+
+@lru_cache(maxsize=None)
+def row_label(row):
+    """
+    Letters for a zero-based row: A..Z, then AA, AB, ... like spreadsheet
+    columns, so boards wider than 26 still get unique labels.
+    Example: 0 => 'A', 25 => 'Z', 26 => 'AA', 701 => 'ZZ'
+    """
+    label = ""
+    row += 1
+    while row:
+        row, rem = divmod(row - 1, 26)
+        label = chr(ord('A') + rem) + label
+    return label
 
 
 def parse_coordinate(coord_str):
     """
     Convert something like 'B5' into zero-based (row, col).
-    Example: 'A1' => (0, 0), 'C10' => (2, 9)
-    HINT: you might want to add additional input validation here...
+    Example: 'A1' => (0, 0), 'C10' => (2, 9), 'AA3' => (26, 2)
+    Raises ValueError if the text is not letters followed by a number.
     """
     coord_str = coord_str.strip().upper()
-    row_letter = coord_str[0]
-    col_digits = coord_str[1:]
-
-    row = ord(row_letter) - ord('A')
+    letters = coord_str.rstrip("0123456789")
+    col_digits = coord_str[len(letters):]
+    if not letters or not col_digits or not (letters.isascii() and letters.isalpha()):
+        raise ValueError(f"Bad coordinate '{coord_str}'")
+
+    row = 0
+    for ch in letters:
+        row = row * 26 + ord(ch) - ord('A') + 1
     col = int(col_digits) - 1  # zero-based
 
-    return (row, col)
+    return (row - 1, col)
+
+
+def format_coordinate(row, col):
+    """
+    Inverse of parse_coordinate: (2, 9) => 'C10'.
+    """
+    return f"{row_label(row)}{col + 1}"
+
+
+def format_fleet(placements):
+    """
+    Encode placements as one line: 'Carrier A1 H, Battleship C3 V, ...'.
+    """
+    return ", ".join(f"{name} {coord} {orientation}" for name, coord, orientation in placements)
+
+
+def parse_fleet(text):
+    """
+    Inverse of format_fleet: return a list of (ship_name, coord, orientation).
+    """
+    placements = []
+    for item in text.split(","):
+        parts = item.split()
+        if len(parts) != 3:
+            raise ValueError(f"Expected '<ship> <coord> <H|V>', got {item.strip()!r}")
+        placements.append((parts[0], parts[1], parts[2].upper()))
+    return placements
+
+
+def format_placement_request(size=BOARD_SIZE, ships=SHIPS):
+    """
+    The server's request for a fleet, naming the board and the ships:
+    '[REQUEST_PLACEMENT] 10 Carrier:5,Battleship:4,...'.
+    """
+    return f"[REQUEST_PLACEMENT] {size} " + ",".join(f"{name}:{ship_size}" for name, ship_size in ships)
+
+
+def parse_placement_request(line):
+    """
+    Inverse of format_placement_request: return (size, ships). A bare
+    '[REQUEST_PLACEMENT]' (older servers) means the standard board and fleet.
+    """
+    parts = line.split()
+    if len(parts) < 3:
+        return BOARD_SIZE, SHIPS
+    ships = []
+    for item in parts[2].split(","):
+        name, _, ship_size = item.partition(":")
+        ships.append((name, int(ship_size)))
+    return int(parts[1]), ships
+
+
+def validate_fleet(placements, size=BOARD_SIZE, ships=SHIPS):
+    """
+    Check a complete fleet in one pass and return the Board holding it.
+    Each placement is (ship_name, coord, 'H' | 'V'); every ship in 'ships'
+    must appear exactly once, inside the board, without overlapping or
+    touching (orthogonally) another ship. Raises ValueError otherwise.
+    """
+    sizes = {name.lower(): (name, ship_size) for name, ship_size in ships}
+    if len(placements) != len(ships):
+        raise ValueError(f"Expected {len(ships)} ships, got {len(placements)}")
+
+    board = Board(size)
+    seen = set()
+    for ship_name, coord, orientation in placements:
+        key = ship_name.lower()
+        if key not in sizes:
+            raise ValueError(f"Unknown ship '{ship_name}'")
+        if key in seen:
+            raise ValueError(f"{ship_name} placed twice")
+        seen.add(key)
+        if orientation not in ('H', 'V'):
+            raise ValueError(f"Bad orientation '{orientation}' for {ship_name}")
+        row, col = parse_coordinate(coord)
+        name, ship_size = sizes[key]
+        orient_flag = 0 if orientation == 'H' else 1
+        if not board.can_place_ship(row, col, ship_size, orient_flag):
+            raise ValueError(f"{name} at {coord} {orientation} is off the board or touches another ship")
+        board.place_ship(name, row, col, ship_size, orient_flag)
+    return board
+
+
+def fleet_from_grid(rows, ships=SHIPS):
+    """
+    Turn a grid of '.' / 'S' rows into placements for validate_fleet().
+    Each ship is read as the straight run starting at its top-left cell, and
+    runs are named by length in the order of 'ships' (so the first 3-long run
+    is the Cruiser, the second the Submarine).
+    """
+    size = len(rows)
+    seen = [[False] * size for _ in range(size)]
+    names_by_size = {}
+    for name, ship_size in ships:
+        names_by_size.setdefault(ship_size, []).append(name)
+
+    placements = []
+    for r in range(size):
+        for c in range(size):
+            if rows[r][c] != 'S' or seen[r][c]:
+                continue
+            horizontal = c + 1 < size and rows[r][c + 1] == 'S'
+            length = 0
+            rr, cc = r, c
+            while rr < size and cc < size and rows[rr][cc] == 'S':
+                seen[rr][cc] = True
+                length += 1
+                if horizontal:
+                    cc += 1
+                else:
+                    rr += 1
+            names = names_by_size.get(length)
+            if not names:
+                raise ValueError(f"No ship of length {length} at {format_coordinate(r, c)}")
+            placements.append((names.pop(0), format_coordinate(r, c), 'H' if horizontal else 'V'))
+    return placements
 
 
 def run_single_player_game_locally():
@@ -339,9 +724,9 @@ def run_single_player_game_online(rfile, wfile):
         wfile.write("GRID\n")
         wfile.write("  " + " ".join(str(i + 1).rjust(2) for i in range(board.size)) + '\n')
         for r in range(board.size):
-            row_label = chr(ord('A') + r)
-            row_str = " ".join(board.display_grid[r][c] for c in range(board.size))
-            wfile.write(f"{row_label:2} {row_str}\n")
+            label = row_label(r)
+            row_str = " ".join(board.row_symbols(r, hidden=False))
+            wfile.write(f"{label:2} {row_str}\n")
         wfile.write('\n')
         wfile.flush()
 
@@ -0,0 +1,244 @@
+"""
+bench.py
+
+Micro-benchmarks for the Board engine and the server's grid encoding.
+Every case is timed with timeit (best of several repeats) across board sizes
+and fleet densities, and reported in microseconds per operation.
+
+    python benchmarks/bench.py                          # just print results
+    python benchmarks/bench.py --baseline               # compare with benchmarks/baseline.json,
+                                                        # exit 1 on a regression
+    python benchmarks/bench.py --baseline other.json    # compare with another saved run
+    python benchmarks/bench.py --save baseline.json     # store them
+    python benchmarks/bench.py --json                   # results as JSON (the comparison goes to stderr)
+
+Each run also times a fixed calibration loop of plain Python work. Results
+are compared relative to it, so the committed baseline (recorded on one
+machine) still flags regressions on a faster or slower one; baselines
+saved without a calibration time are compared in absolute terms.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+from itertools import cycle, islice
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+
+from battleship import SHIPS, Board, random_layout, parse_coordinate, format_coordinate
+import protocol
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+SIZES = (10, 15, 20, 26)
+# ships per 100 cells, relative to the standard 5-ship fleet on a 10x10 board
+DENSITIES = {'sparse': 0.5, 'standard': 1.0, 'dense': 1.4}
+
+
+def fleet_for(size, density):
+    """The standard fleet cycled to 'density' ships per 100 cells."""
+    count = max(1, round(DENSITIES[density] * len(SHIPS) * size * size / 100))
+    return [(f"{name}{i}", ship_size) for i, (name, ship_size) in enumerate(islice(cycle(SHIPS), count))]
+
+
+def placed_board(size, ships, layout):
+    board = Board(size)
+    for ship_name, row, col, ship_size, orientation in layout:
+        board.place_ship(ship_name, row, col, ship_size, orientation)
+    return board
+
+
+def cases(size, density, rng):
+    """Yield (name, make, ops per call, stateful) for one board configuration."""
+    ships = fleet_for(size, density)
+    layout = random_layout(size, ships, rng)
+    cells = [(r, c) for r in range(size) for c in range(size)]
+    rng.shuffle(cells)
+    spots = [(r, c, o) for r, c in cells for o in (0, 1)]
+
+    def fresh():
+        return placed_board(size, ships, layout)
+
+    def can_place():
+        board = fresh()
+        return lambda: [board.can_place_ship(r, c, 3, o) for r, c, o in spots]
+
+    def do_place():
+        return lambda: [Board(size).do_place_ship(row, col, ship_size, orient)
+                        for _, row, col, ship_size, orient in layout]
+
+    def fire_all():
+        board = fresh()
+        return lambda: [board.fire_at(r, c) for r, c in cells]
+
+    def all_sunk():
+        board = fresh()
+        for r, c in cells[:len(cells) // 2]:
+            board.fire_at(r, c)
+        return lambda: [board.all_ships_sunk() for _ in range(1000)]
+
+    def parse_coords():
+        labels = [format_coordinate(r, c) for r, c in cells]
+        return lambda: [parse_coordinate(label) for label in labels]
+
+    def place_randomly():
+        seeded = random.Random(0)
+        return lambda: Board(size).place_ships_randomly(ships, seeded)
+
+    def encode(send):
+        board = fresh()
+        for r, c in cells[:len(cells) // 3]:
+            board.fire_at(r, c)
+        out = io.StringIO()
+
+        def run():
+            out.seek(0)
+            out.truncate()
+            send(out, board)
+        return run
+
+    yield 'can_place_ship', can_place, len(spots), False
+    yield 'do_place_ship', do_place, len(layout), False
+    yield 'fire_at', fire_all, len(cells), True
+    yield 'all_ships_sunk', all_sunk, 1000, False
+    yield 'parse_coordinate', parse_coords, len(cells), False
+    yield 'place_ships_randomly', place_randomly, 1, False
+    yield 'send_board', lambda: encode(protocol.send_board), 1, False
+    yield 'send_ship_grid', lambda: encode(protocol.send_ship_grid), 1, False
+
+
+def calibration_loop():
+    """Fixed interpreter work (loops, ints, lists, dicts) to gauge this machine's speed."""
+    data = list(range(512))
+
+    def loop():
+        seen = {}
+        total = 0
+        for i in data:
+            total = (total + i * 7) ^ (total >> 3)
+            seen[i & 63] = total
+        return [seen[k] for k in sorted(seen)]
+    return loop
+
+
+def measure(make, ops, repeat, budget, stateful=False):
+    """
+    Best-of-'repeat' microseconds per op. make() builds the state and returns
+    the callable to time; a stateful callable (one that uses its board up)
+    gets fresh state for every call.
+    """
+    # one timed call decides how many calls fit in the budget per repeat
+    t = timeit.timeit(make(), number=1)
+    number = max(1, int(budget / max(t, 1e-7)))
+    best = float('inf')
+    for _ in range(repeat):
+        if stateful:
+            t = sum(timeit.timeit(make(), number=1) for _ in range(number))
+        else:
+            t = timeit.timeit(make(), number=number)
+        best = min(best, t / number)
+    return best / ops * 1e6
+
+
+def run(repeat=5, budget=0.05, only=None):
+    results = {}
+    calibration = measure(calibration_loop, 1, repeat, budget)
+    for size in SIZES:
+        for density in DENSITIES:
+            rng = random.Random(size * 100 + len(density))
+            for name, make, ops, stateful in cases(size, density, rng):
+                key = f"{name}[{size}x{size},{density}]"
+                if only and only not in key:
+                    continue
+                results[key] = round(measure(make, ops, repeat, budget, stateful), 4)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'unit': 'us/op',
+            'calibration': round(calibration, 4),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold, out=sys.stdout):
+    """
+    Print current vs baseline to 'out'; return the keys that got slower than
+    'threshold'. If both runs have a calibration time, the baseline is scaled
+    by the ratio of the two first, so only slowdowns relative to this
+    machine's speed count.
+    """
+    regressions = []
+    scale = 1.0
+    calibrated = (current['meta'].get('calibration'), baseline['meta'].get('calibration'))
+    if all(calibrated):
+        scale = calibrated[0] / calibrated[1]
+        print(f"baseline scaled by {scale:.2f} for this machine (calibration loop)", file=out)
+    else:
+        print("baseline has no calibration time; comparing absolute times", file=out)
+    print(f"{'benchmark':48} {'baseline':>10} {'current':>10} {'change':>8}", file=out)
+    for key, now in current['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            print(f"{key:48} {'-':>10} {now:10.3f}", file=out)
+            continue
+        before *= scale
+        change = (now - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  SLOWER'
+            regressions.append(key)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:48} {before:10.3f} {now:10.3f} {change:+8.1%}{flag}", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Board / protocol micro-benchmarks")
+    parser.add_argument('--repeat', type=int, default=5, help="repeats per case (best is kept)")
+    parser.add_argument('--budget', type=float, default=0.05, help="seconds per repeat")
+    parser.add_argument('--filter', default=None, help="only run cases whose name contains this")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    parser.add_argument('--save', metavar='FILE', help="write the results to FILE")
+    parser.add_argument('--baseline', metavar='FILE', nargs='?', const=DEFAULT_BASELINE,
+                        help="compare against a saved run (FILE defaults to benchmarks/baseline.json)")
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help="relative slowdown that counts as a regression (default 0.20)")
+    args = parser.parse_args()
+
+    current = run(args.repeat, args.budget, args.filter)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+    # with --json, stdout carries only the JSON
+    report = sys.stderr if args.json else sys.stdout
+    if args.json:
+        print(json.dumps(current, indent=2))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline is not None:
+        regressions = compare(current, baseline, args.threshold, report)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=report)
+            sys.exit(1)
+    elif not args.json:
+        for key, value in current['results'].items():
+            print(f"{key:48} {value:10.3f} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
+import io
+import os
 import socket
 import threading
 import pygame
 import sys
+from collections import deque
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+import protocol
+from battleship import (SHIPS, Board, format_coordinate, format_fleet, parse_coordinate,
+                        parse_placement_request, row_label)
 
 # Constants
 HOST = '127.0.0.1'
 PORT = 5000
-BOARD_SIZE = 10
+BOARD_SIZE = 10   # until the server's placement request or first grid says otherwise
 CELL_SIZE = 40
 MARGIN = 20
 GRID_GAP = 60
 CHAT_WIDTH = 300
-WINDOW_WIDTH = MARGIN * 3 + CELL_SIZE * BOARD_SIZE * 2 + GRID_GAP + CHAT_WIDTH + 20
-WINDOW_HEIGHT = MARGIN * 4 + CELL_SIZE * BOARD_SIZE + 40
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -22,32 +27,94 @@ RED = (255, 69, 0)
 GREEN = (34, 139, 34)
 ORANGE = (255, 165, 0)
 MAX_PLAYERS = 2
+# ask for the compact binary framing if the server offers it
+USE_BINARY = '--binary' in sys.argv
 player1_board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
 player2_board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
 
 own_board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
 enemy_board = [['.' for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+# free-for-all: one grid per opponent; enemy_board is the one shown (and shot at)
+enemy_boards = {}   # opponent's player id -> grid
+enemy_id = None     # the opponent shown in enemy_board
 last_result = ""
 is_my_turn = False
 running = True
 input_mode = False
 input_str = ""
-message_history = []
 MAX_HISTORY = 6
+message_history = deque(maxlen=MAX_HISTORY)
 update_lock = threading.Lock()
 needs_redraw = True
-pending_update_coord = None
 player_id = None
+resume_token = None
+fleet = SHIPS
+placement_requested = threading.Event()
 
 
-def parse_coord(coord_str):
-    row = ord(coord_str[0].upper()) - ord('A')
-    col = int(coord_str[1:]) - 1
-    return row, col
+def window_size():
+    return (MARGIN * 3 + CELL_SIZE * BOARD_SIZE * 2 + GRID_GAP + CHAT_WIDTH + 20,
+            MARGIN * 4 + CELL_SIZE * BOARD_SIZE + 40)
 
 
-def coord_to_str(row, col):
-    return chr(ord('A') + row) + str(col + 1)
+def resize_boards(size):
+    """Start every board over at size x size (the server's board may not be 10x10)."""
+    global BOARD_SIZE, needs_redraw
+    with update_lock:
+        BOARD_SIZE = size
+        for grid in (player1_board, player2_board, own_board, enemy_board, *enemy_boards.values()):
+            grid[:] = [['.'] * size for _ in range(size)]
+        needs_redraw = True
+
+
+def opponent_board(pid):
+    """
+    The grid of opponent pid (None: the only opponent). The first opponent
+    heard of is shown in enemy_board; the others get grids of their own.
+    """
+    global enemy_id
+    if pid is None:
+        return enemy_board
+    grid = enemy_boards.get(pid)
+    if grid is None:
+        grid = enemy_board if not enemy_boards else [['.'] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        enemy_boards[pid] = grid
+        if enemy_id is None:
+            enemy_id = pid
+    return grid
+
+
+def show_opponent(step=1):
+    """Show (and aim at) the next opponent still in a free-for-all."""
+    global enemy_board, enemy_id, needs_redraw
+    ids = sorted(enemy_boards)
+    if len(ids) < 2:
+        return
+    enemy_id = ids[(ids.index(enemy_id) + step) % len(ids)]
+    enemy_board = enemy_boards[enemy_id]
+    needs_redraw = True
+
+
+def shot_line(coord):
+    """A shot at the opponent shown; in a free-for-all it names them, e.g. "3 B5"."""
+    return f"{enemy_id} {coord}" if len(enemy_boards) > 1 else coord
+
+
+def fill_board(grid, rows):
+    """Replace a whole board with rows from the server, resizing first if needed."""
+    if len(rows) != BOARD_SIZE:
+        resize_boards(len(rows))
+    grid[:] = rows
+
+
+def read_block(rfile):
+    """The remaining lines of a GRID / [SHIPS] block, up to its blank line."""
+    lines = []
+    while True:
+        line = rfile.readline().strip()
+        if not line:
+            return lines
+        lines.append(line)
 
 
 def draw_board(screen, font, boards=None):
@@ -72,7 +139,8 @@ def draw_board(screen, font, boards=None):
         titles = ("Player 1", "Player 2")
     else:
         grids  = [own_board, enemy_board]
-        titles = ("Your Board", "Enemy Board")
+        titles = ("Your Board",
+                  f"Player {enemy_id} (Tab: next)" if len(enemy_boards) > 1 else "Enemy Board")
 
     # draw two side-by-side grids
     for (grid, title, x0) in zip(grids, titles, (left_x, mid_x)):
@@ -96,7 +164,7 @@ def draw_board(screen, font, boards=None):
 
         # labels A–J and 1–10
         for i in range(BOARD_SIZE):
-            screen.blit(font.render(chr(ord('A')+i), True, BLACK),
+            screen.blit(font.render(row_label(i), True, BLACK),
                         (x0 - 20, MARGIN + i*CELL_SIZE + 5))
             screen.blit(font.render(str(i+1), True, BLACK),
                         (x0 + i*CELL_SIZE + 5, MARGIN - 20))
@@ -110,7 +178,8 @@ def draw_board(screen, font, boards=None):
                      (chat_x, chat_y, CHAT_WIDTH, chat_h))
     pygame.draw.rect(screen, BLACK,
                      (chat_x, chat_y, CHAT_WIDTH, chat_h), 2)
-    for i, msg in enumerate(message_history[-MAX_HISTORY:]):
+    # list() copies the deque in one step while the reader thread appends to it
+    for i, msg in enumerate(list(message_history)):
         screen.blit(font.render(msg, True, BLACK),
                     (chat_x + 8, chat_y + 10 + i*22))
 
@@ -122,154 +191,313 @@ def draw_board(screen, font, boards=None):
     pygame.display.flip()
 
 def receive_messages(rfile):
-    global is_my_turn, last_result, needs_redraw, pending_update_coord, player_id, running
+    global running
     while running:
         line = rfile.readline()
         if not line:
             print("[INFO] Connection closed by server.")
             running = False
             break
-        line = line.strip()
-        # handle server exit signal
-        if line.startswith("[EXIT]"):
-            print("[INFO] Server requested shutdown.")
+        if not handle_line(line.strip(), rfile):
+            break
+
+
+def receive_frames(rfile):
+    """Binary-framed counterpart of receive_messages() (see server/protocol.py)."""
+    global needs_redraw, running
+    while running:
+        msg = protocol.read_frame(rfile)
+        if msg is None:
+            print("[INFO] Connection closed by server.")
             running = False
             break
-        updated = False
-        if line.startswith("[CHAT]"):
-            message_history.append(line)
-            needs_redraw = True
-            print(line)
-            if len(message_history) > MAX_HISTORY:
-                message_history.pop(0)
-            updated = True
-        elif line.startswith("[DEFENSE]"):
-            print(f"[DEFENSE] {line}")
-            for word in reversed(line.split()):
-                if len(word) >= 2 and word[0].isalpha() and word[1:].isdigit():
-                    r, c = parse_coord(word.strip("!. "))
-                    own_board[r][c] = 'X' if "hit" in line or "sank" in line else 'o'
-                    updated = True
-                    break
-        elif line.startswith("HIT") or line.startswith("MISS") or "sank" in line:
-            last_result = line
-            print(f"[RESULT] {line}")
-            if pending_update_coord:
-                r, c = pending_update_coord
-                enemy_board[r][c] = 'X' if "hit" in line or "sank" in line else 'o'
-                pending_update_coord = None
-            updated = True
-        elif line.startswith("[TURN]"):
-            is_my_turn = True
-            print("[INFO] It's your turn.")
-            updated = True
-        elif line.startswith("GRID"):
-            rfile.readline()
-            for r in range(BOARD_SIZE):
-                row = rfile.readline().split()[1:]
-                enemy_board[r] = row
-            rfile.readline()
-            updated = True
-        elif line.startswith("[SHIPS]"):
-            player_line = rfile.readline().strip()
-            if player_line == "Player 1":
-                target_board = player1_board
-            elif player_line == "Player 2":
-                target_board = player2_board
+        op, payload = msg
+        if op in (protocol.OP_GRID, protocol.OP_SHIPS):
+            pid, rows = protocol.unpack_board(payload)
+            if op == protocol.OP_GRID:
+                target_board = opponent_board(pid or None)
             else:
-                target_board = own_board  # fallback (for player mode)
-                target_board[0] = player_line.strip().split()  # this line is actually a board row
-
-            start_row = 1 if target_board is own_board else 0
-            for r in range(start_row, BOARD_SIZE):
-                row = rfile.readline().strip().split()
-                target_board[r] = row
-            rfile.readline()  # skip blank
-            updated = True
+                target_board = {1: player1_board, 2: player2_board}.get(pid, own_board)
+            fill_board(target_board, rows)
+            with update_lock:
+                needs_redraw = True
+            continue
+        if op == protocol.OP_CELL:
+            pid, r, c, state = protocol.unpack_cell(payload)
+            line = f"CELL {pid} {format_coordinate(r, c)} {state}"
+        else:
+            line = protocol.decode_line(op, payload)
+        if not handle_line(line, None):
+            break
 
-        elif line.startswith("[INFO] You are Player"):
-            try:
-                player_id = int(line.split()[-1].rstrip('.'))
-            except:
-                pass
-            print(line)
-            message_history.append(line)
-            if len(message_history) > MAX_HISTORY:
-                message_history.pop(0)
-            updated = True
 
-        elif line.startswith("[INFO] Game over"):
-            print(f"[GAME] {line}")
-            message_history.append(line)
-            if len(message_history) > MAX_HISTORY:
-                message_history.pop(0)
-            updated = True
-        elif "WIN" in line or "LOSE" in line:
-            last_result = line
-            print(f"[GAME] {line}")
-            is_my_turn = False
+def handle_line(line, rfile):
+    """Apply one server message; returns False once the session is over."""
+    global fleet, is_my_turn, last_result, needs_redraw, player_id, resume_token, running
+    # handle server exit signal
+    if line.startswith("[EXIT]"):
+        print("[INFO] Server requested shutdown.")
+        running = False
+        return False
+    updated = False
+    if line.startswith("[CHAT]"):
+        message_history.append(line)
+        needs_redraw = True
+        print(line)
+        updated = True
+    elif line.startswith("CELL"):
+        # delta update: CELL <player> <coord> <state>
+        _, pid, coord, state = line.split()
+        r, c = parse_coordinate(coord)
+        pid = int(pid)
+        if player_id is None:  # spectator: the view shows Players 1 and 2
+            target_board = {1: player1_board, 2: player2_board}.get(pid)
+        else:
+            target_board = own_board if pid == player_id else opponent_board(pid)
+        if target_board is not None:
+            target_board[r][c] = state
             updated = True
+    elif line.startswith("[DEFENSE]"):
+        print(f"[DEFENSE] {line}")
+    elif line.startswith("HIT") or line.startswith("MISS") or "sank" in line:
+        last_result = line
+        print(f"[RESULT] {line}")
+        updated = True
+    elif line.startswith("[TURN]"):
+        is_my_turn = True
+        print("[INFO] It's your turn.")
+        updated = True
+    elif line.startswith("GRID"):
+        # "GRID 3" names the owner when there are several opponents
+        owner = line.split()[1:]
+        rfile.readline()  # column numbers
+        fill_board(opponent_board(int(owner[0]) if owner else None),
+                   [row.split()[1:] for row in read_block(rfile)])
+        updated = True
+    elif line.startswith("[SHIPS]"):
+        rows = read_block(rfile)
+        if rows and rows[0] == "Player 1":
+            target_board = player1_board
+        elif rows and rows[0] == "Player 2":
+            target_board = player2_board
         else:
-            message_history.append(line)
-            print(line)
-            if len(message_history) > MAX_HISTORY:
-                message_history.pop(0)
-        if updated:
-            with update_lock:
-                needs_redraw = True
+            target_board = own_board  # fallback (for player mode)
+        if rows and rows[0].startswith("Player"):
+            rows.pop(0)
+        fill_board(target_board, [row.split() for row in rows])
+        updated = True
+    elif line.startswith("[TOKEN]"):
+        # not chat: the key to this seat if the server restarts mid-game
+        resume_token = line.split()[1]
+        print(f"[INFO] If the server restarts, rejoin with: /resume {resume_token}")
+    elif line.startswith("[REQUEST_PLACEMENT]"):
+        # the board size and fleet this match is played with
+        size, fleet = parse_placement_request(line)
+        if size != BOARD_SIZE:
+            resize_boards(size)
+        placement_requested.set()
+
+    elif "-player free-for-all" in line and player_id is not None:
+        # "[INFO] 4-player free-for-all: ..." - every other player is an opponent
+        players = int(line.split()[1].split('-')[0])
+        for pid in range(1, players + 1):
+            if pid != player_id:
+                opponent_board(pid)
+        print(line)
+        message_history.append(line)
+        updated = True
+    elif line.startswith("[INFO] Player") and ("eliminated" in line or "left the game" in line):
+        # an opponent who is out can no longer be shot at
+        pid = int(line.split()[2])
+        if pid in enemy_boards and len(enemy_boards) > 1:
+            if pid == enemy_id:
+                show_opponent()
+            enemy_boards.pop(pid)
+        print(line)
+        message_history.append(line)
+        updated = True
+
+    elif line.startswith("[INFO] You are Player"):
+        try:
+            player_id = int(line.split()[-1].rstrip('.'))
+        except:
+            pass
+        print(line)
+        message_history.append(line)
+        updated = True
+
+    elif line.startswith("[INFO] Game over"):
+        print(f"[GAME] {line}")
+        message_history.append(line)
+        updated = True
+    elif "WIN" in line or "LOSE" in line:
+        last_result = line
+        print(f"[GAME] {line}")
+        is_my_turn = False
+        updated = True
+    else:
+        message_history.append(line)
+        print(line)
+    if updated:
+        with update_lock:
+            needs_redraw = True
+    return True
 
 
 
 
 
 
+def place_fleet(wfile):
+    """Placement prompt for the fleet the server asked for; sends the finished layout."""
+    board = Board(BOARD_SIZE)
+    print(f"[INFO] Ship placement on a {BOARD_SIZE}x{BOARD_SIZE} board: "
+          f"{', '.join(f'{name} ({size})' for name, size in fleet)}")
+    print("[INFO] Ship placement: '/random' for auto, '/manual' for step-by-step, '/start' to begin")
+    placement_done = False
+    while not placement_done:
+        cmd = input('Placement> ').strip().lower()
+        if cmd == '/random':
+            # start from an empty board so repeated /random calls replace the layout
+            board = Board(BOARD_SIZE)
+            board.place_ships_randomly(fleet)
+            # Mirror to own_board for display
+            for r in range(BOARD_SIZE):
+                own_board[r] = board.row_symbols(r)
+            print('[INFO] Ships randomly placed:')
+            for row in own_board:
+                print(' '.join(row))
+        elif cmd == '/manual':
+            board.place_ships_manually(fleet)
+            for r in range(BOARD_SIZE):
+                own_board[r] = board.row_symbols(r)
+            print('[INFO] Ships manually placed:')
+            for row in own_board:
+                print(' '.join(row))
+        elif cmd.lower().startswith('/place'):
+            parts = cmd.split()
+            if len(parts) != 4:
+                print("[ERROR] Usage: /place <coord> <H|V> <ship>")
+                continue
+            _, coord_str, ori_str, ship_name = parts
+            ori = ori_str.upper()
+            if ori not in ('H', 'V'):
+                print("[ERROR] Orientation must be H or V.")
+                continue
+            try:
+                row, col = parse_coordinate(coord_str)
+            except ValueError as e:
+                print(f"[ERROR] Invalid coordinate: {e}")
+                continue
+
+            # Find the ship size by case-insensitive match
+            for name, size in fleet:
+                if name.lower() == ship_name.lower():
+                    ship_display = name
+                    ship_size = size
+                    break
+            else:
+                valid_names = [n for n, _ in fleet]
+                print(f"[ERROR] Unknown ship '{ship_name}'. Valid: {valid_names}")
+                continue
+
+            orient_flag = 0 if ori == 'H' else 1
+            # Validate placement
+            if not board.can_place_ship(row, col, ship_size, orient_flag):
+                print(f"[ERROR] Cannot place {ship_display} at {coord_str} ({ori}).")
+                continue
+
+            # Perform placement
+            occupied = board.place_ship(ship_display, row, col, ship_size, orient_flag)
+            # Mirror to own_board for display
+            for (r, c) in occupied:
+                own_board[r][c] = 'S'
+            print(f"[INFO] Placed {ship_display} at {coord_str} ({ori}).")
+ 
+        elif cmd == '/start':
+            if len(board.placed_ships) == len(fleet):
+                placement_done = True
+            else:
+                print(f"[ERROR] Not all ships placed ({len(board.placed_ships)}/{len(fleet)}). Complete placement before starting.")
+        else:
+            print("[ERROR] Unknown command. Use '/random', '/manual', or '/start'.")
+
+    # send placement to server as explicit (ship, coord, orientation) tuples
+    wfile.write(f"[FLEET] {format_fleet(board.fleet_placements())}\n")
+    wfile.flush()
+
+
 def main():
-    global is_my_turn, running, needs_redraw, pending_update_coord, input_mode, input_str
+    global is_my_turn, running, needs_redraw, input_mode, input_str
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    screen = pygame.display.set_mode(window_size())
     pygame.display.set_caption('Battleship - BEER Edition')
     font = pygame.font.SysFont(None, 28)
     with socket.socket() as s:
         s.connect((HOST, PORT))
-        rfile, wfile = s.makefile('r'), s.makefile('w')
+        # read raw bytes: after the handshake the server may switch to binary frames
+        raw, wfile = s.makefile('rb'), s.makefile('w')
             # —— read the server’s count header ——
-        hdr = rfile.readline().strip()
+        hdr = raw.readline().decode().strip()
+        features = []
         if hdr.startswith("[COUNT]"):
-            num, _, maxp = hdr.partition("] ")[2].partition("/")
+            # "[COUNT] <waiting>/<max> [feature tokens...]"
+            fields = hdr.split()
+            num, _, maxp = fields[1].partition("/")
             current = int(num)
             maxp    = int(maxp)
+            features = fields[2:]
             print(f"[INFO] Players: {current}/{maxp}")
         else:
         # fallback
             current, maxp = 0, MAX_PLAYERS
+        binary = USE_BINARY and protocol.BINARY_TOKEN in features
 
         # if we’re already full, force spectator mode
         if current >= maxp:
             role = '/spectator'
             print("[WARN] Player slots full → joining as spectator.")
         else:
-            role = input("Enter /player to play or /spectator to watch: ").strip().lower()
+            role = input("Enter /player [name] to play, /bot to play the AI, /spectator to watch "
+                         "or /resume <token> to rejoin: ").strip()
+            # the command is case-insensitive; a name keeps its case
+            command, _, rest = role.partition(' ')
+            role = f"{command.lower()} {rest.strip()}".strip()
 
-        wfile.write(role + "\n")
+        wfile.write(role + (f" {protocol.BINARY_TOKEN}" if binary else "") + "\n")
         wfile.flush()
 
         # read the server’s immediate response
-        reply = rfile.readline().strip()
+        reply = raw.readline().decode().strip()
+        if binary and reply == protocol.BINARY_ACK:
+            # "[BINARY] bin1": frames from here on
+            msg = protocol.read_frame(raw)
+            reply = protocol.decode_line(*msg) if msg else ''
         print(reply)
         # if it’s an error, bail out before placement/game-loop
-        if reply.startswith("[ERROR]") and role == '/player':
-            print("[INFO] Exiting client because player slots are full.")
+        # "/player alice" and "/spectator 3" carry an argument
+        command = (role.split() or [''])[0]
+        if reply.startswith("[ERROR]") and command == '/player':
+            print("[INFO] Exiting client: the server did not seat you.")
+            return
+        if reply.startswith("[ERROR]") and command == '/resume':
             return
 
-        is_spectator = (role == '/spectator')
+        is_spectator = (command == '/spectator')
+        if binary:
+            reader, rfile = receive_frames, raw
+        else:
+            reader, rfile = receive_messages, io.TextIOWrapper(raw, encoding='utf-8')
 
+        threading.Thread(target=reader, args=(rfile,), daemon=True).start()
         if is_spectator:
             print("[INFO] You are now a spectator. Sit back and enjoy!")
-            threading.Thread(target=receive_messages, args=(rfile,), daemon=True).start()
             clock = pygame.time.Clock()
 
             # Spectator view: left = P1 own_board, center = P2 own_board, right = chatbox
             while running:
+                if screen.get_size() != window_size():
+                    screen = pygame.display.set_mode(window_size())
                 for ev in pygame.event.get():
                     if ev.type == pygame.QUIT:
                         running = False
@@ -291,8 +519,6 @@ def main():
                                     message = cmd[6:].strip()
                                     print(f"[YOU] {message}")
                                     wfile.write(f"[CHAT]{message}\n"); wfile.flush()
-                                    if len(message_history) > MAX_HISTORY:
-                                        message_history.pop(0)
                                     needs_redraw = True
                                 elif cmd.lower() == '/quit':
                                     wfile.write("quit\n"); wfile.flush()
@@ -309,98 +535,21 @@ def main():
 
 
 
-        # Ship placement phase
-        from battleship import Board, SHIPS
-        board = Board()
-        print("[INFO] Ship placement: '/random' for auto, '/manual' for step-by-step, '/start' to begin")
-        placement_done = False
-        while not placement_done:
-            cmd = input('Placement> ').strip().lower()
-            if cmd == '/random':
-                max_attempts = 5
-                attempt = 0
-                while attempt < max_attempts:
-                    board.place_ships_randomly()
-                    if len(board.placed_ships) == len(SHIPS):
-                        # Mirror to own_board for display
-                        for r in range(BOARD_SIZE):
-                            own_board[r] = list(board.hidden_grid[r])
-                        print('[INFO] Ships randomly placed:')
-                        for row in own_board:
-                            print(' '.join(row))
-                        break
-                    else:
-                        attempt += 1
-                        print(f"[WARN] Random placement failed ({attempt}/{max_attempts}). Retrying...")
-                
-                if attempt == max_attempts:
-                    print("[ERROR] Could not place all ships after multiple attempts. Try manual placement or restart.")
-            elif cmd == '/manual':
-                board.place_ships_manually()
-                for r in range(BOARD_SIZE):
-                    own_board[r] = list(board.hidden_grid[r])
-                print('[INFO] Ships manually placed:')
-                for row in own_board:
-                    print(' '.join(row))
-            elif cmd.lower().startswith('/place'):
-                parts = cmd.split()
-                if len(parts) != 4:
-                    print("[ERROR] Usage: /place <coord> <H|V> <ship>")
-                    continue
-                _, coord_str, ori_str, ship_name = parts
-                ori = ori_str.upper()
-                if ori not in ('H', 'V'):
-                    print("[ERROR] Orientation must be H or V.")
-                    continue
-                try:
-                    row, col = parse_coord(coord_str)
-                except ValueError as e:
-                    print(f"[ERROR] Invalid coordinate: {e}")
-                    continue
-
-                # Find the ship size by case-insensitive match
-                for name, size in SHIPS:
-                    if name.lower() == ship_name.lower():
-                        ship_display = name
-                        ship_size = size
-                        break
-                else:
-                    valid_names = [n for n, _ in SHIPS]
-                    print(f"[ERROR] Unknown ship '{ship_name}'. Valid: {valid_names}")
-                    continue
-
-                orient_flag = 0 if ori == 'H' else 1
-                # Validate placement
-                if not board.can_place_ship(row, col, ship_size, orient_flag):
-                    print(f"[ERROR] Cannot place {ship_display} at {coord_str} ({ori}).")
-                    continue
-
-                # Perform placement
-                occupied = board.do_place_ship(row, col, ship_size, orient_flag)
-                board.placed_ships.append({
-                    'name': ship_display,
-                    'positions': occupied
-                })
-                # Mirror to own_board for display
-                for (r, c) in occupied:
-                    own_board[r][c] = 'S'
-                print(f"[INFO] Placed {ship_display} at {coord_str} ({ori}).")
-     
-            elif cmd == '/start':
-                if len(board.placed_ships) == len(SHIPS):
-                    placement_done = True
-                else:
-                    print(f"[ERROR] Not all ships placed ({len(board.placed_ships)}/{len(SHIPS)}). Complete placement before starting.")
-            else:
-                print("[ERROR] Unknown command. Use '/random', '/manual', or '/start'.")
-
-        # send placement to server
-        for row in own_board:
-            wfile.write(' '.join(row) + '\n')
-        wfile.flush()
-        threading.Thread(target=receive_messages, args=(rfile,), daemon=True).start()
+        if command == '/resume':
+            # the seat comes back with its fleet already on the board
+            print("[INFO] Rejoining your match; waiting for the other players.")
+        else:
+            # Ship placement phase, once matched: the request names the board size and fleet
+            while running and not placement_requested.wait(0.5):
+                pygame.event.pump()
+            if not running:
+                return
+            screen = pygame.display.set_mode(window_size())
+            place_fleet(wfile)
         clock = pygame.time.Clock()
         while running:
+            if screen.get_size() != window_size():
+                screen = pygame.display.set_mode(window_size())
             with update_lock:
                 if needs_redraw:
                     draw_board(screen, font)
@@ -413,6 +562,9 @@ def main():
                         input_mode = True
                         input_str = ''
                         needs_redraw = True
+                    elif not input_mode and ev.key == pygame.K_TAB:
+                        with update_lock:
+                            show_opponent()
                     elif input_mode:
                         if ev.key == pygame.K_ESCAPE:
                             input_mode = False
@@ -433,16 +585,19 @@ def main():
                                 print(f"[YOU] {message}")
                                 wfile.write(f"[CHAT]{message}\n"); wfile.flush()
                                 # message_history.append(f"[CHAT] Player {player_id}: {message}")
-                                if len(message_history) > MAX_HISTORY:
-                                    message_history.pop(0)
                                 needs_redraw = True
+                            # ask the server for full grids again
+                            elif cmd.lower() == '/resync':
+                                wfile.write("[RESYNC]\n"); wfile.flush()
                             # attack command
                             elif is_my_turn:
                                 try:
-                                    r, c = parse_coord(cmd)
-                                    print(f"[ATTACK] {cmd.upper()}")
-                                    pending_update_coord = (r, c)
-                                    wfile.write(f"{cmd.upper()}\n"); wfile.flush()
+                                    # "B5" shoots the opponent shown; "3 B5" names one
+                                    parts = cmd.split()
+                                    r, c = parse_coordinate(parts[-1])
+                                    shot = cmd.upper() if len(parts) == 2 else shot_line(cmd.upper())
+                                    print(f"[ATTACK] {shot}")
+                                    wfile.write(f"{shot}\n"); wfile.flush()
                                     is_my_turn = False
                                 except:
                                     print("[ERROR] Invalid coordinate")
@@ -458,9 +613,9 @@ def main():
                     if ex <= mx <= ex + BOARD_SIZE * CELL_SIZE and MARGIN <= my <= MARGIN + BOARD_SIZE * CELL_SIZE:
                         r = (my - MARGIN) // CELL_SIZE
                         c = (mx - ex) // CELL_SIZE
-                        print(f"[ATTACK] {coord_to_str(r, c)}")
-                        pending_update_coord = (r, c)
-                        wfile.write(coord_to_str(r, c) + '\n'); wfile.flush()
+                        shot = shot_line(format_coordinate(r, c))
+                        print(f"[ATTACK] {shot}")
+                        wfile.write(shot + '\n'); wfile.flush()
                         is_my_turn = False
         clock.tick(30)
     print("[INFO] Exiting client.")
@@ -0,0 +1,119 @@
+"""
+headless_client.py
+
+A client for the BEER server with no pygame and no input(), for scripts,
+bots and load tests. It speaks the same line protocol as client.py
+(see server/protocol.py) on top of asyncio streams:
+ - the "[COUNT] waiting/max" header and the role prompt on connect
+ - fleet placement ("[FLEET] ..." or the legacy grid rows) on the board
+   and fleet named by "[REQUEST_PLACEMENT] <size> <name:length,...>"
+ - shot lines ("B5"), "[CHAT] ..." and "quit"
+
+messages() groups the multi-line GRID / [SHIPS] blocks into one message so
+callers only ever see complete server messages.
+"""
+
+import asyncio
+
+from battleship import BOARD_SIZE, SHIPS, Board, format_fleet, parse_placement_request
+
+HOST = '127.0.0.1'
+PORT = 5000
+
+BLOCK_HEADERS = ("GRID", "[SHIPS]")
+
+
+class HeadlessClient:
+    """One connection to the server."""
+
+    def __init__(self, host=HOST, port=PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.waiting = None     # players waiting for a match when we connected
+        self.capacity = None    # players per match
+        self.player_id = None
+        self.token = None       # for "/resume <token>" after a server restart
+        self.size = BOARD_SIZE  # board and fleet, as announced by the placement request
+        self.ships = SHIPS
+
+    async def connect(self, role='/player') -> str:
+        """Open the connection, read the header and prompt, pick a role; returns the prompt."""
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        header = await self.readline()
+        if header and header.startswith("[COUNT]"):
+            waiting, _, capacity = header.split()[1].partition('/')
+            self.waiting, self.capacity = int(waiting), int(capacity)
+        prompt = await self.readline()
+        await self.send(role)
+        return prompt
+
+    async def readline(self):
+        """Next line from the server without the newline, or None once it hangs up."""
+        line = await self.reader.readline()
+        if not line:
+            return None
+        return line.decode().rstrip("\r\n")
+
+    async def messages(self):
+        """Yield complete messages; a GRID / [SHIPS] block arrives as one multi-line string."""
+        while True:
+            line = await self.readline()
+            if line is None:
+                return
+            # "GRID 3" names the owner in a free-for-all
+            if line.split(" ", 1)[0] in BLOCK_HEADERS:
+                block = [line]
+                while True:
+                    row = await self.readline()
+                    if not row:
+                        break
+                    block.append(row)
+                line = "\n".join(block)
+            elif line.startswith("[INFO] You are Player "):
+                self.player_id = int(line.split()[-1].rstrip('.'))
+            elif line.startswith("[TOKEN] "):
+                self.token = line.split()[1]
+            elif line.startswith("[REQUEST_PLACEMENT]"):
+                self.size, self.ships = parse_placement_request(line)
+            yield line
+
+    async def send(self, line) -> None:
+        self.writer.write((line + "\n").encode())
+        await self.writer.drain()
+
+    async def chat(self, text) -> None:
+        await self.send(f"[CHAT] {text}")
+
+    async def fire(self, coord, target=None) -> None:
+        """Shoot at coord; a free-for-all with several opponents needs the target player."""
+        await self.send(coord if target is None else f"{target} {coord}")
+
+    async def place_fleet(self, board=None, legacy=False) -> Board:
+        """Send a fleet placement (random if no board is given); returns the board used."""
+        if board is None:
+            board = Board(self.size)
+            board.place_ships_randomly(self.ships)
+        if legacy:
+            self.writer.write("".join(" ".join(row) + "\n" for row in board.hidden_grid).encode())
+            await self.writer.drain()
+        else:
+            await self.send(f"[FLEET] {format_fleet(board.fleet_placements())}")
+        return board
+
+    async def quit(self) -> None:
+        try:
+            await self.send("quit")
+        except ConnectionError:
+            pass
+        await self.close()
+
+    async def close(self) -> None:
+        if self.writer is None:
+            return
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,161 @@
+"""
+loadtest.py
+
+Load generator for the BEER server. Opens many concurrent headless player
+connections (plus optional spectators) against a running server, plays
+every match to the end with a hunt/target shooter and reports:
+ - connects/sec over the connection phase
+ - turns/sec over the whole run
+ - p50 / p99 shot-to-result latency (shot sent -> HIT!/MISS! received)
+
+Example (server started separately, e.g. python server/__init__.py):
+    python loadtest.py --players 2000 --spectators 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+from config import MAX_PLAYERS
+from headless_client import HOST, PORT, HeadlessClient
+from battleship import format_coordinate
+from simulation import HuntTargetShooter
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.turns = 0
+        self.latencies = []     # seconds, one per answered shot
+        self.results = {'win': 0, 'lose': 0, 'exit': 0}
+
+
+async def play(client, stats, rng, timeout) -> None:
+    """
+    Play one seat until the game ends or the opponent leaves. Each opponent
+    gets a shooter for the board and fleet the placement request announced;
+    in a free-for-all the shots go round the opponents still in the game.
+    """
+    shooters = {}   # opponent's player id -> shooter
+    pending = None
+    target = None
+    sent_at = 0.0
+    messages = client.messages()
+    while True:
+        try:
+            msg = await asyncio.wait_for(messages.__anext__(), timeout)
+        except StopAsyncIteration:
+            break
+        if msg.startswith("[REQUEST_PLACEMENT]"):
+            await client.place_fleet()
+        elif msg.startswith("[INFO] You are Player "):
+            shooters = {pid: HuntTargetShooter(client.size, client.ships, rng)
+                        for pid in range(1, (client.capacity or 2) + 1) if pid != client.player_id}
+        elif msg.startswith("[INFO] Player ") and ("eliminated" in msg or "left the game" in msg):
+            shooters.pop(int(msg.split()[2]), None)
+        elif msg.startswith("[TURN]"):
+            # the next opponent after the last one shot at
+            target = min(shooters, key=lambda pid: (pid - (target or 0) - 1) % (client.capacity or 2))
+            pending = shooters[target].next_shot()
+            sent_at = time.perf_counter()
+            await client.fire(format_coordinate(*pending), target if len(shooters) > 1 else None)
+        elif pending and (msg.startswith("HIT") or msg.startswith("MISS")):
+            stats.latencies.append(time.perf_counter() - sent_at)
+            stats.turns += 1
+            sunk = msg.split("You sank ", 1)[1].rstrip("!") if "You sank " in msg else None
+            if target in shooters:
+                shooters[target].observe(*pending, 'hit' if msg.startswith("HIT") else 'miss', sunk)
+            pending = None
+        elif msg.startswith("[END]"):
+            stats.results['win' if "WIN" in msg else 'lose'] += 1
+            break
+        elif msg.startswith("[EXIT]"):
+            stats.results['exit'] += 1
+            break
+    await client.quit()
+
+
+async def spectate(client, timeout) -> None:
+    """Follow a match until the server closes the connection."""
+    try:
+        async for _ in client.messages():
+            pass
+    finally:
+        await client.close()
+
+
+async def run_client(role, args, stats, gate, rng) -> None:
+    client = HeadlessClient(args.host, args.port)
+    async with gate:
+        try:
+            await asyncio.wait_for(client.connect(role), args.timeout)
+        except (OSError, asyncio.TimeoutError):
+            stats.failed += 1
+            return
+        stats.connected += 1
+    try:
+        if role == '/player':
+            await play(client, stats, rng, args.timeout)
+        else:
+            await spectate(client, args.timeout)
+    except (OSError, asyncio.TimeoutError):
+        await client.close()
+
+
+async def main_async(args) -> None:
+    stats = Stats()
+    rng = random.Random(args.seed)
+    # cap simultaneous handshakes so the listen backlog is not overrun
+    gate = asyncio.Semaphore(args.connect_concurrency)
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(run_client('/player', args, stats, gate, random.Random(rng.random())))
+             for _ in range(args.players)]
+    while stats.connected + stats.failed < args.players:
+        await asyncio.sleep(0.01)
+    connect_time = time.perf_counter() - start
+
+    # spectators attach once matches are running
+    tasks += [asyncio.create_task(run_client('/spectator', args, stats, gate, rng))
+              for _ in range(args.spectators)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(stats.latencies)
+
+    def pct(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    print(f"connections: {stats.connected} ok, {stats.failed} failed")
+    print(f"connects/sec: {args.players / connect_time:.0f} ({connect_time:.2f}s for {args.players} players)")
+    print(f"turns/sec:    {stats.turns / elapsed:.0f} ({stats.turns} turns in {elapsed:.2f}s)")
+    if latencies:
+        print(f"shot latency: p50 {pct(0.5):.2f} ms, p99 {pct(0.99):.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    print(f"results:      {stats.results['win']} won, {stats.results['lose']} lost, "
+          f"{stats.results['exit']} ended by a departure")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a BEER server with headless clients")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--players', type=int, default=1000, help=f"player connections, rounded up to whole matches of {MAX_PLAYERS} "
+                             "(config.MAX_PLAYERS)")
+    parser.add_argument('--spectators', type=int, default=0)
+    parser.add_argument('--connect-concurrency', type=int, default=100,
+                        help="handshakes in flight at once")
+    parser.add_argument('--timeout', type=float, default=30.0, help="seconds to wait for any one message")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    # a part-filled last match would never start, leaving its players waiting until the timeout
+    args.players += -args.players % MAX_PLAYERS
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
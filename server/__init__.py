@@ -1,72 +1,83 @@
-import socket, threading
+import argparse
+import asyncio
+import socket
+import threading
+import time
 from handle_game import GameSession
+from matchmaking import Matchmaker
+import metrics
+import profiling
 import protocol
-from config import HOST, PORT, MAX_PLAYERS, MAX_SPECTATORS
+import recovery
+from config import HOST, PORT, MAX_PLAYERS, METRICS_PORT, HANDSHAKE_TIMEOUT
 
-waiting_players: list[socket.socket] = []
-sessions: list[GameSession]  = []
-lock = threading.Lock()
 
-def matchmaking_loop() -> None:
+def start_session(session_id, conns, on_finish, restore=None) -> GameSession:
+    return GameSession(*conns, session_id=session_id, on_finish=on_finish, restore=restore)
+
+
+matchmaker = Matchmaker(start_session)
+
+
+def matchmaking_loop(resumes=None) -> None:
+    def on_line(conn, wfile, line, accepted):
+        if matchmaker.admit(conn, wfile, line, accepted, resumes):
+            import bot
+            matchmaker.start_match([conn, bot.start_bot_thread()])
+
+    # clients answer on the Handshaker's thread, so a slow one never holds up accept();
+    # that thread profiles them too
+    handshaker = protocol.Handshaker(on_line, HANDSHAKE_TIMEOUT, profile_label='matchmaking')
+    handshaker.start()
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        # allow an immediate restart while old connections sit in TIME_WAIT
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         listener.bind((HOST, PORT))
         listener.listen()
         print(f"[INFO] Server listening on {HOST}:{PORT}")
         while True:
             conn, _ = listener.accept()
-            rfile = conn.makefile('r')
-            wfile = conn.makefile('w')
-            # figure out how many players are already “in the pool” or in an ongoing session
-            with lock:
-                if sessions and sessions[-1].is_alive():
-                    current_players = MAX_PLAYERS
-                else:
-                    current_players = len(waiting_players)
-
-            # send a machine-readable count header
-            protocol.send(wfile, f"[COUNT] {current_players}/{MAX_PLAYERS}")
-
-            protocol.send(wfile, "[INFO] Enter /player to play or /spectator to watch.")
-            choice = rfile.readline().strip().lower()
-
-            with lock:
-                # ─── Spectator ───────────────────────────────────────────
-                if choice == '/spectator':
-                    if not sessions:
-                        protocol.send(wfile, "[ERROR] No game in progress. Try again later.")
-                        conn.close()
-                    else:
-                        sess = sessions[-1]
-                        if len(sess.spectators) >= MAX_SPECTATORS:
-                            protocol.send(wfile, "[ERROR] Spectator limit reached.")
-                            conn.close()
-                        else:
-                            sess.add_spectator(conn)
-
-                # ─── Player ──────────────────────────────────────────────
-                elif choice == '/player':
-                    # are we already full?
-                    if len(waiting_players) >= MAX_PLAYERS or \
-                       (sessions and sessions[-1].is_alive()):
-                        protocol.send(wfile, "[ERROR] Player slots are full. Try /spectator.")
-                        conn.close()
-                    else:
-                        waiting_players.append(conn)
-                        protocol.send(wfile, "[INFO] Waiting for another player…")
+            accepted = time.monotonic()
+            metrics.CONNECTIONS.inc()
+            wfile = protocol.SocketOutbox(conn)
 
-                        # once we have two, start immediately
-                        if len(waiting_players) == MAX_PLAYERS:
-                            p1 = waiting_players.pop(0)
-                            p2 = waiting_players.pop(0)
+            # send a machine-readable count header (players waiting for a match)
+            # followed by the optional wire features this server understands
+            protocol.send(wfile, f"[COUNT] {matchmaker.waiting_count()}/{MAX_PLAYERS} {protocol.BINARY_TOKEN}")
 
-                            session = GameSession(p1, p2)
-                            session.start()
-                            sessions.append(session)
+            protocol.send(wfile, "[INFO] Enter /player [name] to play (rated if named), /bot to play the AI, "
+                                 "/spectator to watch or /resume <token> to rejoin a match.")
+            handshaker.add(conn, wfile, accepted)
 
-                # ─── Invalid ────────────────────────────────────────────
-                else:
-                    protocol.send(wfile, "[ERROR] Invalid command.")
-                    conn.close()
 
 if __name__ == '__main__':
-    matchmaking_loop()
+    parser = argparse.ArgumentParser(description="BEER battleship server")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="run every session on one asyncio event loop")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="hand matches to N worker processes (threaded server, Unix only)")
+    args = parser.parse_args()
+    profiling.install()
+    if args.workers > 0 and not args.use_async:
+        import cluster
+        pool = cluster.WorkerPool(args.workers)
+        matchmaker.session_factory = pool.session_factory
+        print(f"[INFO] Running matches on {args.workers} worker processes")
+    if args.use_async:
+        import async_server
+        if METRICS_PORT is not None:
+            async_server.matchmaker.export_metrics()
+            metrics.serve(HOST, METRICS_PORT)
+        asyncio.run(async_server.serve())
+    else:
+        if METRICS_PORT is not None:
+            matchmaker.export_metrics()
+            metrics.serve(HOST, METRICS_PORT)
+        # players whose rating window has widened are matched between arrivals
+        threading.Thread(target=matchmaker.sweep_forever, daemon=True).start()
+        # matches that were running when the server last stopped
+        states = recovery.load_snapshots()
+        if states:
+            matchmaker.reserve_ids(max(state['sid'] for state in states))
+            print(f"[INFO] {len(states)} match(es) waiting for their players to /resume")
+        matchmaking_loop(recovery.ResumeRegistry(matchmaker.start_match, states))
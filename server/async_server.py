@@ -0,0 +1,235 @@
+"""
+asyncio server mode: matchmaking, placement, turns and chat for every
+connection on a single event loop. Speaks the same wire protocol as the
+threaded server in __init__.py.
+"""
+import asyncio
+import time
+from handle_game import BaseSession, SessionClosed
+from matchmaking import Matchmaker
+import metrics
+import protocol
+from config import (HOST, PORT, MAX_PLAYERS,
+                    PLAYER_HIGH_WATER, SPECTATOR_HIGH_WATER, SLOW_SPECTATOR_POLICY,
+                    HANDSHAKE_TIMEOUT, PLACEMENT_TIMEOUT, TURN_TIMEOUT)
+
+
+class StreamConn:
+    """One client connection: the stream pair plus its outbound buffer."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.wfile = protocol.StreamOutbox(writer)
+
+    async def readline(self) -> str:
+        """The next line, cut to protocol.MAX_LINE bytes like LineReader's; '' at end of input."""
+        try:
+            line = await self.reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            line = e.partial
+        except asyncio.LimitOverrunError:
+            # too long: keep the start and drop the rest of the line
+            line = await self.reader.readexactly(protocol.MAX_LINE) + b"\n"
+            await self.skip_line()
+        except ConnectionError:
+            return ''
+        return line.decode(errors='replace')
+
+    async def skip_line(self) -> None:
+        while True:
+            try:
+                await self.reader.readuntil(b"\n")
+                return
+            except asyncio.LimitOverrunError as e:
+                await self.reader.readexactly(e.consumed)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+
+    def hung_up(self) -> bool:
+        """True once the client has closed its end (checked while it waits in the lobby)."""
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self) -> None:
+        if not self.writer.is_closing():
+            self.writer.close()
+
+
+class AsyncGameSession(BaseSession):
+    """Handles one match as a task on the event loop."""
+
+    def __init__(self, conns, session_id=None, on_finish=None):
+        self.init_state(conns, session_id, on_finish)
+        for c in self.conns:
+            self.adopt(c, PLAYER_HIGH_WATER)
+        self.inbox = asyncio.Queue()
+        self.readers = []
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def is_alive(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def adopt(self, conn, high_water, policy='drop'):
+        conn.wfile.stats = self.io_stats
+        conn.wfile.limit(high_water, policy)
+        self.wfiles[conn] = conn.wfile
+
+    def add_spectator(self, conn):
+        self.adopt(conn, SPECTATOR_HIGH_WATER, SLOW_SPECTATOR_POLICY)
+        self.welcome_spectator(conn)
+        self.spectators.append(conn)
+        self._watch(conn)
+
+    def _watch(self, conn):
+        self.readers.append(asyncio.get_running_loop().create_task(self._pump(conn)))
+
+    async def _pump(self, conn):
+        """Forward every line from one connection into the session inbox."""
+        while True:
+            line = await conn.readline()
+            await self.inbox.put((conn, line))
+            if not line:
+                return
+
+    async def next_line(self, deadline=None):
+        """
+        Wait for the next line from any player or spectator, or return None
+        if the deadline (a time.monotonic() value) passes first.
+        A player leaving a free-for-all comes back as (sock, None).
+        """
+        while True:
+            if deadline is None:
+                sock, raw = await self.inbox.get()
+            else:
+                get = asyncio.ensure_future(self.inbox.get())
+                done, _ = await asyncio.wait((get,), timeout=max(0.0, deadline - time.monotonic()))
+                if not done:
+                    get.cancel()
+                    try:
+                        # a line that arrived just as the timer fired is still used
+                        await get
+                    except asyncio.CancelledError:
+                        return None
+                sock, raw = get.result()
+            if sock in self.departed:
+                continue
+            if raw and raw.strip().lower() != 'quit':
+                return sock, raw.strip()
+            if sock in self.conns:
+                self.player_gone(sock)
+                return sock, None
+            # a spectator leaving only affects itself
+            self.remove_spectator(sock)
+
+    async def placement_phase(self):
+        boards = {}
+        for conn in self.conns:
+            self.request_placement(conn)
+        # every player may submit at the same time
+        deadline = time.monotonic() + PLACEMENT_TIMEOUT
+        while len(boards) < len(self.conns):
+            got = await self.next_line(deadline)
+            if got is None:
+                self.placement_timed_out(boards)
+            sock, line = got
+            # chat is allowed while fleets are being placed, and is never a placement row
+            if line.startswith("[CHAT]"):
+                with self.batch():
+                    self.handle_chat(sock, line)
+            elif sock in self.conns and sock not in boards:
+                board = self.placement_input(sock, line)
+                if board is not None:
+                    boards[sock] = board
+        return [boards[c] for c in self.conns]
+
+    async def run(self):
+        for conn in self.conns:
+            self._watch(conn)
+        try:
+            await self.handle_game()
+        except SessionClosed as e:
+            print(f"[INFO] Session {self.session_id}: {e}")
+            self.notify_departure(e.player_idx)
+        except Exception as e:
+            print(f"[WARN] Session {self.session_id} aborted: {e}")
+            for conn in self.conns:
+                self.safe_send(conn, f"[EXIT] Game aborted: {e}")
+        finally:
+            print(f"[INFO] Session {self.session_id} I/O: {self.io_summary()}")
+            for task in self.readers:
+                task.cancel()
+            self.teardown()
+
+    async def handle_game(self):
+        with metrics.PLACEMENT_TIME.time():
+            self.boards = await self.placement_phase()
+        with self.batch():
+            self.start_game()
+            self.announce_turn()
+
+        outcome = None
+        deadline = time.monotonic() + TURN_TIMEOUT
+        while outcome != 'over':
+            got = await self.next_line(deadline)
+            with self.batch():
+                outcome = self.handle_turn_input(*got) if got else self.turn_timed_out()
+                if outcome == 'turn':
+                    self.announce_turn()
+                    deadline = time.monotonic() + TURN_TIMEOUT
+
+        with self.batch():
+            self.announce_game_over()
+        while True:
+            # the finished match closes once everyone has gone quiet
+            got = await self.next_line(time.monotonic() + TURN_TIMEOUT)
+            if got is None:
+                return
+            with self.batch():
+                self.handle_chat_only(*got)
+
+
+def start_session(session_id, conns, on_finish, restore=None) -> AsyncGameSession:
+    # matches are only resumed by the threaded server
+    return AsyncGameSession(conns, session_id=session_id, on_finish=on_finish)
+
+
+matchmaker = Matchmaker(start_session)
+
+
+async def handle_client(reader, writer) -> None:
+    """Handshake for one connection; runs concurrently with every other client."""
+    accepted = time.monotonic()
+    metrics.CONNECTIONS.inc()
+    conn = StreamConn(reader, writer)
+    wfile = conn.wfile
+    protocol.send(wfile, f"[COUNT] {matchmaker.waiting_count()}/{MAX_PLAYERS} {protocol.BINARY_TOKEN}")
+    protocol.send(wfile, "[INFO] Enter /player [name] to play (rated if named), /bot to play the AI "
+                         "or /spectator to watch.")
+    try:
+        line = await asyncio.wait_for(conn.readline(), HANDSHAKE_TIMEOUT)
+    except asyncio.TimeoutError:
+        protocol.send(wfile, "[ERROR] Timed out waiting for your choice.")
+        conn.close()
+        return
+    if matchmaker.admit(conn, wfile, line, accepted):
+        import bot
+        matchmaker.start_match([conn, StreamConn(*await bot.start_bot_task())])
+
+
+async def sweep_lobby(interval=1.0) -> None:
+    """Match players whose rating window has widened; sessions must start on the loop."""
+    while True:
+        await asyncio.sleep(interval)
+        matchmaker.sweep()
+
+
+async def serve(host=HOST, port=PORT) -> None:
+    server = await asyncio.start_server(handle_client, host, port, limit=protocol.MAX_LINE)
+    # held so the task is not garbage-collected while the server runs
+    sweeper = asyncio.get_running_loop().create_task(sweep_lobby())
+    print(f"[INFO] Async server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
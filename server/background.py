@@ -0,0 +1,66 @@
+"""
+Building blocks for the server's background threads: one shared instance
+per process of a thread class, and a selector other threads can wake.
+"""
+import selectors
+import socket
+import threading
+
+
+def shared(thread_class):
+    """
+    Return a function giving the process-wide instance of thread_class,
+    created and started on first use.
+    """
+    lock = threading.Lock()
+    instance = None
+
+    def get():
+        nonlocal instance
+        with lock:
+            if instance is None:
+                instance = thread_class()
+                instance.start()
+            return instance
+
+    get.__doc__ = f"The process-wide {thread_class.__name__}, started on first use."
+    return get
+
+
+class WakeableSelector(selectors.DefaultSelector):
+    """
+    A selector that another thread can interrupt with wake(), e.g. after
+    handing its owner something new to watch. The wake-ups use a socketpair
+    registered with the selector; select() swallows them, so it may return
+    an empty list before the timeout.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        super().register(self._wake_r, selectors.EVENT_READ)
+
+    def wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass  # a wake-up is already pending
+
+    def select(self, timeout=None):
+        ready = []
+        for key, events in super().select(timeout):
+            if key.fileobj is self._wake_r:
+                try:
+                    self._wake_r.recv(4096)
+                except BlockingIOError:
+                    pass
+            else:
+                ready.append((key, events))
+        return ready
+
+    def close(self) -> None:
+        super().close()
+        self._wake_r.close()
+        self._wake_w.close()
@@ -0,0 +1,96 @@
+"""
+AI opponent that takes a player's seat in a session.
+
+The bot speaks the normal wire protocol over one end of a socketpair, so
+GameSession and AsyncGameSession treat it exactly like a remote player;
+only the shot selection (ai.DensityShooter) runs in-process.
+"""
+import asyncio
+import os
+import random
+import socket
+import sys
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from battleship import Board, SHIPS, format_coordinate, format_fleet, parse_placement_request
+from ai import DensityShooter
+from config import BOARD_SIZE, FLEET
+
+
+class BotPlayer:
+    """Protocol state for one AI player: feed it server lines, send back its replies."""
+
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()
+        self.ships = FLEET or SHIPS
+        self.shooter = DensityShooter(BOARD_SIZE, self.ships, rng=self.rng)
+        self.pending = None   # (row, col) of the shot awaiting its result
+        self.done = False
+
+    def handle(self, line) -> list[str]:
+        if line.startswith("[REQUEST_PLACEMENT]"):
+            # play on the board and fleet the session names
+            size, self.ships = parse_placement_request(line)
+            self.shooter = DensityShooter(size, self.ships, rng=self.rng)
+            board = Board(size)
+            board.place_ships_randomly(self.ships, rng=self.rng)
+            return [f"[FLEET] {format_fleet(board.fleet_placements())}"]
+        if line.startswith("[TURN]"):
+            self.pending = self.shooter.next_shot()
+            return [format_coordinate(*self.pending)]
+        if self.pending and (line.startswith("HIT") or line.startswith("MISS")):
+            row, col = self.pending
+            self.pending = None
+            sunk = None
+            if "You sank " in line:
+                sunk = line.split("You sank ", 1)[1].rstrip("!")
+            self.shooter.observe(row, col, 'hit' if line.startswith("HIT") else 'miss', sunk)
+        elif line.startswith("[EXIT]"):
+            self.done = True
+        return []
+
+
+def _serve_thread(sock, bot):
+    rfile, wfile = sock.makefile('r'), sock.makefile('w')
+    try:
+        for line in rfile:
+            replies = bot.handle(line.strip())
+            for reply in replies:
+                wfile.write(reply + "\n")
+            if replies:
+                wfile.flush()
+            if bot.done:
+                break
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def start_bot_thread() -> socket.socket:
+    """Run a bot on its own thread; return the socket to hand to the session."""
+    session_end, bot_end = socket.socketpair()
+    threading.Thread(target=_serve_thread, args=(bot_end, BotPlayer()), daemon=True).start()
+    return session_end
+
+
+async def _serve_async(reader, writer, bot):
+    try:
+        while not bot.done:
+            line = await reader.readline()
+            if not line:
+                break
+            for reply in bot.handle(line.decode().strip()):
+                writer.write((reply + "\n").encode())
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_bot_task():
+    """Run a bot as a task on the running loop; return the session's (reader, writer)."""
+    session_end, bot_end = socket.socketpair()
+    bot_reader, bot_writer = await asyncio.open_connection(sock=bot_end)
+    asyncio.get_running_loop().create_task(_serve_async(bot_reader, bot_writer, BotPlayer()))
+    return await asyncio.open_connection(sock=session_end)
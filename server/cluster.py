@@ -0,0 +1,155 @@
+"""
+Multi-process server. The front process keeps the listening socket and the
+matchmaker; every match it forms is handed to the least-loaded of N worker
+processes, which runs the GameSession threads. Client sockets move between
+processes by fd passing over each worker's pipe (Unix only), so the game
+logic of different matches runs on different cores.
+"""
+import multiprocessing
+import socket
+import threading
+from multiprocessing import reduction
+from handle_game import GameSession
+import metrics
+import protocol
+from config import HOST, METRICS_PORT
+
+
+def worker_main(worker_id, pipe, events) -> None:
+    """Worker process: run every session the front process hands over."""
+    sessions = {}
+    if METRICS_PORT is not None:
+        metrics.SESSIONS_ACTIVE.read = lambda: len(sessions)
+        metrics.SPECTATORS.read = lambda: sum(len(s.spectators) for s in list(sessions.values()))
+        metrics.serve(HOST, METRICS_PORT + 1 + worker_id)
+
+    def finished(session_id, winner=None):
+        sessions.pop(session_id, None)
+        events.put(('done', session_id, winner))
+
+    def spectator_left(session_id):
+        events.put(('spectator_left', session_id, None))
+
+    while True:
+        try:
+            msg = pipe.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        kind, session_id = msg[0], msg[1]
+        if kind == 'match':
+            conns = [socket.socket(fileno=reduction.recv_handle(pipe)) for _ in msg[2]]
+            for conn, binary in zip(conns, msg[2]):
+                if binary:
+                    protocol.binary_peers.add(conn)
+            session = GameSession(*conns, session_id=session_id, on_finish=finished, restore=msg[3])
+            session.on_spectator_left = spectator_left
+            sessions[session_id] = session
+            session.start()
+        elif kind == 'spectator':
+            conn = socket.socket(fileno=reduction.recv_handle(pipe))
+            if msg[2]:
+                protocol.binary_peers.add(conn)
+            session = sessions.get(session_id)
+            if session is not None and session.is_alive():
+                session.add_spectator(conn)
+            else:
+                wfile = protocol.SocketOutbox(conn, binary=bool(msg[2]))
+                try:
+                    protocol.send(wfile, "[ERROR] That game has finished.")
+                except OSError:
+                    pass    # they already left; that must not take the worker down
+                conn.close()
+        elif kind == 'stop':
+            return
+
+
+class Worker:
+    def __init__(self, worker_id, events):
+        self.pipe, child_pipe = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=worker_main, args=(worker_id, child_pipe, events), daemon=True)
+        self.process.start()
+        child_pipe.close()
+        self.load = 0
+        self.lock = threading.Lock()
+
+    def hand_over(self, msg, conns) -> None:
+        """Send a message plus sockets; the local copies are closed afterwards."""
+        with self.lock:
+            self.pipe.send(msg)
+            for conn in conns:
+                reduction.send_handle(self.pipe, conn.fileno(), self.process.pid)
+        for conn in conns:
+            conn.close()
+
+
+class RemoteSession:
+    """Front-process handle for a session that runs inside a worker."""
+
+    def __init__(self, session_id, conns, on_finish, worker, restore=None):
+        self.session_id = session_id
+        self.conns = conns
+        self.on_finish = on_finish
+        self.worker = worker
+        self.restore = restore
+        # one entry per spectator handed over and not yet reported gone by the
+        # worker; only the count matters (the fds were closed on hand-over)
+        self.spectators = []
+        self.finished = False
+
+    def start(self):
+        # per-connection framing travels with the sockets
+        binary = [conn in protocol.binary_peers for conn in self.conns]
+        self.worker.hand_over(('match', self.session_id, binary, self.restore), self.conns)
+
+    def is_alive(self) -> bool:
+        return not self.finished
+
+    def add_spectator(self, conn):
+        self.spectators.append(conn.fileno())
+        self.worker.hand_over(('spectator', self.session_id, conn in protocol.binary_peers), [conn])
+
+
+class WorkerPool:
+    """N worker processes plus the bookkeeping the front matchmaker needs."""
+
+    def __init__(self, n_workers):
+        self.events = multiprocessing.Queue()
+        self.workers = [Worker(i, self.events) for i in range(n_workers)]
+        self.remote = {}   # session_id -> RemoteSession
+        self.lock = threading.Lock()
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def session_factory(self, session_id, conns, on_finish, restore=None) -> RemoteSession:
+        """Matchmaker session factory: place the match on the least-loaded worker."""
+        with self.lock:
+            worker = min(self.workers, key=lambda w: w.load)
+            worker.load += 1
+            session = RemoteSession(session_id, conns, on_finish, worker, restore)
+            self.remote[session_id] = session
+        return session
+
+    def _collect(self) -> None:
+        """Release matchmaking slots as workers report finished sessions and departed spectators."""
+        while True:
+            kind, session_id, winner = self.events.get()
+            if kind == 'spectator_left':
+                with self.lock:
+                    session = self.remote.get(session_id)
+                    if session is not None and session.spectators:
+                        session.spectators.pop()
+                continue
+            if kind != 'done':
+                continue
+            with self.lock:
+                session = self.remote.pop(session_id, None)
+                if session is None:
+                    continue
+                session.worker.load -= 1
+            session.finished = True
+            session.on_finish(session_id, winner)
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            with worker.lock:
+                worker.pipe.send(('stop', None))
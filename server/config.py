@@ -1,5 +1,68 @@
 HOST = '127.0.0.1'
 PORT = 5000
 
+# players per match; more than 2 is a free-for-all where everyone shoots at
+# anyone still afloat and the last fleet standing wins
 MAX_PLAYERS = 2
-MAX_SPECTATORS = 3
\ No newline at end of file
+MAX_SPECTATORS = 3
+# chat lines kept per match and replayed to spectators as they join
+CHAT_HISTORY = 100
+
+# board edge length (rows past Z are labelled AA, AB, ...) and the fleet as
+# (name, length) pairs; None keeps the standard five ships from battleship.py
+BOARD_SIZE = 10
+FLEET = None
+
+# Outbound backlog limits: bytes queued for a connection that it has not read yet.
+PLAYER_HIGH_WATER = 1024 * 1024
+SPECTATOR_HIGH_WATER = 256 * 1024
+# A spectator past its limit is either dropped ('drop') or skips updates until
+# it catches up and then gets the full grids again ('snapshot').
+# A player past its limit is always dropped, which ends the match.
+SLOW_SPECTATOR_POLICY = 'snapshot'
+
+# every session appends its placements, shots, turns and chat to a file in
+# this directory (replay with event_log.py). Off (None) unless set, e.g. 'logs':
+# a file is kept per session and nothing removes old ones
+EVENT_LOG_DIR = None
+# events are written after each one is handled and fsynced in the background this often (seconds)
+EVENT_LOG_FSYNC_INTERVAL = 1.0
+
+# running matches are saved here so a restarted server can resume them
+# (threaded server only). Off (None) unless set, e.g. 'snapshots': a match's
+# file is removed when it ends, but those of a crashed server stay until resumed
+SNAPSHOT_DIR = None
+# a changed match is written to disk at most this often (seconds)
+SNAPSHOT_INTERVAL = 2.0
+# how long a resumed match waits for all of its players to reconnect (seconds)
+RESUME_TIMEOUT = 120
+
+# counters and latency histograms are served in the Prometheus text format at
+# http://HOST:METRICS_PORT/metrics (worker N of --workers uses METRICS_PORT+1+N);
+# off (None) unless a port is set here, e.g. 9100
+METRICS_PORT = None
+
+# per-session profiling for the threaded server (see profiling.py):
+# None (off), 'cpu' (cProfile), 'alloc' (tracemalloc) or 'both'
+PROFILE_MODE = None
+# fraction of sessions that are profiled
+PROFILE_SAMPLE = 0.1
+PROFILE_DIR = 'profiles'
+# a phase's profile is written when one of its events takes longer than this (seconds)
+PROFILE_THRESHOLD = 0.05
+
+# seconds a client may stay silent before it is disconnected: before choosing
+# a role, before submitting its fleet, and while it is the player to move.
+# A finished match is closed once nobody has said anything for TURN_TIMEOUT.
+HANDSHAKE_TIMEOUT = 30
+PLACEMENT_TIMEOUT = 180
+TURN_TIMEOUT = 120
+
+# lobby: a player is matched with others rated within RATING_WINDOW points of
+# them; the window grows by RATING_WIDEN points per second of waiting, up to
+# RATING_WINDOW_MAX. Ratings of named players ("/player <name>") are kept in
+# RATINGS_FILE; None keeps them in memory only.
+RATING_WINDOW = 100
+RATING_WIDEN = 25
+RATING_WINDOW_MAX = 3000
+RATINGS_FILE = 'ratings.json'
@@ -0,0 +1,274 @@
+"""
+Per-session event log and replay.
+
+Every session appends one JSON object per line to its own file: the
+placements, each shot and its result, turn changes, players going out,
+chat and the end of the game. The file is only ever appended to. Events
+reach the OS when the session finishes handling an event (see
+BaseSession.batch); a shared background thread fsyncs them every
+EVENT_LOG_FSYNC_INTERVAL seconds, so a burst of turns costs one fsync and
+the turn loop never waits for the disk.
+
+Replay rebuilds the game at any turn. While loading it keeps a Board
+snapshot every SNAPSHOT_EVERY shots, so scrubbing to turn N restores the
+nearest snapshot and replays at most SNAPSHOT_EVERY shots. A match resumed
+after a restart appends to its original log from a snapshot that may be a
+few shots behind it; its 'resumed' event gives the snapshot's shot count,
+and the shots logged past that point are dropped as never having happened.
+
+    python event_log.py logs/20250101-120000-s1.jsonl            # final state
+    python event_log.py logs/20250101-120000-s1.jsonl --turn 40  # after 40 shots
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_right
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from battleship import Board, parse_fleet, validate_fleet, parse_coordinate
+from background import shared
+from config import EVENT_LOG_DIR, EVENT_LOG_FSYNC_INTERVAL
+
+SNAPSHOT_EVERY = 50
+
+
+class EventLog:
+    """Append-only JSON-lines log for one session."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def append(self, kind, **fields) -> None:
+        """Buffer one event; nothing is written until flush()."""
+        record = {'k': kind, 'ts': round(time.time(), 3), **fields}
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def flush(self) -> None:
+        """Hand buffered events to the OS; the shared Syncer fsyncs them later."""
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+        shared_syncer().mark(self)
+
+    def sync(self) -> None:
+        """fsync whatever has been flushed, without holding up append()."""
+        with self.lock:
+            if self.file.closed:
+                return
+            fd = os.dup(self.file.fileno())
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+class Syncer(threading.Thread):
+    """
+    One thread per process that fsyncs every log written to since its last
+    pass, once per EVENT_LOG_FSYNC_INTERVAL, so no session thread (or the
+    event loop) ever waits on the disk.
+    """
+
+    def __init__(self, interval=EVENT_LOG_FSYNC_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.dirty = set()
+
+    def mark(self, log: EventLog) -> None:
+        with self.lock:
+            self.dirty.add(log)
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                logs, self.dirty = self.dirty, set()
+            for log in logs:
+                log.sync()
+
+
+shared_syncer = shared(Syncer)
+
+
+def open_session_log(session_id, log_dir=EVENT_LOG_DIR):
+    """A fresh log for one session, or None when logging is turned off."""
+    if log_dir is None:
+        return None
+    # session ids restart with the server, so the start time keeps names unique
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-s{session_id}.jsonl"
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        return EventLog(os.path.join(log_dir, name))
+    except OSError as e:
+        print(f"[WARN] Session {session_id}: no event log ({e})")
+        return None
+
+
+def read_events(path) -> list[dict]:
+    """Every complete event in a log; a line cut short by a crash is ignored."""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return events
+
+
+class GameState:
+    """The game as it stood after some number of shots."""
+
+    def __init__(self, boards, turn_idx=0, out=(), winner=None, chat=(), shots=0):
+        self.boards = boards
+        self.turn_idx = turn_idx
+        self.out = set(out)
+        self.winner = winner
+        self.chat = list(chat)
+        self.shots = shots
+
+
+class Replay:
+    """
+    Load a session log and rebuild the game at any turn. A turn here is one
+    shot that landed (a hit or a miss); turn 0 is the moment the game started.
+    """
+
+    def __init__(self, path):
+        self.events = self._rewind(read_events(path))
+        start = next((e for e in self.events if e['k'] == 'start'), None)
+        if start is None:
+            raise ValueError("No start event")
+        self.session_id = start.get('sid')
+        self.players = start['players']
+        self.size = start['size']
+        self.ships = [tuple(ship) for ship in start['ships']]
+        self.shot_events = [i for i, e in enumerate(self.events) if e['k'] == 'shot']
+        self.chat_events = [i for i, e in enumerate(self.events) if e['k'] == 'chat']
+        self.snapshots = []   # (event index, state) every SNAPSHOT_EVERY shots
+        self._load()
+
+    @staticmethod
+    def _rewind(events) -> list[dict]:
+        """Drop the events a resume undid: those after the resumed snapshot's last shot."""
+        kept = []
+        shots = 0
+        for event in events:
+            if event['k'] == 'resumed' and 'shots' in event:
+                while shots > event['shots']:
+                    if kept.pop()['k'] == 'shot':
+                        shots -= 1
+            elif event['k'] == 'shot':
+                shots += 1
+            kept.append(event)
+        return kept
+
+    @property
+    def turns(self) -> int:
+        return len(self.shot_events)
+
+    def _load(self) -> None:
+        """One pass over the log: check every shot and keep periodic snapshots."""
+        state = None
+        for i, event in enumerate(self.events):
+            if event['k'] == 'placed':
+                state = self._initial_state(i)
+                self.snapshots.append((i, self._freeze(state)))
+                continue
+            if state is None:
+                continue
+            self._apply(state, event)
+            if event['k'] == 'shot' and state.shots % SNAPSHOT_EVERY == 0:
+                self.snapshots.append((i, self._freeze(state)))
+
+    def _initial_state(self, i):
+        placed = self.events[i]
+        boards = [validate_fleet(parse_fleet(fleet), self.size, self.ships)
+                  for fleet in placed['fleets']]
+        return GameState(boards)
+
+    @staticmethod
+    def _freeze(state):
+        return ([board.snapshot() for board in state.boards], state.turn_idx,
+                frozenset(state.out), state.winner, state.shots)
+
+    @staticmethod
+    def _apply(state, event) -> None:
+        kind = event['k']
+        if kind == 'shot':
+            board = state.boards[event['t']]
+            row, col = parse_coordinate(event['at'])
+            result, sunk, _ = board.fire(row, col)
+            if result != event['res'] or sunk != event.get('sunk'):
+                raise ValueError(f"Shot {state.shots + 1} at {event['at']}: log says "
+                                 f"{event['res']}, the board says {result}")
+            state.shots += 1
+        elif kind == 'turn':
+            state.turn_idx = event['p']
+        elif kind == 'out':
+            state.out.add(event['p'])
+        elif kind == 'end':
+            state.winner = event.get('p')
+        elif kind == 'resumed' and 'turn' in event:
+            state.turn_idx = event['turn']
+            state.out = set(event['out'])
+
+    def state_at(self, turn=None) -> GameState:
+        """The game after 'turn' shots (the end of the log if None)."""
+        if not self.snapshots:
+            raise ValueError("The game never got past placement")
+        if turn is None or turn > self.turns:
+            turn = self.turns
+        # everything before the shot that starts the next turn
+        stop = self.shot_events[turn] if turn < self.turns else len(self.events)
+        keys = [idx for idx, _ in self.snapshots]
+        idx, (boards, turn_idx, out, winner, shots) = self.snapshots[bisect_right(keys, stop - 1) - 1]
+        state = GameState([Board.restore(snap) for snap in boards], turn_idx, out, winner, shots=shots)
+        for event in self.events[idx + 1:stop]:
+            self._apply(state, event)
+        state.chat = [self.events[i]['line'] for i in self.chat_events if i < stop]
+        return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a BEER session log")
+    parser.add_argument('log')
+    parser.add_argument('--turn', type=int, default=None, help="show the game after this many shots")
+    args = parser.parse_args()
+    try:
+        replay = Replay(args.log)
+        state = replay.state_at(args.turn)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Cannot replay {args.log}: {e}")
+    print(f"Session {replay.session_id}: {replay.players} players, {replay.size}x{replay.size}, "
+          f"turn {state.shots}/{replay.turns}")
+    for idx, board in enumerate(state.boards):
+        status = " (out)" if idx in state.out else ""
+        print(f"\nPlayer {idx+1}{status}")
+        board.print_display_grid(show_hidden_board=True)
+    if state.winner is not None:
+        print(f"\nWinner: Player {state.winner+1}")
+    else:
+        print(f"\nPlayer {state.turn_idx+1} to move")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,252 +1,733 @@
 import os
-import select
+import secrets
+import selectors
 import threading
 import sys
+import time
+from contextlib import contextmanager
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from battleship import Board, parse_coordinate, SHIPS, BOARD_SIZE
+from battleship import (Board, parse_coordinate, format_coordinate, SHIPS,
+                        parse_fleet, format_fleet, validate_fleet, fleet_from_grid,
+                        format_placement_request)
+import metrics
+import profiling
 import protocol
-
-class GameSession(threading.Thread):
-    """Handles one match between two players."""
-    def __init__(self, p1_conn, p2_conn):
-        super().__init__(daemon=True)
-        self.conns = [p1_conn, p2_conn]
-        self.rfiles = {c: c.makefile('r') for c in self.conns}
-        self.wfiles = {c: c.makefile('w') for c in self.conns}
+import recovery
+from background import WakeableSelector
+from event_log import EventLog, open_session_log
+from config import (BOARD_SIZE, FLEET, PLAYER_HIGH_WATER, SPECTATOR_HIGH_WATER,
+                    SLOW_SPECTATOR_POLICY, SNAPSHOT_DIR, PLACEMENT_TIMEOUT, TURN_TIMEOUT,
+                    CHAT_HISTORY)
+
+
+class SessionClosed(Exception):
+    """A player left; the session ends but the server keeps running."""
+
+    def __init__(self, player_idx):
+        super().__init__(f"Player {player_idx+1} left the game")
+        self.player_idx = player_idx
+
+
+class EmptySeat:
+    """Stands in for a free-for-all player who had already left before a restart."""
+
+    def close(self):
+        pass
+
+
+class BaseSession:
+    """
+    Game rules and message fan-out for one match, independent of transport.
+    Subclasses own the I/O loop and must fill in:
+      - self.conns:  the player connections (any hashable objects)
+      - self.wfiles: connection -> file-like object accepted by protocol.send*
+
+    With more than two players the match is a free-for-all: a shot names its
+    target ("3 B5"), a player whose fleet is sunk (or who leaves) is out, and
+    the last one afloat wins.
+    """
+    # whether the session saves snapshots a restarted server can resume
+    resumable = False
+
+    def init_state(self, conns, session_id=None, on_finish=None, size=BOARD_SIZE, ships=None,
+                   restore=None):
+        self.session_id = session_id
+        self.on_finish = on_finish
+        self.on_spectator_left = None   # called with the session id when a spectator goes
+        self.conns = list(conns)
+        self.wfiles = {}
         self.spectators = []
         self.boards = []
-        self.chat_history: list[str] = []
-
-    def add_spectator(self, conn):
-        
-            self.spectators.append(conn)
+        self.size = size
+        self.ships = ships or FLEET or SHIPS
+        self.out = set()           # indexes of players no longer in the game
+        self.departed = set()      # player connections that have disconnected
+        self.game_over = False
+        self.winner = None         # index of the player who won, for ratings
+        self.chat_history = protocol.ChatLog(CHAT_HISTORY)
+        self.placement_rows = {}   # conn -> legacy grid rows received so far
+        self.turn_idx = 0
+        self.shots = 0             # shots that landed, as counted in the event log
+        # bytes / write calls for the whole session, and per completed turn
+        self.io_stats = protocol.IOStats()
+        self.turn_io: list[tuple[int, int]] = []
+        self.shot_landed = False   # set by handle_shot() so batch() samples the turn
+        # lets a player take their seat back after a server restart
+        self.tokens = [secrets.token_hex(8) for _ in self.conns]
+        if restore is not None:
+            self.restore_state(restore)
+            return
+        self.events = open_session_log(session_id) if session_id is not None else None
+        self.record('start', sid=session_id, players=len(self.conns), size=self.size,
+                    ships=self.ships)
+
+    def record(self, kind, **fields):
+        """Append one event to the session log, if there is one."""
+        if self.events is not None:
+            self.events.append(kind, **fields)
+
+    @contextmanager
+    def batch(self):
+        """Coalesce everything sent while handling one event into one write per connection."""
+        outboxes = [wf for wf in self.wfiles.values() if isinstance(wf, protocol.Outbox)]
+        before = self.io_stats.sample()
+        for wf in outboxes:
+            wf.hold()
+        try:
+            yield
+        finally:
+            self.send_snapshots()
+            for wf in outboxes:
+                try:
+                    wf.release()
+                except OSError:
+                    # the peer is gone; the read side will notice and clean up
+                    pass
+            if self.shot_landed:
+                # a turn's cost is what its batch wrote, counted once it has gone out
+                self.shot_landed = False
+                after = self.io_stats.sample()
+                self.turn_io.append((after[0] - before[0], after[1] - before[1]))
+            # the log and snapshot are written after the replies have gone out
+            if self.events is not None:
+                self.events.flush()
+            if self.resumable and self.boards:
+                if self.game_over:
+                    recovery.shared_writer().discard(self.session_id)
+                else:
+                    recovery.shared_writer().save(self.session_id, self.snapshot_state())
+
+    def snapshot_state(self) -> dict:
+        """Everything a restarted server needs to resume this match, as plain data."""
+        return {
+            'sid': self.session_id,
+            'size': self.size,
+            'ships': self.ships,
+            'boards': [board.snapshot() for board in self.boards],
+            'turn': self.turn_idx,
+            'shots': self.shots,
+            'out': sorted(self.out),
+            'departed': [idx for idx, conn in enumerate(self.conns) if conn in self.departed],
+            'chat': list(self.chat_history),
+            'tokens': self.tokens,
+            'log': self.events.path if self.events is not None else None,
+        }
+
+    def restore_state(self, state):
+        """
+        Pick up a match saved by snapshot_state(). self.conns holds the
+        returning players only; the seats of players who had left are empty.
+        """
+        returning = iter(self.conns)
+        self.conns = [EmptySeat() if idx in state['departed'] else next(returning)
+                      for idx in range(len(state['tokens']))]
+        self.departed = {self.conns[idx] for idx in state['departed']}
+        self.size = state['size']
+        self.ships = [tuple(ship) for ship in state['ships']]
+        self.boards = [Board.restore(snap) for snap in state['boards']]
+        self.turn_idx = state['turn']
+        self.shots = state.get('shots', 0)
+        self.out = set(state['out'])
+        self.chat_history = protocol.ChatLog(CHAT_HISTORY, state['chat'])
+        self.tokens = state['tokens']
+        self.events = None
+        if state.get('log'):
+            try:
+                # carry on appending to the match's original log
+                self.events = EventLog(state['log'])
+            except OSError as e:
+                print(f"[WARN] Session {self.session_id}: no event log ({e})")
+        if 'shots' in state:
+            # the snapshot may be behind the log: replay rewinds to its shot count
+            self.record('resumed', shots=self.shots, turn=self.turn_idx, out=sorted(self.out))
+        else:
+            self.record('resumed')
+
+    def send_snapshots(self):
+        """Full grids for anyone who fell behind, skipped updates and has caught up."""
+        for conn in self.conns + self.spectators:
+            wf = self.wfiles.get(conn)
+            if isinstance(wf, protocol.Outbox) and wf.snapshot_due:
+                wf.snapshot_due = False
+                self.resync(conn)
+
+    def io_summary(self) -> str:
+        stats = self.io_stats
+        queues = (f"peak send queue {stats.queue_peak} bytes, "
+                  f"{stats.dropped_bytes} bytes skipped, {stats.evictions} evicted")
+        if not self.turn_io:
+            return f"no completed turns; {queues}"
+        total_bytes = sum(b for b, _ in self.turn_io)
+        total_writes = sum(w for _, w in self.turn_io)
+        n = len(self.turn_io)
+        return (f"{n} turns, {total_bytes / n:.0f} bytes and "
+                f"{total_writes / n:.1f} writes per turn; {queues}")
+
+    # —— players ——
+    def connected(self) -> list:
+        """Player connections that are still open."""
+        return [c for c in self.conns if c not in self.departed]
+
+    def players_left(self) -> list[int]:
+        """Indexes of the players still in the game."""
+        return [idx for idx in range(len(self.conns)) if idx not in self.out]
+
+    def next_turn(self) -> int:
+        """The next player after the current one who is still in the game."""
+        n = len(self.conns)
+        for step in range(1, n + 1):
+            idx = (self.turn_idx + step) % n
+            if idx not in self.out:
+                return idx
+        return self.turn_idx
+
+    def player_name(self, idx) -> str:
+        """How other players refer to player idx."""
+        return "Opponent" if len(self.conns) == 2 else f"Player {idx+1}"
+
+    def player_gone(self, conn):
+        """
+        A player disconnected or quit. That ends a two-player match, and any
+        match before the boards are set or after it is over; in a running
+        free-for-all the others play on (see handle_departure()).
+        """
+        if len(self.conns) == 2 or not self.boards or self.game_over:
+            raise SessionClosed(self.conns.index(conn))
+        self.departed.add(conn)
+        self.close_conn(conn)
+        self.wfiles.pop(conn, None)
+
+    # —— placement ——
+    def parse_placement_row(self, line):
+        """Return the cells of one placement row, or None if the line is not a row."""
+        parts = line.strip().split()
+        if len(parts) != self.size:
+            return None
+        if any(ch not in (".", "S") for ch in parts):
+            raise ValueError(f"Bad placement row: {parts}")
+        return parts
+
+    def placement_input(self, conn, line):
+        """
+        Feed one line from a player during placement. Accepts a single
+        "[FLEET] Carrier A1 H, ..." message or self.size rows of '.'/'S'.
+        Returns the validated Board once the layout is complete, else None;
+        an invalid layout is rejected and placement is requested again.
+        """
+        try:
+            if line.startswith("[FLEET]"):
+                self.placement_rows.pop(conn, None)
+                return validate_fleet(parse_fleet(line[len("[FLEET]"):]), self.size, self.ships)
+            row = self.parse_placement_row(line)
+            if row is None:
+                return None
+            rows = self.placement_rows.setdefault(conn, [])
+            rows.append(row)
+            if len(rows) < self.size:
+                return None
+            del self.placement_rows[conn]
+            return validate_fleet(fleet_from_grid(rows, self.ships), self.size, self.ships)
+        except ValueError as e:
+            self.placement_rows.pop(conn, None)
+            protocol.send(self.wfiles[conn], f"[ERROR] Invalid placement: {e}")
+            self.request_placement(conn)
+            return None
+
+    def request_placement(self, conn):
+        """Ask a player for their fleet, naming the board size and the ships."""
+        protocol.send(self.wfiles[conn], format_placement_request(self.size, self.ships))
+
+    # —— teardown ——
+    def safe_send(self, conn, msg):
+        """Send to a peer that may already be gone."""
+        try:
+            protocol.send(self.wfiles[conn], msg)
+        except (OSError, KeyError):
+            pass
+
+    def notify_departure(self, player_idx):
+        """
+        Tell everyone still connected that a player has left. Leaving a
+        two-player match once it is under way forfeits it.
+        """
+        if len(self.conns) == 2 and self.boards and not self.game_over:
+            self.winner = 1 - player_idx
+        for idx, conn in enumerate(self.conns):
+            if idx != player_idx:
+                self.safe_send(conn, f"[EXIT] {self.player_name(player_idx)} left the game.")
+        for spec in self.spectators:
+            self.safe_send(spec, f"[EXIT] Player {player_idx+1} left the game.")
+
+    def close_conn(self, conn):
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def teardown(self):
+        """Close this session's connections and release its matchmaking slot."""
+        for conn in self.conns + self.spectators:
+            self.close_conn(conn)
+        self.spectators = []
+        if self.events is not None:
+            self.record('closed')
+            self.events.close()
+        if self.resumable:
+            recovery.shared_writer().discard(self.session_id)
+        if self.on_finish is not None:
+            self.on_finish(self.session_id, self.winner)
+            self.on_finish = None
+
+    def remove_spectator(self, conn):
+        if conn in self.spectators:
+            self.spectators.remove(conn)
+            if self.on_spectator_left is not None:
+                self.on_spectator_left(self.session_id)
+        self.close_conn(conn)
+
+    # —— spectators ——
+    def welcome_spectator(self, conn):
+        # greeting, chat replay and both grids leave in one write
+        wf = self.wfiles[conn]
+        wf.hold()
+        try:
+            protocol.send(wf, "[INFO] You are now spectating.")
+            self.chat_history.replay(wf)
+            self.resync(conn)
+        finally:
+            wf.release()
+
+    def resync(self, conn):
+        """Send full grids to one connection; everything else is CELL deltas."""
+        if not self.boards:
+            return
+        wf = self.wfiles[conn]
+        if conn in self.conns:
+            idx = self.conns.index(conn)
+            protocol.send_ship_grid(wf, self.boards[idx])
+            for other, board in enumerate(self.boards):
+                if other != idx:
+                    # with one opponent the grid needs no owner
+                    protocol.send_board(wf, board, other+1 if len(self.boards) > 2 else None)
+        else:
+            for idx, board in enumerate(self.boards):
+                protocol.send_ship_grid(wf, board, player_id=idx+1)
+
+    # —— chat ——
+    def handle_chat(self, sock, line):
+        """Format, remember and broadcast one "[CHAT] ..." line."""
+        msg = line[len("[CHAT]"):].strip()
+        # 区分玩家 / 观战者
+        if sock in self.conns:
+            sid = self.conns.index(sock) + 1
+            formatted = f"[CHAT] Player {sid}: {msg}"
+            targets = self.connected() + self.spectators
+        else:
+            formatted = f"[CHAT] Spectator: {msg}"
+            targets = self.spectators
+
+        # 缓存历史（方便新加入观战者补发）
+        self.chat_history.append(formatted)
+        self.record('chat', line=formatted)
+        protocol.broadcast([self.wfiles[peer] for peer in targets], self.chat_history.encode_last)
+
+    def handle_chat_only(self, sock, line):
+        """One line of input after the game has ended."""
+        if line == "[RESYNC]":
+            self.resync(sock)
+            return
+        # 只有 “[CHAT]…” 的才做聊天广播
+        if not line.startswith("[CHAT]"):
+            protocol.send(self.wfiles[sock], "[INFO] Game over: use /chat or quit to exit.")
+            return
+        self.handle_chat(sock, line)
+
+    # —— game flow ——
+    def start_game(self):
+        self.record('placed', fleets=[format_fleet(board.fleet_placements()) for board in self.boards])
+        # 初始广播棋盘 & 身份
+        for idx, conn in enumerate(self.conns):
+            protocol.send_ship_grid(self.wfiles[conn], self.boards[idx], player_id=idx+1)
+            protocol.send(self.wfiles[conn], f"[INFO] You are Player {idx+1}.")
+            protocol.send(self.wfiles[conn], f"[TOKEN] {self.tokens[idx]}")
+            if len(self.conns) > 2:
+                protocol.send(self.wfiles[conn],
+                              f"[INFO] {len(self.conns)}-player free-for-all: "
+                              f"fire with '<player> <coord>', e.g. '{2 if idx == 0 else 1} B5'.")
+        # 观战者也要看到双方棋盘
+        spec_files = [self.wfiles[spec] for spec in self.spectators]
+        for idx, board in enumerate(self.boards):
+            protocol.broadcast(spec_files, protocol.encode_ship_grid, board, idx+1)
 
-            self.rfiles[conn] = conn.makefile('r')
-            self.wfiles[conn] = conn.makefile('w')
+    def resume_game(self):
+        """Bring the returning players up to date after a server restart."""
+        for idx, conn in enumerate(self.conns):
+            if conn in self.departed:
+                continue
             wf = self.wfiles[conn]
+            protocol.send(wf, "[INFO] Match resumed.")
+            protocol.send(wf, f"[INFO] You are Player {idx+1}.")
+            protocol.send(wf, f"[TOKEN] {self.tokens[idx]}")
+            self.chat_history.replay(wf)
+            self.resync(conn)
+
+    def announce_turn(self):
+        # 通知行动者 & 观战者
+        attacker = self.conns[self.turn_idx]
+        protocol.send(self.wfiles[attacker], f"[TURN] Your move, Player {self.turn_idx+1}.")
+        protocol.broadcast([self.wfiles[spec] for spec in self.spectators],
+                           protocol.encode_text, f"[INFO] Player {self.turn_idx+1} to move.")
+
+    def announce_game_over(self):
+        for c in self.connected():
+            protocol.send(self.wfiles[c], "[INFO] Game over. You may /chat or type quit to exit.")
 
-            protocol.send(wf, "[INFO] You are now spectating.")
-
-            for past_msg in self.chat_history:
-                protocol.send(wf, past_msg)
+    def handle_turn_input(self, sock, line):
+        """
+        Handle one line received during the turn loop; line is None when a
+        free-for-all player has just left (see player_gone()).
+        Returns None to keep waiting for the attacker, 'turn' once the turn
+        prompt should be sent again, or 'over' when the game has been won.
+        """
+        if line is None:
+            return self.handle_departure(sock)
+
+        # —— 聊天优先 ——
+        if line.startswith("[CHAT]"):
+            self.handle_chat(sock, line)
+            return None
+        if line == "[RESYNC]":
+            self.resync(sock)
+            return None
+
+        # —— 射击逻辑，仅限当前行动者 ——
+        attacker = self.conns[self.turn_idx]
+        if sock is not attacker:
+            protocol.send(self.wfiles[sock], "[INFO] Not your turn. Use /chat.")
+            return None
+
+        with metrics.SHOT_TIME.time():
+            won = self.handle_shot(line)
+        return 'over' if won else 'turn'
+
+    def handle_departure(self, sock):
+        """A free-for-all player left: they are out, and may hand over the turn or the win."""
+        idx = self.conns.index(sock)
+        protocol.broadcast([self.wfiles[peer] for peer in self.connected() + self.spectators],
+                           protocol.encode_text, f"[INFO] Player {idx+1} left the game.")
+        if idx in self.out:
+            return None
+        self.out.add(idx)
+        self.record('out', p=idx, why='left')
+        left = self.players_left()
+        if len(left) == 1:
+            protocol.send(self.wfiles[self.conns[left[0]]], "[END] You WIN! Everyone else left.")
+            self.game_over = True
+            self.winner = left[0]
+            self.record('end', p=left[0])
+            return 'over'
+        if idx == self.turn_idx:
+            self.turn_idx = self.next_turn()
+            self.record('turn', p=self.turn_idx)
+            return 'turn'
+        return None
+
+    def placement_timed_out(self, placed):
+        """PLACEMENT_TIMEOUT ran out: the first player still placing is dropped, ending the match."""
+        idx = next(i for i, conn in enumerate(self.conns) if conn not in placed)
+        self.safe_send(self.conns[idx], "[EXIT] Timed out waiting for your ships.")
+        raise SessionClosed(idx)
+
+    def turn_timed_out(self):
+        """The player to move was silent for TURN_TIMEOUT: they are out, as if they had left."""
+        conn = self.conns[self.turn_idx]
+        self.safe_send(conn, "[EXIT] Timed out waiting for your move.")
+        self.player_gone(conn)
+        return self.handle_departure(conn)
+
+    def parse_shot(self, line):
+        """
+        Split a shot into (target player index, coordinate text). The target
+        may be left out while only one opponent is still afloat: "B5" or "3 B5".
+        """
+        targets = [idx for idx in self.players_left() if idx != self.turn_idx]
+        parts = line.split()
+        if len(parts) == 2 and parts[0].isdigit():
+            target = int(parts[0]) - 1
+            if target not in targets:
+                raise ValueError(f"Player {parts[0]} is not an opponent still in the game")
+            return target, parts[1]
+        if len(parts) == 1:
+            if len(targets) != 1:
+                raise ValueError("Name your target, e.g. "
+                                 f"'{targets[0]+1} {parts[0]}'")
+            return targets[0], parts[0]
+        raise ValueError(f"Bad shot '{line}'")
+
+    def handle_shot(self, line) -> bool:
+        """Apply the attacker's shot; return True if it won the game."""
+        attacker = self.conns[self.turn_idx]
+        try:
+            target, coord_text = self.parse_shot(line)
+            defender = self.conns[target]
+            defender_board = self.boards[target]
+            r, c = parse_coordinate(coord_text)
+            result, sunk, fleet_sunk = defender_board.fire(r, c)
+            # a departed defender has no outbox; the shot still counts
+            defender_file = self.wfiles.get(defender)
+            shooter = self.player_name(self.turn_idx)
+            if result == 'hit':
+                protocol.send(self.wfiles[attacker],
+                              f"HIT!{' You sank ' + sunk + '!' if sunk else ''}")
+                if defender_file is not None:
+                    protocol.send(defender_file, f"[DEFENSE] {shooter} hit at {coord_text}.")
+            elif result == 'miss':
+                protocol.send(self.wfiles[attacker], "MISS!")
+                if defender_file is not None:
+                    protocol.send(defender_file, f"[DEFENSE] {shooter} missed at {coord_text}.")
+            else:
+                protocol.send(self.wfiles[attacker], "Already fired there. Try again.")
+                return False
+            self.record('shot', p=self.turn_idx, t=target, at=format_coordinate(r, c),
+                        res=result, sunk=sunk)
+            metrics.SHOTS.inc()
+            self.shot_landed = True
+            self.shots += 1
+
+            # 只广播变化的格子 (full grids are only sent on join / resync)
+            state = defender_board.cell_state(r, c)
+            watchers = [self.wfiles[peer] for peer in self.connected() + self.spectators]
+            protocol.broadcast(watchers, protocol.encode_cell, target + 1, r, c, state)
+
+            # 胜负判断
+            if fleet_sunk:
+                self.out.add(target)
+                self.record('out', p=target, why='sunk')
+                if defender_file is not None:
+                    protocol.send(defender_file, "[END] You LOSE! Fleet destroyed.")
+                if len(self.players_left()) == 1:
+                    protocol.send(self.wfiles[attacker], "[END] You WIN! Fleet destroyed.")
+                    self.game_over = True
+                    self.winner = self.turn_idx
+                    self.record('end', p=self.turn_idx)
+                    return True
+                protocol.broadcast([wf for wf in watchers if wf is not defender_file], protocol.encode_text,
+                                   f"[INFO] Player {target+1} has been eliminated.")
+
+            # 切换回合
+            self.turn_idx = self.next_turn()
+            self.record('turn', p=self.turn_idx)
+        except Exception as e:
+            protocol.send(self.wfiles[attacker], f"Invalid input: {e}")
+        return False
+
+
+class GameSession(BaseSession, threading.Thread):
+    """Handles one match between two or more players on its own thread."""
+    resumable = SNAPSHOT_DIR is not None
+
+    def __init__(self, *conns, session_id=None, on_finish=None, restore=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.init_state(conns, session_id, on_finish, restore=restore)
+        self.rfiles = {c: protocol.LineReader(c) for c in self.connected()}
+        self.wfiles = {}
+        # every connection's input; add_spectator() wakes it from other threads
+        self.selector = WakeableSelector()
+        for c in self.connected():
+            self.wfiles[c] = protocol.QueuedOutbox(c, self.io_stats, c in protocol.binary_peers)
+            self.wfiles[c].limit(PLAYER_HIGH_WATER)
+            self.selector.register(c, selectors.EVENT_READ)
+        # spectators handed over by other threads, taken in by this one
+        self.joining = []
+        self.joining_lock = threading.Lock()
+        self.closed = False
 
-            if self.boards:
-                for idx, board in enumerate(self.boards):
-                    protocol.send_ship_grid(wf, board, player_id=idx+1)
+    def add_spectator(self, conn):
+        """
+        Called from the thread that accepted the spectator. Only the session
+        thread touches the session's files and boards, so the connection is
+        queued for it and it is woken to take the spectator in.
+        """
+        with self.joining_lock:
+            if not self.closed:
+                self.joining.append(conn)
+                self.selector.wake()
+                return
+        wfile = protocol.SocketOutbox(conn, binary=conn in protocol.binary_peers)
+        try:
+            protocol.send(wfile, "[ERROR] That game has finished.")
+        except OSError:
+            pass
+        conn.close()
+
+    def admit_spectators(self):
+        """Welcome the spectators queued by add_spectator(); runs on the session thread."""
+        with self.joining_lock:
+            joining, self.joining = self.joining, []
+        for conn in joining:
+            self.rfiles[conn] = protocol.LineReader(conn)
+            # spectators get a non-blocking queue so a slow one cannot stall the game
+            self.wfiles[conn] = protocol.QueuedOutbox(conn, self.io_stats, conn in protocol.binary_peers)
+            self.wfiles[conn].limit(SPECTATOR_HIGH_WATER, SLOW_SPECTATOR_POLICY)
+            self.welcome_spectator(conn)
+            self.spectators.append(conn)
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def close_conn(self, conn):
+        try:
+            self.selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass    # never registered (an empty seat), or already closed
+        for files in (self.rfiles, self.wfiles):
+            f = files.pop(conn, None)
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        super().close_conn(conn)
 
     def run(self):
-        self.handle_game()
+        # cProfile only sees the thread that enables it, so sessions are profiled here
+        self.profiler = profiling.session_profiler(f"s{self.session_id}")
+        try:
+            self.handle_game()
+        except SessionClosed as e:
+            print(f"[INFO] Session {self.session_id}: {e}")
+            self.notify_departure(e.player_idx)
+        except Exception as e:
+            print(f"[WARN] Session {self.session_id} aborted: {e}")
+            for conn in self.conns:
+                self.safe_send(conn, f"[EXIT] Game aborted: {e}")
+        finally:
+            print(f"[INFO] Session {self.session_id} I/O: {self.io_summary()}")
+            self.profiler.close()
+            with self.joining_lock:
+                self.closed = True
+                # spectators still queued are closed with the rest
+                self.spectators += self.joining
+                self.joining = []
+            # only this session goes away; the listener keeps running
+            self.teardown()
+            self.selector.close()
 
     def placement_phase(self) -> list[Board]:
-        boards = [Board(), Board()]
-        for idx, conn in enumerate(self.conns):
-            protocol.send(self.wfiles[conn], "[REQUEST_PLACEMENT]")
-
-            rows = []
-            while len(rows) < BOARD_SIZE:
-                line = self.rfiles[conn].readline()
-                if not line:
-                    raise ConnectionError("Client disconnected during placement")
-                parts = line.strip().split()
-                if len(parts) != BOARD_SIZE:
-                    continue
-                if any(ch not in (".", "S") for ch in parts):
-                    raise ValueError(f"Bad placement row: {parts}")
-                rows.append(parts)
-
-            temp = []
-            for r, row in enumerate(rows):
-                boards[idx].hidden_grid[r] = row
-                temp.append(row.copy())
-
-            boards[idx].placed_ships = []
-            try_count = 0
-            while try_count < 3:
-                success = True
-                ship_tracker = [row.copy() for row in temp]
-                boards[idx].placed_ships = []
-
-                for ship_name, ship_size in SHIPS:
-                    placed = False
-                    for i in range(BOARD_SIZE):
-                        for j in range(BOARD_SIZE):
-                            if j + ship_size <= BOARD_SIZE and all(ship_tracker[i][j+k] == 'S' for k in range(ship_size)):
-                                pos = {(i, j+k) for k in range(ship_size)}
-                                boards[idx].placed_ships.append({'name': ship_name, 'positions': pos})
-                                for (rr, cc) in pos:
-                                    ship_tracker[rr][cc] = '.'
-                                placed = True
-                                break
-                            if i + ship_size <= BOARD_SIZE and all(ship_tracker[i+k][j] == 'S' for k in range(ship_size)):
-                                pos = {(i+k, j) for k in range(ship_size)}
-                                boards[idx].placed_ships.append({'name': ship_name, 'positions': pos})
-                                for (rr, cc) in pos:
-                                    ship_tracker[rr][cc] = '.'
-                                placed = True
-                                break
-                        if placed:
-                            break
-                    if not placed:
-                        success = False
-                        try_count += 1
-                        print(f"[WARN] Failed to find ship: {ship_name} for Player {idx+1}, retrying...")
-                        break
-
-                if success:
-                    break
-            else:
-                raise ValueError(f"Failed to reconstruct ship layout for Player {idx+1} after retries.")
-
-        return boards
+        boards = {}
+        for conn in self.conns:
+            self.request_placement(conn)
+        # every player may submit at the same time
+        deadline = time.monotonic() + PLACEMENT_TIMEOUT
+        while len(boards) < len(self.conns):
+            got = self.next_line(deadline)
+            if got is None:
+                self.placement_timed_out(boards)
+            sock, line = got
+            # chat is allowed while fleets are being placed, and is never a placement row
+            if line.startswith("[CHAT]"):
+                with self.batch():
+                    self.handle_chat(sock, line)
+            elif sock in self.conns and sock not in boards:
+                with self.profiler.phase('placement'):
+                    board = self.placement_input(sock, line)
+                if board is not None:
+                    boards[sock] = board
+        return [boards[c] for c in self.conns]
+
+    def next_line(self, deadline=None):
+        """
+        Block until any player or spectator sends a line; return (sock, line),
+        or None if the deadline (a time.monotonic() value) passes first.
+        A player leaving a free-for-all comes back as (sock, None).
+        """
+        while True:
+            self.admit_spectators()
+            socks = self.connected() + self.spectators
+            # a line already in a reader's buffer will not wake select()
+            ready = [s for s in socks if self.rfiles[s].has_line()]
+            if not ready:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                events = self.selector.select(timeout)
+                if not events:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return None
+                    continue    # woken to take in a spectator
+                sock = events[0][0].fileobj
+                self.rfiles[sock].fill()
+                if not self.rfiles[sock].has_line():
+                    continue    # only part of a line so far
+                ready = [sock]
+            sock = ready[0]
+            raw = self.rfiles[sock].readline()
+            # 客户端断开或发 quit
+            if raw and raw.strip().lower() != 'quit':
+                return sock, raw.strip()
+            if sock in self.conns:
+                self.player_gone(sock)
+                return sock, None
+            # a spectator leaving only affects itself
+            self.remove_spectator(sock)
 
     def chat_only_phase(self):
-    # 通知玩家游戏结束，可聊天或退出
-        for c in self.conns:
-            protocol.send(self.wfiles[c], "[INFO] Game over. You may /chat or type quit to exit.")
+        # 通知玩家游戏结束，可聊天或退出
+        with self.batch():
+            self.announce_game_over()
         while True:
-            # 等待任意玩家或观战者发来输入
-            ready, _, _ = select.select(self.conns + self.spectators, [], [])
-            for sock in ready:
-                line = self.rfiles[sock].readline()
-                # 客户端断开或发 quit
-                if not line or line.strip().lower() == 'quit':
-                    if sock in self.conns:
-                        other = self.conns[1 - self.conns.index(sock)]
-                        protocol.send(self.wfiles[other], "[EXIT] Server shutting down.")
-                    os._exit(0)
-
-                line = line.strip()
-                # 只有 “[CHAT]…” 的才做聊天广播
-                if not line.startswith("[CHAT]"):
-                    protocol.send(self.wfiles[sock], "[INFO] Game over: use /chat or quit to exit.")
-                    continue
-
-                # 提取消息体
-                msg = line[len("[CHAT]"):].strip()
-
-                # 区分玩家 / 观战者
-                if sock in self.conns:
-                    sid = self.conns.index(sock) + 1
-                    formatted = f"[CHAT] Player {sid}: {msg}"
-                    targets = self.conns + self.spectators
-                else:  # sock in self.spectators
-                    formatted = f"[CHAT] Spectator: {msg}"
-                    targets = self.spectators
-
-                # 缓存历史（可选，也方便新加入观战者补发）
-                self.chat_history.append(formatted)
-                if len(self.chat_history) > 100:
-                    self.chat_history.pop(0)
-
-                # 广播给对应对象
-                for peer in targets:
-                    protocol.send(self.wfiles[peer], formatted)
-
+            # the finished match closes once everyone has gone quiet
+            got = self.next_line(time.monotonic() + TURN_TIMEOUT)
+            if got is None:
+                return
+            with self.profiler.phase('chat'), self.batch():
+                self.handle_chat_only(*got)
 
     def handle_game(self):
-        # —— 1. 布舰阶段 —— 
-        self.boards = self.placement_phase()
-
-        # —— 2. 初始广播棋盘 & 身份 —— 
-        for idx, conn in enumerate(self.conns):
-            protocol.send_ship_grid(self.wfiles[conn], self.boards[idx], player_id=idx+1)
-            protocol.send(self.wfiles[conn], f"[INFO] You are Player {idx+1}.")
-        # 观战者也要看到双方棋盘
-        for spec in self.spectators:
-            for idx, board in enumerate(self.boards):
-                protocol.send_ship_grid(self.wfiles[spec], board, player_id=idx+1)
-
-        # —— 3. 回合循环 —— 
-        turn_idx = 0
+        if self.boards:
+            # resumed after a restart: placement is long done
+            with self.batch():
+                self.resume_game()
+                self.announce_turn()
+        else:
+            # —— 1. 布舰阶段 ——
+            with metrics.PLACEMENT_TIME.time():
+                self.boards = self.placement_phase()
+
+            # —— 2. 初始广播棋盘 & 身份 ——
+            with self.batch():
+                self.start_game()
+                self.announce_turn()
+
+        # —— 3. 回合循环 ——
         while True:
-            attacker = self.conns[turn_idx]
-            defender = self.conns[1 - turn_idx]
-            defender_board = self.boards[1 - turn_idx]
-
-            # 通知行动者 & 观战者
-            protocol.send(self.wfiles[attacker], f"[TURN] Your move, Player {turn_idx+1}.")
-            for spec in self.spectators:
-                protocol.send(self.wfiles[spec], f"[INFO] Player {turn_idx+1} to move.")
-
             # 等待射击或聊天
-            while True:
-                ready, _, _ = select.select(self.conns + self.spectators, [], [])
-                for sock in ready:
-                    raw = self.rfiles[sock].readline()
-                    if not raw or raw.strip().lower() == 'quit':
-                        if sock in self.conns:
-                            other = self.conns[1 - self.conns.index(sock)]
-                            protocol.send(self.wfiles[other], "[EXIT] Server shutting down.")
-                        os._exit(0)
-
-                    line = raw.strip()
-
-                    # —— 聊天优先 —— 
-                    if line.startswith("[CHAT]"):
-                        msg = line[len("[CHAT]"):].strip()
-                        if sock in self.conns:
-                            sid = self.conns.index(sock) + 1
-                            formatted = f"[CHAT] Player {sid}: {msg}"
-                            targets = self.conns + self.spectators
-                        else:
-                            formatted = f"[CHAT] Spectator: {msg}"
-                            targets = self.spectators
-
-                        # 缓存并广播
-                        self.chat_history.append(formatted)
-                        if len(self.chat_history) > 100:
-                            self.chat_history.pop(0)
-                        for peer in targets:
-                            protocol.send(self.wfiles[peer], formatted)
-                        # 聊天处理完，继续等下一个输入
-                        continue
-
-                    # —— 射击逻辑，仅限当前行动者 —— 
-                    if sock is not attacker:
-                        # 其他人试操作就提示
-                        protocol.send(self.wfiles[sock], "[INFO] Not your turn. Use /chat.")
-                        continue
-
-                    # 真正的射击请求
-                    try:
-                        r, c = parse_coordinate(line)
-                        result, sunk = defender_board.fire_at(r, c)
-                        if result == 'hit':
-                            protocol.send(self.wfiles[attacker],
-                                        f"HIT!{' You sank ' + sunk + '!' if sunk else ''}")
-                            protocol.send(self.wfiles[defender],
-                                        f"[DEFENSE] Opponent hit at {line}.")
-                        elif result == 'miss':
-                            protocol.send(self.wfiles[attacker], "MISS!")
-                            protocol.send(self.wfiles[defender],
-                                        f"[DEFENSE] Opponent missed at {line}.")
-                        else:
-                            protocol.send(self.wfiles[attacker], "Already fired there. Try again.")
-                            break
-
-                        # 更新并广播最新棋盘
-                        protocol.send_ship_grid(self.wfiles[defender], defender_board)
-                        protocol.send_board(self.wfiles[attacker], defender_board)
-                        for spec in self.spectators:
-                            for b_idx, b in enumerate(self.boards):
-                                protocol.send_ship_grid(self.wfiles[spec], b, player_id=b_idx+1)
-
-                        # 胜负判断
-                        if result == 'hit' and defender_board.all_ships_sunk():
-                            protocol.send(self.wfiles[attacker], "[END] You WIN! Fleet destroyed.")
-                            protocol.send(self.wfiles[defender], "[END] You LOSE! Fleet destroyed.")
-                            # 跳到仅聊天阶段
-                            self.chat_only_phase()
-                            return
-
-                        # 切换回合
-                        turn_idx = 1 - turn_idx
-
-                    except Exception as e:
-                        protocol.send(self.wfiles[attacker], f"Invalid input: {e}")
-                    # 射击执行完毕，跳出 inner loop 进入下一回合
-                    break
-                else:
-                    # 如果 inner while 没 break，则继续 select
-                    continue
-                break
+            outcome = None
+            deadline = time.monotonic() + TURN_TIMEOUT
+            while outcome is None:
+                got = self.next_line(deadline)
+                # the shot result, deltas and the next [TURN] share one write
+                with self.profiler.phase('turns'), self.batch():
+                    outcome = self.handle_turn_input(*got) if got else self.turn_timed_out()
+                    if outcome == 'turn':
+                        self.announce_turn()
+            if outcome == 'over':
+                # 跳到仅聊天阶段
+                self.chat_only_phase()
+                return
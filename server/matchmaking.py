@@ -0,0 +1,477 @@
+import itertools
+import selectors
+import socket
+import threading
+import time
+from bisect import bisect_left, insort
+from heapq import heappop, heappush
+from config import MAX_PLAYERS, MAX_SPECTATORS, RATING_WINDOW, RATING_WIDEN, RATING_WINDOW_MAX
+import metrics
+import protocol
+from ratings import RatingBook, valid_name
+
+
+def hung_up(conn) -> bool:
+    """
+    True if a queued connection has closed. Sockets are checked with a
+    peek that never blocks (select() cannot take fds past FD_SETSIZE);
+    other connections (e.g. the async server's StreamConn) answer through
+    their own hung_up().
+    """
+    check = getattr(conn, 'hung_up', None)
+    if check is not None:
+        return check()
+    try:
+        # nothing to peek at yet means still connected; b"" is end of input
+        return conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+class Waiting:
+    """One player in the lobby."""
+    __slots__ = ('conn', 'name', 'rating', 'joined', 'seq', 'gone')
+
+    def __init__(self, conn, name, rating, joined, seq):
+        self.conn = conn
+        self.name = name
+        self.rating = rating
+        self.joined = joined
+        self.seq = seq      # breaks ties between equal ratings or join times
+        self.gone = False   # matched or left
+
+
+class Bucket:
+    """
+    The players in one band of ratings: sorted by rating for window lookups,
+    and in a heap by join time for the oldest. Players leave by_rating as
+    soon as they are matched or leave; by_age drops them when they reach its
+    top.
+    """
+    __slots__ = ('by_rating', 'by_age')
+
+    def __init__(self):
+        self.by_rating = []  # (rating, seq, Waiting), sorted
+        self.by_age = []     # (joined, seq, Waiting), a heap
+
+    def add(self, entry) -> None:
+        insort(self.by_rating, (entry.rating, entry.seq, entry))
+        heappush(self.by_age, (entry.joined, entry.seq, entry))
+
+    def discard(self, entry) -> None:
+        at = bisect_left(self.by_rating, (entry.rating, entry.seq))
+        if at < len(self.by_rating) and self.by_rating[at][2] is entry:
+            del self.by_rating[at]
+
+    def oldest(self):
+        while self.by_age and self.by_age[0][2].gone:
+            heappop(self.by_age)
+        return self.by_age[0][2] if self.by_age else None
+
+
+class LobbyQueue:
+    """
+    Waiting players bucketed by rating: one Bucket per RATING_WINDOW/2
+    points of rating, plus a sorted list of the buckets in use. Two players
+    may meet if their ratings are within the wider of their two windows; a
+    window starts at RATING_WINDOW and grows by RATING_WIDEN points for
+    every second spent waiting, up to RATING_WINDOW_MAX.
+
+    match() walks outwards from one player's bucket and, within a bucket,
+    outwards from their rating (found by bisection), taking the nearest
+    players that fit. The oldest player in a bucket has its widest window,
+    which bounds the search there; buckets beyond RATING_WINDOW_MAX end it.
+    Finding a match therefore costs O(log n) for a bucket whose nearest
+    players fit, however many players are waiting.
+    """
+
+    def __init__(self, window=RATING_WINDOW, widen=RATING_WIDEN, window_max=RATING_WINDOW_MAX):
+        self.window_min = window
+        self.widen = widen
+        self.window_max = max(window_max, window)
+        self.width = max(1, window // 2)
+        self.buckets = {}   # bucket index -> Bucket
+        self.keys = []      # sorted indexes of the buckets in self.buckets
+        self.entries = {}   # conn -> Waiting
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def window(self, entry, now) -> float:
+        return min(self.window_max, self.window_min + self.widen * (now - entry.joined))
+
+    def push(self, conn, name, rating, joined) -> Waiting:
+        entry = Waiting(conn, name, rating, joined, next(self._seq))
+        key = self._key(rating)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket()
+            insort(self.keys, key)
+        bucket.add(entry)
+        self.entries[conn] = entry
+        return entry
+
+    def requeue(self, entry) -> Waiting:
+        """Put a player taken by match() back in the queue, in the place they had."""
+        return self.push(entry.conn, entry.name, entry.rating, entry.joined)
+
+    def remove(self, conn) -> None:
+        entry = self.entries.pop(conn, None)
+        if entry is None:
+            return
+        entry.gone = True
+        key = self._key(entry.rating)
+        bucket = self.buckets[key]
+        bucket.discard(entry)
+        if not bucket.by_rating:
+            del self.buckets[key]
+            del self.keys[bisect_left(self.keys, key)]
+
+    def oldest(self, now) -> float:
+        """Seconds the longest-waiting player has been queued."""
+        heads = [self.buckets[key].oldest() for key in self.keys]
+        return max((now - entry.joined for entry in heads if entry is not None), default=0.0)
+
+    def match(self, anchor, now, size):
+        """
+        Find size-1 players to play 'anchor'. Returns the whole group (which
+        leaves the queue) in the order they joined, or None.
+        """
+        picked = []
+        reach = self.window(anchor, now)
+        for key in self._nearest_keys(self._key(anchor.rating)):
+            nearest_gap = abs(key * self.width - anchor.rating) - self.width
+            if nearest_gap > self.window_max:
+                break
+            bucket = self.buckets[key]
+            # nobody in this bucket has a wider window than its oldest player
+            bound = max(reach, self.window(bucket.oldest(), now))
+            if nearest_gap > bound:
+                continue
+            for entry in self._nearest_in(bucket, anchor, bound):
+                if abs(entry.rating - anchor.rating) <= max(reach, self.window(entry, now)):
+                    picked.append(entry)
+                    if len(picked) == size - 1:
+                        break
+            if len(picked) == size - 1:
+                break
+        if len(picked) < size - 1:
+            return None
+        group = sorted(picked + [anchor], key=lambda entry: (entry.joined, entry.seq))
+        for entry in group:
+            self.remove(entry.conn)
+        return group
+
+    def sweep(self, now, size) -> list:
+        """Match whoever can be matched now that windows have widened; oldest first."""
+        groups = []
+        heads = [self.buckets[key].oldest() for key in self.keys]
+        for anchor in sorted(heads, key=lambda entry: (entry.joined, entry.seq)):
+            if not anchor.gone:
+                group = self.match(anchor, now, size)
+                if group is not None:
+                    groups.append(group)
+        return groups
+
+    def _key(self, rating) -> int:
+        return int(rating // self.width)
+
+    @staticmethod
+    def _nearest_in(bucket, anchor, bound):
+        """A bucket's players other than 'anchor', nearest in rating first, up to 'bound' away."""
+        ratings = bucket.by_rating
+        upper = bisect_left(ratings, (anchor.rating,))
+        lower = upper - 1
+        while True:
+            below = anchor.rating - ratings[lower][0] if lower >= 0 else None
+            above = ratings[upper][0] - anchor.rating if upper < len(ratings) else None
+            if below is not None and (above is None or below <= above):
+                gap, entry = below, ratings[lower][2]
+                lower -= 1
+            elif above is not None:
+                gap, entry = above, ratings[upper][2]
+                upper += 1
+            else:
+                return
+            if gap > bound:
+                return
+            if entry is not anchor:
+                yield entry
+
+    def _nearest_keys(self, key):
+        """Buckets in use, nearest to 'key' first."""
+        upper = bisect_left(self.keys, key)
+        lower = upper - 1
+        keys = self.keys
+        while lower >= 0 or upper < len(keys):
+            if upper >= len(keys) or (lower >= 0 and key - keys[lower] <= keys[upper] - key):
+                yield keys[lower]
+                lower -= 1
+            else:
+                yield keys[upper]
+                upper += 1
+
+
+class Matchmaker:
+    """
+    Pairs waiting players into independent sessions and keeps a registry of
+    the sessions that are still running.
+
+    session_factory(session_id, conns, on_finish, restore=None) must return
+    an object with .start(), .is_alive(), .spectators and .add_spectator(conn).
+    The session calls on_finish(session_id, winner) once it is over so its
+    slot is released; winner is the winning player's index, or None.
+    'restore' is a saved match state to resume (see recovery.py).
+
+    Players wait in a LobbyQueue and are matched by rating. sweep() must be
+    called every second or so to match players whose window has widened;
+    it also drops queued players who have hung up. Queued sockets sit in a
+    selector for readability, so only those with input (or end of input)
+    are checked; connections without a fileno (the async server's) answer
+    through their own hung_up().
+    """
+
+    def __init__(self, session_factory, players_per_match=MAX_PLAYERS, ratings=None):
+        self.session_factory = session_factory
+        self.players_per_match = players_per_match
+        self.queue = LobbyQueue()
+        self.ratings = ratings or RatingBook()
+        self.sessions = {}          # session_id -> session
+        self.names = {}             # session_id -> player names, for rated matches
+        self.lock = threading.Lock()
+        self.lobby = selectors.DefaultSelector()   # queued sockets, watched for hang-ups
+        self.unwatched = set()      # queued connections the selector cannot take
+        self._ids = itertools.count(1)
+
+    def waiting_count(self) -> int:
+        with self.lock:
+            return len(self.queue)
+
+    def admit(self, conn, wfile, line, accepted=None, resumes=None) -> bool:
+        """
+        Act on the role line a new connection sent: "/player [name]",
+        "/spectator [id]", "/resume <token>" or "/bot", each optionally
+        followed by the binary framing token. Refused connections are told
+        why and closed. Returns True for "/bot": the caller seats the AI
+        opponent, since the threaded and asyncio servers start it differently.
+        """
+        # only the command is case-insensitive: names keep the case they were given in
+        parts = line.split()
+        if parts:
+            parts[0] = parts[0].lower()
+        if protocol.BINARY_TOKEN in parts:
+            parts.remove(protocol.BINARY_TOKEN)
+            protocol.send(wfile, protocol.BINARY_ACK)
+            wfile.binary = True
+            protocol.binary_peers.add(conn)
+        choice = parts[0] if parts else ''
+
+        # ─── Spectator ───────────────────────────────────────────
+        # "/spectator" joins the newest match, "/spectator <id>" a specific one
+        if choice == '/spectator':
+            session_id = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+            sess = self.find_session(session_id)
+            if sess is None:
+                protocol.send(wfile, "[ERROR] No game in progress. Try again later.")
+                conn.close()
+            elif len(sess.spectators) >= MAX_SPECTATORS:
+                protocol.send(wfile, "[ERROR] Spectator limit reached.")
+                conn.close()
+            else:
+                sess.add_spectator(conn)
+
+        # ─── Player ──────────────────────────────────────────────
+        # "/player" plays unrated, "/player <name>" is matched and rated by name
+        elif choice == '/player':
+            name = parts[1] if len(parts) > 1 else None
+            if name is not None and not valid_name(name):
+                protocol.send(wfile, "[ERROR] Names are 1-20 letters, digits, '-' or '_'.")
+                conn.close()
+                return False
+            protocol.send(wfile, "[INFO] Waiting for another player…"
+                                 + (f" (rating {self.ratings.rating(name):.0f})" if name else ""))
+            session = self.add_player(conn, accepted, name)
+            if session is not None:
+                print(f"[INFO] Started session {session.session_id} "
+                      f"({len(self.live_sessions())} live)")
+
+        # ─── Back into a match after a server restart ────────────
+        elif choice == '/resume':
+            if resumes is None:
+                protocol.send(wfile, "[ERROR] Nothing to resume.")
+                conn.close()
+            else:
+                resumes.claim(parts[1].lower() if len(parts) > 1 else '', conn, wfile)
+
+        # ─── Single player against the AI ───────────────────────
+        elif choice == '/bot':
+            try:
+                import bot  # the AI needs numpy
+            except ImportError as e:
+                protocol.send(wfile, f"[ERROR] AI opponent unavailable: {e}")
+                conn.close()
+                return False
+            protocol.send(wfile, "[INFO] Matched against an AI opponent.")
+            return True
+
+        # ─── Invalid ────────────────────────────────────────────
+        else:
+            protocol.send(wfile, "[ERROR] Invalid command.")
+            conn.close()
+        return False
+
+    def add_player(self, conn, accepted=None, name=None):
+        """
+        Queue a player; start a session as soon as they have opponents.
+        'accepted' is when the connection was accepted (time.monotonic()), so
+        the wait metric includes the handshake; it defaults to now. Named
+        players are matched and rated by their name's rating.
+        """
+        rating = self.ratings.rating(name)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.queue.push(conn, name, rating, now if accepted is None else accepted)
+            self._watch(conn)
+            group = self._match(entry, now)
+        if group is None:
+            return None
+        return self._start_group(group, now)
+
+    def _match(self, anchor, now):
+        """
+        queue.match(), minus anyone who hung up while they waited: they are
+        dropped and the rest of their group goes back in the queue.
+        """
+        while True:
+            group = self.queue.match(anchor, now, self.players_per_match)
+            if group is None:
+                return None
+            gone = [entry for entry in group if hung_up(entry.conn)]
+            if not gone:
+                for entry in group:
+                    self._unwatch(entry.conn)
+                return group
+            for entry in group:
+                if entry in gone:
+                    self._unwatch(entry.conn)
+                    entry.conn.close()
+                    continue
+                requeued = self.queue.requeue(entry)
+                if entry is anchor:
+                    anchor = requeued
+            if anchor.gone:
+                return None
+
+    def sweep(self) -> list:
+        """Drop players who left the lobby, then start every match the widened windows allow."""
+        with self.lock:
+            suspects = [key.fileobj for key, _ in self.lobby.select(0)] + list(self.unwatched)
+        for conn in suspects:
+            if hung_up(conn):
+                self.discard_player(conn)
+                conn.close()
+        now = time.monotonic()
+        with self.lock:
+            groups = self.queue.sweep(now, self.players_per_match)
+            for group in groups:
+                for entry in group:
+                    self._unwatch(entry.conn)
+        return [self._start_group(group, now) for group in groups]
+
+    def sweep_forever(self, interval=1.0) -> None:
+        while True:
+            time.sleep(interval)
+            for session in self.sweep():
+                print(f"[INFO] Started session {session.session_id} "
+                      f"({len(self.live_sessions())} live)")
+
+    def _start_group(self, group, now):
+        for entry in group:
+            metrics.MATCH_WAIT.observe(now - entry.joined)
+        ratings = [entry.rating for entry in group]
+        metrics.MATCH_RATING_GAP.observe(max(ratings) - min(ratings))
+        names = [entry.name for entry in group]
+        return self.start_match([entry.conn for entry in group],
+                                names=names if all(names) else None)
+
+    def start_match(self, conns, session_id=None, restore=None, names=None):
+        """
+        Start a session for these connections right away, bypassing the queue.
+        A resumed match keeps the id it had before the restart. With 'names'
+        (every player's name) the result counts towards their ratings.
+        """
+        with self.lock:
+            if session_id is None:
+                session_id = next(self._ids)
+            session = self.session_factory(session_id, conns, self.remove, restore)
+            self.sessions[session_id] = session
+            if names is not None:
+                self.names[session_id] = names
+        metrics.SESSIONS_STARTED.inc()
+        session.start()
+        return session
+
+    def reserve_ids(self, last_id) -> None:
+        """New sessions get ids above last_id (e.g. those of matches being resumed)."""
+        with self.lock:
+            self._ids = itertools.count(last_id + 1)
+
+    def discard_player(self, conn) -> None:
+        """Drop a player that left before being matched."""
+        with self.lock:
+            self.queue.remove(conn)
+            self._unwatch(conn)
+
+    def _watch(self, conn) -> None:
+        """Have sweep() notice when a queued connection hangs up; call with the lock held."""
+        if getattr(conn, 'hung_up', None) is None:
+            try:
+                self.lobby.register(conn, selectors.EVENT_READ)
+                return
+            except (KeyError, ValueError, OSError):
+                pass    # no usable fileno: polled instead
+        self.unwatched.add(conn)
+
+    def _unwatch(self, conn) -> None:
+        """Stop watching a connection that has left the queue; before it is closed."""
+        self.unwatched.discard(conn)
+        try:
+            self.lobby.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+
+    def remove(self, session_id, winner=None) -> None:
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            names = self.names.pop(session_id, None)
+        if names is not None and winner is not None:
+            self.ratings.record(names, winner)
+
+    def find_session(self, session_id=None):
+        """Look up a live session by id, or the newest one if no id is given."""
+        with self.lock:
+            if session_id is not None:
+                sess = self.sessions.get(session_id)
+                return sess if sess is not None and sess.is_alive() else None
+            for sid in sorted(self.sessions, reverse=True):
+                if self.sessions[sid].is_alive():
+                    return self.sessions[sid]
+        return None
+
+    def live_sessions(self) -> list:
+        with self.lock:
+            return [s for s in self.sessions.values() if s.is_alive()]
+
+    def oldest_wait(self) -> float:
+        with self.lock:
+            return self.queue.oldest(time.monotonic())
+
+    def export_metrics(self) -> None:
+        """Have the /metrics gauges read this matchmaker's queue and sessions."""
+        metrics.PLAYERS_WAITING.read = self.waiting_count
+        metrics.QUEUE_OLDEST.read = self.oldest_wait
+        metrics.SESSIONS_ACTIVE.read = lambda: len(self.live_sessions())
+        metrics.SPECTATORS.read = lambda: sum(len(s.spectators) for s in self.live_sessions())
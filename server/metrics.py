@@ -0,0 +1,179 @@
+"""
+Process-wide counters, gauges and histograms, served in the Prometheus text
+format on http://HOST:METRICS_PORT/metrics so we can see where time goes
+under load.
+
+Metrics are plain module-level objects; updating one takes a lock and a
+few arithmetic operations, so they are safe to use on the hot paths (every
+send, every shot). Gauges can read their value from a callback when it is
+scraped instead of being kept up to date.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REGISTRY = []
+
+# seconds; fine-grained at the low end for per-message work
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# seconds; for things that wait on people (matchmaking, placement)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def render(self) -> list[str]:
+        return self.header() + [f"{self.name} {self.value}"]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, read=None):
+        super().__init__(name, help_text)
+        self.value = 0
+        self.read = read    # callback giving the current value at scrape time
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def inc(self, amount=1) -> None:
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1) -> None:
+        self.inc(-amount)
+
+    def render(self) -> list[str]:
+        value = self.value
+        if self.read is not None:
+            try:
+                value = self.read()
+            except Exception:
+                value = float('nan')
+        return self.header() + [f"{self.name} {value}"]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value) -> None:
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe how long the with-block took, unless it raised."""
+        start = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - start)
+
+    def render(self) -> list[str]:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = self.header()
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ─── The server's metrics ──────────────────────────────────────────────
+CONNECTIONS = Counter('beer_connections_total', "Client connections accepted.")
+SESSIONS_STARTED = Counter('beer_sessions_started_total', "Matches started.")
+SESSIONS_ACTIVE = Gauge('beer_sessions_active', "Matches currently running.")
+PLAYERS_WAITING = Gauge('beer_players_waiting', "Players queued for a match.")
+QUEUE_OLDEST = Gauge('beer_queue_oldest_seconds', "How long the longest-waiting queued player has waited.")
+SPECTATORS = Gauge('beer_spectators', "Spectators watching a match.")
+MESSAGES_SENT = Counter('beer_messages_sent_total', "Messages queued for clients.")
+BYTES_SENT = Counter('beer_bytes_sent_total', "Bytes handed to the OS for clients.")
+SHOTS = Counter('beer_shots_total', "Shots that hit or missed.")
+MATCH_WAIT = Histogram('beer_match_wait_seconds',
+                       "Time from accepting a player to starting their match.", WAIT_BUCKETS)
+MATCH_RATING_GAP = Histogram('beer_match_rating_gap', "Rating spread between the players of a new match.",
+                             (0, 25, 50, 100, 200, 400, 800, 1600))
+PLACEMENT_TIME = Histogram('beer_placement_seconds',
+                           "Time from requesting placements to every fleet being valid.", WAIT_BUCKETS)
+SHOT_TIME = Histogram('beer_shot_seconds', "Time to apply one shot and queue its results.")
+SEND_TIME = Histogram('beer_send_seconds', "Time spent in one write to a client socket.")
+SEND_QUEUE_MAX = Gauge('beer_send_queue_max_bytes',
+                       "Deepest outbound backlog (bytes not yet taken) of any open connection.")
+SEND_QUEUE_DROPPED = Counter('beer_send_queue_dropped_bytes_total',
+                             "Bytes of updates skipped for spectators over their high-water mark.")
+SEND_QUEUE_EVICTIONS = Counter('beer_send_queue_evictions_total',
+                               "Connections cut off for falling past their high-water mark.")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass    # scrapes are not worth a line each
+
+
+def serve(host, port):
+    """Serve /metrics from a daemon thread; returns the server, or None if the port is taken."""
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"[WARN] Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Metrics on http://{host}:{port}/metrics")
+    return server
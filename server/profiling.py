@@ -0,0 +1,144 @@
+"""
+Opt-in CPU and allocation profiling per session (threaded server only).
+
+With PROFILE_MODE set, a sampled fraction (PROFILE_SAMPLE) of sessions gets
+a SessionProfiler. The session wraps the handling of each event in
+profiler.phase(name) -- 'placement', 'turns' or 'chat' -- and so does the
+Handshaker thread for each new connection's role line. Only the handling is profiled, never
+the wait for the next line. Each phase keeps one cProfile.Profile that
+gathers CPU samples across all of its events, so a dump shows the whole
+phase so far.
+
+A phase is dumped to PROFILE_DIR when one of its events takes longer than
+PROFILE_THRESHOLD seconds, or on demand: `kill -USR1 <pid>` on the server
+(or on one of its --workers processes) makes every profiled session there
+dump at its next event. Files are <time>-<label>-<phase>.prof (open with
+pstats or snakeviz) and, in 'alloc' mode, <time>-<label>-<phase>.alloc.txt
+with the allocation sites that grew the most since the phase began.
+tracemalloc traces the whole process, so allocation dumps include the
+other sessions running at the time.
+
+When profiling is off, phase() returns one shared nullcontext, so the cost
+is a method call per event.
+
+    python -m pstats profiles/20250101-120000-s3-turns.prof
+"""
+import cProfile
+import os
+import random
+import signal
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from config import PROFILE_MODE, PROFILE_SAMPLE, PROFILE_DIR, PROFILE_THRESHOLD
+
+MODES = (None, 'cpu', 'alloc', 'both')
+ALLOC_TOP = 30
+
+# bumped by SIGUSR1; a profiler dumps when it sees a new value
+_requests = 0
+
+
+class NullProfiler:
+    """What unprofiled sessions get: phase() does nothing."""
+    _null = nullcontext()
+
+    def phase(self, name):
+        return self._null
+
+    def close(self):
+        pass
+
+
+NULL = NullProfiler()
+
+
+class SessionProfiler:
+    """cProfile / tracemalloc data for one session (or the matchmaking loop), per phase."""
+
+    def __init__(self, label, mode=PROFILE_MODE, directory=PROFILE_DIR, threshold=PROFILE_THRESHOLD):
+        self.label = label
+        self.cpu = mode in ('cpu', 'both')
+        self.alloc = mode in ('alloc', 'both')
+        self.directory = directory
+        self.threshold = threshold
+        self.profiles = {}      # phase -> cProfile.Profile
+        self.baselines = {}     # phase -> tracemalloc snapshot taken when it began
+        self.seen = _requests
+
+    @contextmanager
+    def phase(self, name):
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = cProfile.Profile()
+            if self.alloc:
+                self.baselines[name] = tracemalloc.take_snapshot()
+        enabled = self._enable(profile)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if enabled:
+                profile.disable()
+            if elapsed >= self.threshold:
+                print(f"[INFO] {self.label} {name}: one event took {elapsed*1000:.1f} ms, dumping profile")
+                self.dump(name)
+            elif self.seen != _requests:
+                self.seen = _requests
+                for phase in self.profiles:
+                    self.dump(phase)
+
+    def _enable(self, profile) -> bool:
+        if not self.cpu:
+            return False
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process
+            return False
+        return True
+
+    def dump(self, phase) -> None:
+        base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.label}-{phase}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.cpu:
+                self.profiles[phase].dump_stats(base + ".prof")
+            if self.alloc:
+                growth = tracemalloc.take_snapshot().compare_to(self.baselines[phase], 'lineno')
+                with open(base + ".alloc.txt", 'w', encoding='utf-8') as f:
+                    for stat in growth[:ALLOC_TOP]:
+                        print(stat, file=f)
+        except OSError as e:
+            print(f"[WARN] {self.label}: profile not written ({e})")
+
+    def close(self) -> None:
+        self.profiles.clear()
+        self.baselines.clear()
+
+
+def session_profiler(label, always=False):
+    """A SessionProfiler if this one is sampled (or 'always'), else NULL."""
+    if PROFILE_MODE is None or not (always or random.random() < PROFILE_SAMPLE):
+        return NULL
+    return SessionProfiler(label)
+
+
+def _request_dump(signum, frame) -> None:
+    global _requests
+    _requests += 1
+
+
+def install() -> None:
+    """Start allocation tracing if asked for and dump on SIGUSR1; call from the main thread."""
+    if PROFILE_MODE not in MODES:
+        raise ValueError(f"PROFILE_MODE must be one of {MODES}, not {PROFILE_MODE!r}")
+    if PROFILE_MODE is None:
+        return
+    if PROFILE_MODE in ('alloc', 'both') and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _request_dump)
+    print(f"[INFO] Profiling {PROFILE_SAMPLE:.0%} of sessions ({PROFILE_MODE}) into {PROFILE_DIR}/")
@@ -1,30 +1,738 @@
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+import weakref
+from collections import deque
 from typing import TextIO
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from battleship import format_coordinate, row_label
+import metrics
+import profiling
+from background import WakeableSelector, shared
+
+# ─── Binary framing (opt-in) ────────────────────────────────────────────
+# The server advertises it in the handshake header ("[COUNT] 0/2 +bin1"); a
+# client opts in by adding the token to its role ("/player +bin1"). The
+# server answers "[BINARY] bin1" as a text line, and from then on everything
+# it sends on that connection is a frame:
+#     2-byte big-endian length | 1-byte opcode | payload
+# where length counts the opcode and payload. Client -> server stays text.
+BINARY_TOKEN = "+bin1"
+BINARY_ACK = "[BINARY] bin1"
+
+OP_TEXT, OP_HIT, OP_MISS, OP_TURN, OP_CHAT, OP_CELL, OP_GRID, OP_SHIPS = range(8)
+# single-line messages with their own opcode; the prefix is not sent
+LINE_OPCODES = (("HIT!", OP_HIT), ("MISS!", OP_MISS), ("[TURN]", OP_TURN), ("[CHAT]", OP_CHAT))
+LINE_PREFIXES = {op: prefix for prefix, op in LINE_OPCODES}
+# boards travel as 2 bits per cell, four cells per byte, row-major
+CELL_SYMBOLS = ".SXo"
+CELL_CODES = {sym: code for code, sym in enumerate(CELL_SYMBOLS)}
+FRAME_HEADER = struct.Struct(">HB")
+# the length field counts the opcode, so this is the most one frame can carry
+MAX_FRAME_PAYLOAD = 0xFFFF - 1
+# longest line read from a client; the rest of a longer one is dropped, so
+# a chat line always fits in a frame
+MAX_LINE = 4096
+# GRID / SHIPS: player id (0 = none), board size, then the packed cells.
+# A frame holds at most 65535 bytes, so binary boards top out at 511x511.
+BOARD_HEADER = struct.Struct(">BH")
+# CELL: player id, row, column, cell code
+CELL_BODY = struct.Struct(">BHHB")
+
+# connections (sockets or StreamConns) that opted in, so sessions can pick
+# the right Outbox
+binary_peers = weakref.WeakSet()
+
+
+def frame(op: int, payload: bytes = b"") -> bytes:
+    if len(payload) > MAX_FRAME_PAYLOAD:
+        raise ValueError(f"{len(payload)}-byte payload does not fit in a frame "
+                         f"(at most {MAX_FRAME_PAYLOAD})")
+    return FRAME_HEADER.pack(len(payload) + 1, op) + payload
+
+
+def encode_line(msg: str) -> bytes:
+    for prefix, op in LINE_OPCODES:
+        if msg.startswith(prefix):
+            return frame(op, msg[len(prefix):].strip().encode())
+    return frame(OP_TEXT, msg.encode())
+
+
+def decode_line(op: int, payload: bytes) -> str:
+    """Inverse of encode_line(): the text line a frame stands for."""
+    text = payload.decode()
+    prefix = LINE_PREFIXES.get(op)
+    if prefix is None:
+        return text
+    return f"{prefix} {text}" if text else prefix
+
+
+def pack_grid(rows) -> bytes:
+    codes = [CELL_CODES.get(sym, 0) for row in rows for sym in row]
+    codes += [0] * (-len(codes) % 4)
+    return bytes(a | b << 2 | c << 4 | d << 6 for a, b, c, d in zip(*[iter(codes)] * 4))
+
+
+def unpack_grid(data: bytes, size: int) -> list:
+    cells = [CELL_SYMBOLS[byte >> shift & 3] for byte in data for shift in (0, 2, 4, 6)]
+    return [cells[r * size:(r + 1) * size] for r in range(size)]
 
-def send(wfile: TextIO, msg: str) -> None:
-    """Send a single-line message to the client."""
-    wfile.write(msg + "\n")
-    wfile.flush()
 
+def unpack_board(payload: bytes):
+    """GRID / SHIPS payload -> (player id or 0, rows of symbols)."""
+    player_id, size = BOARD_HEADER.unpack_from(payload)
+    return player_id, unpack_grid(payload[BOARD_HEADER.size:], size)
 
-def send_board(wfile: TextIO, board) -> None:
-    """Send the opponent's visible grid to the attacker."""
-    wfile.write("GRID\n")
-    wfile.write("  " + " ".join(str(i + 1).rjust(2) for i in range(board.size)) + "\n")
+
+def unpack_cell(payload: bytes):
+    """CELL payload -> (player id, row, col, symbol)."""
+    player_id, row, col, code = CELL_BODY.unpack(payload)
+    return player_id, row, col, CELL_SYMBOLS[code]
+
+
+def read_frame(rfile):
+    """Read one frame from a binary file object; (opcode, payload) or None at EOF."""
+    header = rfile.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    length, op = FRAME_HEADER.unpack(header)
+    payload = rfile.read(length - 1)
+    if len(payload) < length - 1:
+        return None
+    return op, payload
+
+
+# ─── Encoders: one message -> the bytes for one framing ─────────────────
+def encode_text(msg: str, binary: bool = False) -> bytes:
+    return encode_line(msg) if binary else (msg + "\n").encode()
+
+
+def encode_board(board, player_id=None, binary: bool = False) -> bytes:
+    """
+    An opponent's visible grid, as seen by the attacker. The header names
+    the owner ("GRID 3") when there is more than one opponent.
+    """
+    if binary:
+        return frame(OP_GRID, BOARD_HEADER.pack(player_id or 0, board.size) + pack_grid(board.display_grid))
+    lines = ["GRID" if player_id is None else f"GRID {player_id}",
+             "  " + " ".join(str(i + 1).rjust(2) for i in range(board.size))]
     for r in range(board.size):
-        row_label = chr(ord('A') + r)
-        row_str   = " ".join(board.display_grid[r][c] for c in range(board.size))
-        wfile.write(f"{row_label:2} {row_str}\n")
-    wfile.write("\n")
+        lines.append(f"{row_label(r):2} " + " ".join(board.row_symbols(r, hidden=False)))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def encode_ship_grid(board, player_id=None, binary: bool = False) -> bytes:
+    """A defender's hidden grid (their ship layout)."""
+    if binary:
+        return frame(OP_SHIPS, BOARD_HEADER.pack(player_id or 0, board.size) + pack_grid(board.hidden_grid))
+    lines = ["[SHIPS]"]
+    if player_id is not None:
+        lines.append(f"Player {player_id}")
+    lines += [" ".join(board.row_symbols(r)) for r in range(board.size)]
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def encode_cell(player_id: int, row: int, col: int, state: str, binary: bool = False) -> bytes:
+    """A single changed cell of a player's board, e.g. "CELL 2 B5 X"."""
+    if binary:
+        return frame(OP_CELL, CELL_BODY.pack(player_id, row, col, CELL_CODES[state]))
+    return f"CELL {player_id} {format_coordinate(row, col)} {state}\n".encode()
+
+
+def _write(wfile, data: bytes, messages: int = 1) -> None:
+    metrics.MESSAGES_SENT.inc(messages)
+    if isinstance(wfile, Outbox):
+        wfile.write_bytes(data)
+    else:
+        wfile.write(data.decode())
     wfile.flush()
 
 
+def send(wfile: TextIO, msg: str) -> None:
+    """Send a single-line message to the client."""
+    _write(wfile, encode_text(msg, getattr(wfile, 'binary', False)))
+
+
+def send_many(wfile: TextIO, msgs) -> None:
+    """Send several single-line messages as one write."""
+    binary = getattr(wfile, 'binary', False)
+    msgs = list(msgs)
+    _write(wfile, b"".join(encode_text(msg, binary) for msg in msgs), len(msgs))
+
+
+def send_board(wfile: TextIO, board, player_id=None) -> None:
+    """Send an opponent's visible grid to the attacker."""
+    _write(wfile, encode_board(board, player_id, getattr(wfile, 'binary', False)))
+
+
 def send_ship_grid(wfile: TextIO, board, player_id=None) -> None:
     """Send the defender's hidden grid (their ship layout)."""
-    wfile.write("[SHIPS]\n")
-    if player_id is not None:
-        wfile.write(f"Player {player_id}\n")
-    for r in range(board.size):
-        wfile.write(" ".join(board.hidden_grid[r]) + "\n")
-    wfile.write("\n")
-    wfile.flush()
+    _write(wfile, encode_ship_grid(board, player_id, getattr(wfile, 'binary', False)))
+
+
+def send_cell(wfile: TextIO, player_id: int, row: int, col: int, state: str) -> None:
+    """Send a single changed cell of a player's board, e.g. "CELL 2 B5 X"."""
+    _write(wfile, encode_cell(player_id, row, col, state, getattr(wfile, 'binary', False)))
+
+
+def broadcast(wfiles, encode, *args) -> None:
+    """
+    Send one message to many Outboxes. encode(*args, binary=...) runs once
+    per framing and the resulting bytes object is shared by every receiver.
+    """
+    encoded = {}
+    count = 0
+    for wfile in wfiles:
+        count += 1
+        data = encoded.get(wfile.binary)
+        if data is None:
+            data = encoded[wfile.binary] = encode(*args, binary=wfile.binary)
+        wfile.write_bytes(data)
+        wfile.flush()
+    metrics.MESSAGES_SENT.inc(count)
+
+
+class ChatLog:
+    """
+    The last 'capacity' chat lines, in a fixed-size ring (appending never
+    moves the other lines). Once a framing has been asked for, each new
+    line is encoded for it as it is added, and the joined backlog is cached
+    until the next line, so a late joiner's replay is one write and a room
+    full of joiners costs one join per framing. A session nobody reads in
+    binary never encodes a binary line.
+    """
+
+    def __init__(self, capacity: int, lines=()):
+        self.lines = deque(lines, maxlen=capacity)
+        self.encoded = {}   # binary -> encoded lines, from the first time that framing is used
+        self.backlog = {}   # binary -> the whole log encoded, until the next append
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def append(self, line: str) -> None:
+        self.lines.append(line)
+        for binary, encoded in self.encoded.items():
+            encoded.append(encode_text(line, binary))
+        self.backlog.clear()
+
+    def _encoded(self, binary: bool):
+        encoded = self.encoded.get(binary)
+        if encoded is None:
+            encoded = self.encoded[binary] = deque((encode_text(line, binary) for line in self.lines),
+                                                   maxlen=self.lines.maxlen)
+        return encoded
+
+    def encode_last(self, binary: bool = False) -> bytes:
+        """The newest line, already encoded; pass to broadcast() to send it."""
+        return self._encoded(binary)[-1]
+
+    def replay(self, wfile) -> None:
+        """Send the whole log to one connection in a single write."""
+        if not self.lines:
+            return
+        binary = getattr(wfile, 'binary', False)
+        data = self.backlog.get(binary)
+        if data is None:
+            data = self.backlog[binary] = b"".join(self._encoded(binary))
+        _write(wfile, data, len(self.lines))
+
+
+class IOStats:
+    """
+    Bytes and write calls handed to the OS, e.g. for one session, plus
+    send-queue health: the deepest backlog seen, bytes skipped for lagging
+    consumers and connections evicted. Compare two sample()s to count a
+    stretch of it, such as one turn. The queue figures are also kept
+    process-wide for /metrics (see metrics.SEND_QUEUE_*).
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.writes = 0
+        self.queue_peak = 0
+        self.dropped_bytes = 0
+        self.evictions = 0
+
+    def sample(self):
+        """(bytes, writes) so far."""
+        return self.bytes, self.writes
+
+
+# every open Outbox, so /metrics can report the deepest backlog
+_outboxes = weakref.WeakSet()
+_outboxes_lock = threading.Lock()
+
+
+def max_backlog() -> int:
+    """The deepest outbound backlog of any open connection, in bytes."""
+    with _outboxes_lock:
+        outboxes = list(_outboxes)
+    deepest = 0
+    for outbox in outboxes:
+        try:
+            deepest = max(deepest, outbox.backlog())
+        except (AttributeError, OSError):
+            pass    # closed under us
+    return deepest
+
+
+metrics.SEND_QUEUE_MAX.read = max_backlog
+
+
+class Outbox:
+    """
+    Per-connection outbound buffer with the write()/flush() interface the
+    send* helpers use. While held, flush() is deferred, so every message
+    produced for one event leaves in a single write on release().
+    A binary Outbox carries frames (see encode_line) instead of text lines.
+
+    With a high_water mark set, the outbound backlog (bytes the peer has not
+    taken yet) is bounded. Past the mark, policy 'drop' disconnects the peer;
+    'snapshot' skips its updates until the backlog falls to half the mark and
+    then sets snapshot_due, so the session can resend full state. Only
+    outboxes that queue (QueuedOutbox, StreamOutbox) have a backlog to
+    bound; a blocking SocketOutbox cannot be given a limit.
+    """
+
+    def __init__(self, stats: IOStats = None, binary: bool = False):
+        self.parts: list[bytes] = []
+        self.held = 0
+        self.stats = stats
+        self.binary = binary
+        self.high_water = None
+        self.policy = 'drop'
+        self.lagging = False
+        self.snapshot_due = False
+        self.evicted = False
+        with _outboxes_lock:
+            _outboxes.add(self)
+
+    def limit(self, high_water, policy='drop') -> None:
+        if type(self).backlog is Outbox.backlog:
+            raise TypeError(f"{type(self).__name__} queues nothing, so it has no backlog to bound")
+        self.high_water = high_water
+        self.policy = policy
+
+    def write(self, text: str) -> None:
+        self.parts.append(text.encode())
+
+    def write_bytes(self, data: bytes) -> None:
+        """Queue already-encoded data (a frame, or a buffer shared by a broadcast)."""
+        self.parts.append(data)
+
+    def flush(self) -> None:
+        if not self.held:
+            self.commit()
+
+    def hold(self) -> None:
+        self.held += 1
+
+    def release(self) -> None:
+        self.held -= 1
+        if not self.held:
+            self.commit()
+
+    def commit(self) -> None:
+        if not self.parts:
+            return
+        data = b"".join(self.parts)
+        self.parts.clear()
+        if self.high_water is not None and not self._admit(len(data)):
+            return
+        start = time.perf_counter()
+        self._send(data)
+        metrics.SEND_TIME.observe(time.perf_counter() - start)
+        metrics.BYTES_SENT.inc(len(data))
+        if self.stats is not None:
+            self.stats.bytes += len(data)
+            self.stats.writes += 1
+
+    def _admit(self, size: int) -> bool:
+        """Apply the high-water policy to one outgoing write."""
+        if self.evicted:
+            return False
+        backlog = self.backlog()
+        if self.lagging and backlog <= self.high_water // 2:
+            # caught up: send again, and have the session follow with full state
+            self.lagging = False
+            self.snapshot_due = True
+        # an idle connection always takes the write, however large
+        if not self.lagging and (backlog == 0 or backlog + size <= self.high_water):
+            if self.stats is not None:
+                self.stats.queue_peak = max(self.stats.queue_peak, backlog + size)
+            return True
+        if self.policy == 'snapshot':
+            self.lagging = True
+            metrics.SEND_QUEUE_DROPPED.inc(size)
+            if self.stats is not None:
+                self.stats.dropped_bytes += size
+            return False
+        self.evicted = True
+        metrics.SEND_QUEUE_EVICTIONS.inc()
+        if self.stats is not None:
+            self.stats.evictions += 1
+        self.abort()
+        return False
+
+    def backlog(self) -> int:
+        """Bytes handed to this Outbox that the peer has not taken yet (none, if sends block)."""
+        return 0
+
+    def abort(self) -> None:
+        """Cut the connection off; the session's read side then sees it leave."""
+
+    def _send(self, data: bytes) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.parts.clear()
+
+
+class SocketOutbox(Outbox):
+    """Outbox over a blocking socket: one sendall() per commit."""
+
+    def __init__(self, sock, stats: IOStats = None, binary: bool = False):
+        super().__init__(stats, binary)
+        self.sock = sock
+        # writes are already coalesced per event, so Nagle would only add delay
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass  # not TCP (e.g. a socketpair)
+
+    def _send(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def abort(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class StreamOutbox(Outbox):
+    """Outbox over an asyncio StreamWriter: one transport write per commit."""
+
+    def __init__(self, writer, stats: IOStats = None, binary: bool = False):
+        super().__init__(stats, binary)
+        self.writer = writer
+
+    def _send(self, data: bytes) -> None:
+        self.writer.write(data)
+
+    def backlog(self) -> int:
+        return self.writer.transport.get_write_buffer_size()
+
+    def abort(self) -> None:
+        self.writer.transport.abort()
+
+
+# MSG_DONTWAIT makes one send() non-blocking without touching the socket's
+# mode, so the session can keep reading it with makefile() + select.
+# Platforms without it (Windows) fall back to a blocking send.
+SEND_NOWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+# how long closing a QueuedOutbox may block to send what is still queued (seconds)
+CLOSE_TIMEOUT = 2.0
+
+
+class QueuedOutbox(SocketOutbox):
+    """
+    SocketOutbox that never makes the session wait on a slow reader: each
+    commit is sent with a non-blocking send() and whatever the socket will
+    not take yet is queued, untouched, for the Broadcaster thread. Buffers
+    from broadcast() are therefore shared by every subscriber's queue.
+    """
+
+    def __init__(self, sock, stats: IOStats = None, binary: bool = False, broadcaster=None):
+        super().__init__(sock, stats, binary)
+        self.fd = sock.fileno()
+        self.broadcaster = broadcaster or shared_broadcaster()
+        self.queue = deque()
+        self.queued_bytes = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _send(self, data: bytes) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.queue.append(memoryview(data))
+            self.queued_bytes += len(data)
+            if len(self.queue) > 1:
+                return  # the Broadcaster is already waiting on this socket
+            done = self._drain_locked()
+        if not done:
+            self.broadcaster.watch(self)
+
+    def backlog(self) -> int:
+        return self.queued_bytes
+
+    def abort(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.queue.clear()
+            self.queued_bytes = 0
+        super().abort()
+
+    def drain(self) -> bool:
+        """Send whatever the socket takes right now; True once nothing is left."""
+        with self.lock:
+            return self._drain_locked()
+
+    def _drain_locked(self) -> bool:
+        while self.queue:
+            data = self.queue[0]
+            try:
+                sent = self.sock.send(data, SEND_NOWAIT)
+            except (BlockingIOError, InterruptedError):
+                return False
+            except OSError:
+                # the peer is gone; the session's read side cleans up
+                self.closed = True
+                self.queue.clear()
+                self.queued_bytes = 0
+                return True
+            self.queued_bytes -= sent
+            if sent < len(data):
+                self.queue[0] = data[sent:]
+            else:
+                self.queue.popleft()
+        return True
+
+    def close(self, timeout=CLOSE_TIMEOUT) -> None:
+        """
+        Send what is still queued (the last [END] / [EXIT] lines, say),
+        blocking for at most 'timeout' seconds; the caller closes the socket
+        next. An evicted outbox has nothing left to send.
+        """
+        super().close()
+        with self.lock:
+            rest = b"" if self.closed else b"".join(self.queue)
+            self.closed = True
+            self.queue.clear()
+            self.queued_bytes = 0
+        if rest:
+            try:
+                self.sock.settimeout(timeout)
+                self.sock.sendall(rest)
+            except OSError:
+                pass    # gone, or still not reading: give up on it
+        self.broadcaster.watch(self)
+
+
+class Broadcaster(threading.Thread):
+    """
+    One thread per process that finishes the sends QueuedOutboxes could not
+    complete, waiting on every backed-up socket with a single selector.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        # woken when a new outbox needs watching
+        self.selector = WakeableSelector()
+        self.lock = threading.Lock()
+        self.incoming = set()
+
+    def watch(self, outbox: QueuedOutbox) -> None:
+        with self.lock:
+            self.incoming.add(outbox)
+        self.selector.wake()
+
+    def run(self) -> None:
+        while True:
+            for key, _ in self.selector.select():
+                if key.data.drain():
+                    self._forget(key.data)
+            with self.lock:
+                outboxes, self.incoming = self.incoming, set()
+            for outbox in outboxes:
+                if outbox.drain():
+                    self._forget(outbox)
+                else:
+                    self._register(outbox)
+
+    def _register(self, outbox) -> None:
+        # registered by fd number: a stale entry left by a closed socket whose
+        # number was reused is replaced
+        try:
+            key = self.selector.get_key(outbox.fd)
+        except KeyError:
+            key = None
+        if key is not None:
+            if key.data is outbox:
+                return
+            self.selector.unregister(outbox.fd)
+        self.selector.register(outbox.fd, selectors.EVENT_WRITE, outbox)
+
+    def _forget(self, outbox) -> None:
+        try:
+            key = self.selector.get_key(outbox.fd)
+        except KeyError:
+            return
+        if key.data is outbox:
+            self.selector.unregister(outbox.fd)
+
+
+shared_broadcaster = shared(Broadcaster)
+
+
+class LineReader:
+    """
+    Splits a socket's input into text lines with a buffer the session can
+    see. With makefile() a second line that arrived in the same packet sits
+    in the file's buffer where select() cannot see it, so the session would
+    wait for more input before handling it; has_line() says when not to
+    wait. Lines are cut to MAX_LINE bytes. The socket stays owned by the
+    caller.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.eof = False
+        self.skipping = False   # dropping the rest of a line that was cut short
+
+    def has_line(self) -> bool:
+        """True if readline() would return without waiting for the socket."""
+        return self.eof or b"\n" in self.buffer or len(self.buffer) >= MAX_LINE
+
+    def fill(self) -> None:
+        """One recv(); does not block once select() reports the socket readable."""
+        try:
+            data = self.sock.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.eof = True
+            return
+        if self.skipping:
+            end = data.find(b"\n")
+            if end < 0:
+                return
+            data = data[end + 1:]
+            self.skipping = False
+        self.buffer += data
+
+    def readline(self) -> str:
+        """The next line with its newline, waiting for it if needed; '' at end of input."""
+        while not self.has_line():
+            self.fill()
+        end = self.buffer.find(b"\n", 0, MAX_LINE) + 1
+        if end:
+            line = bytes(self.buffer[:end])
+            del self.buffer[:end]
+        elif len(self.buffer) < MAX_LINE:
+            # end of input without a newline
+            line = bytes(self.buffer)
+            self.buffer.clear()
+        else:
+            # too long: keep the start and drop the rest of the line
+            line = bytes(self.buffer[:MAX_LINE]) + b"\n"
+            rest = self.buffer.find(b"\n", MAX_LINE)
+            if rest < 0:
+                self.buffer.clear()
+                self.skipping = True
+            else:
+                del self.buffer[:rest + 1]
+        return line.decode(errors='replace')
+
+    def close(self) -> None:
+        self.buffer.clear()
+        self.eof = True
+
+
+# longest role line ("/resume <token> +bin1" and the like) a new connection may send
+MAX_HANDSHAKE_LINE = 1024
+
+
+class Handshaker(threading.Thread):
+    """
+    Waits for the first line of every new connection on one selector, so
+    the accept loop never blocks on a slow client. on_line(conn, wfile,
+    line, accepted) runs on this thread once the line is in; a connection
+    that says nothing for 'timeout' seconds is told so and closed.
+
+    Only the first line is taken off the socket (the rest is left for the
+    session's own reader), by peeking for the newline before each recv().
+    The on_line calls are profiled as phase 'handshake' of 'profile_label'.
+    """
+
+    def __init__(self, on_line, timeout, profile_label='handshaker'):
+        super().__init__(daemon=True)
+        self.on_line = on_line
+        self.timeout = timeout
+        self.profile_label = profile_label
+        self.selector = WakeableSelector()
+        self.lock = threading.Lock()
+        self.incoming = []
+
+    def add(self, conn, wfile, accepted) -> None:
+        with self.lock:
+            self.incoming.append((conn, wfile, accepted))
+        self.selector.wake()
+
+    def run(self) -> None:
+        # cProfile only sees the thread that enables it, so the profiler is made here
+        profiler = profiling.session_profiler(self.profile_label, always=True)
+        pending = {}    # conn -> [wfile, accepted, deadline, bytes so far]
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, min(p[2] for p in pending.values()) - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                conn = key.fileobj
+                line = self._read(conn, pending[conn])
+                if line is None:
+                    continue
+                self.selector.unregister(conn)
+                wfile, accepted = pending.pop(conn)[:2]
+                try:
+                    with profiler.phase('handshake'):
+                        self.on_line(conn, wfile, line, accepted)
+                except Exception as e:
+                    print(f"[WARN] Handshake failed: {e}")
+                    conn.close()
+            with self.lock:
+                incoming, self.incoming = self.incoming, []
+            for conn, wfile, accepted in incoming:
+                pending[conn] = [wfile, accepted, time.monotonic() + self.timeout, b""]
+                self.selector.register(conn, selectors.EVENT_READ)
+            now = time.monotonic()
+            for conn in [c for c, p in pending.items() if p[2] <= now]:
+                self.selector.unregister(conn)
+                wfile = pending.pop(conn)[0]
+                try:
+                    send(wfile, "[ERROR] Timed out waiting for your choice.")
+                except OSError:
+                    pass
+                conn.close()
 
+    def _read(self, conn, entry):
+        """
+        The finished first line, None while it is incomplete, or '' if the
+        client left or sent more than MAX_HANDSHAKE_LINE bytes without one.
+        """
+        try:
+            data = conn.recv(MAX_HANDSHAKE_LINE, socket.MSG_PEEK)
+            end = data.find(b"\n") + 1
+            if data:
+                data = conn.recv(end or len(data))
+        except OSError:
+            data = b""
+        if not data:
+            return ""
+        entry[3] += data
+        if data.endswith(b"\n"):
+            return entry[3].decode(errors='replace')
+        if len(entry[3]) >= MAX_HANDSHAKE_LINE:
+            # no role is this long; an empty line is refused as invalid
+            return ""
+        return None
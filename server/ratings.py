@@ -0,0 +1,75 @@
+"""
+Elo ratings for named players ("/player <name>"), kept in RATINGS_FILE.
+
+The matchmaker looks ratings up when a player joins the lobby and records
+the result when a match between named players ends: the winner beats
+every other player in it. Players who give no name are matched at
+START_RATING, and matches they play in are not rated. The file is
+rewritten (temp file, then rename) after each result, so a crash leaves
+either the old ratings or the new ones.
+"""
+import json
+import os
+import re
+import threading
+from config import RATINGS_FILE
+
+START_RATING = 1200.0
+K_FACTOR = 32
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,20}")
+
+
+def valid_name(name) -> bool:
+    return NAME_PATTERN.fullmatch(name) is not None
+
+
+def expected_score(rating, other) -> float:
+    return 1.0 / (1.0 + 10 ** ((other - rating) / 400))
+
+
+class RatingBook:
+    """Every known player's rating, loaded from and saved to one JSON file."""
+
+    def __init__(self, path=RATINGS_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.ratings = {}   # name -> rating
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.ratings = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Ratings not loaded from {path}: {e}")
+
+    def rating(self, name) -> float:
+        if name is None:
+            return START_RATING
+        with self.lock:
+            return self.ratings.get(name, START_RATING)
+
+    def record(self, names, winner) -> None:
+        """names[i] is the name of player i (None if unnamed); winner is a player index."""
+        champion = names[winner]
+        if champion is None:
+            return
+        with self.lock:
+            for idx, name in enumerate(names):
+                if idx == winner or name is None or name == champion:
+                    continue
+                won = self.ratings.get(champion, START_RATING)
+                lost = self.ratings.get(name, START_RATING)
+                change = K_FACTOR * (1 - expected_score(won, lost))
+                self.ratings[champion] = round(won + change, 1)
+                self.ratings[name] = round(lost - change, 1)
+            self.save_locked()
+
+    def save_locked(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.ratings, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[WARN] Ratings not saved: {e}")
@@ -0,0 +1,178 @@
+"""
+Crash recovery for the threaded server.
+
+Every running GameSession hands the SnapshotWriter a copy of its state
+(boards, turn, chat, resume tokens) after each event it handles. That copy
+is only a few plain objects; the writer thread coalesces them and writes
+each changed session at most every SNAPSHOT_INTERVAL seconds, to a temp
+file that is fsynced and then renamed over the old snapshot, so a crash
+mid-write never leaves a torn file. A finished session deletes its snapshot
+straight away.
+
+On start-up the server loads whatever snapshots are left into a
+ResumeRegistry. Each player got a "[TOKEN] <token>" line when their match
+started; reconnecting with "/resume <token>" takes their seat back, and the
+match carries on once every seat is filled. Matches that are not complete
+within RESUME_TIMEOUT seconds are dropped.
+"""
+import json
+import os
+import threading
+import time
+from background import shared
+from config import SNAPSHOT_DIR, SNAPSHOT_INTERVAL, RESUME_TIMEOUT
+import protocol
+
+
+def snapshot_path(session_id, directory=SNAPSHOT_DIR) -> str:
+    return os.path.join(directory, f"session-{session_id}.json")
+
+
+class SnapshotWriter(threading.Thread):
+    """One thread per process that puts session snapshots on disk."""
+
+    def __init__(self, directory=SNAPSHOT_DIR, interval=SNAPSHOT_INTERVAL):
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = {}       # session_id -> latest state not yet on disk
+        self.writing = set()    # sessions being written this pass and not discarded since
+
+    def save(self, session_id, state) -> None:
+        with self.lock:
+            self.pending[session_id] = state
+
+    def discard(self, session_id) -> None:
+        """Delete the session's snapshot now, so a finished match is never resumed."""
+        with self.lock:
+            self.pending.pop(session_id, None)
+            # a write already under way throws its file away instead of landing it
+            self.writing.discard(session_id)
+            remove_snapshot(session_id, self.directory)
+
+    def run(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                self.writing = set(pending)
+            for session_id, state in pending.items():
+                try:
+                    self.write(session_id, state)
+                except OSError as e:
+                    print(f"[WARN] Session {session_id}: snapshot not saved ({e})")
+
+    def write(self, session_id, state) -> None:
+        path = snapshot_path(session_id, self.directory)
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        with self.lock:
+            # the session may have finished while this was being written
+            if session_id in self.writing:
+                self.writing.remove(session_id)
+                os.replace(tmp, path)
+            else:
+                os.remove(tmp)
+
+
+shared_writer = shared(SnapshotWriter)
+
+
+def remove_snapshot(session_id, directory=SNAPSHOT_DIR) -> None:
+    try:
+        os.remove(snapshot_path(session_id, directory))
+    except FileNotFoundError:
+        pass
+
+
+def load_snapshots(directory=SNAPSHOT_DIR) -> list[dict]:
+    """Every readable snapshot left in the directory, oldest session first."""
+    states = []
+    if directory is None or not os.path.isdir(directory):
+        return states
+    for name in os.listdir(directory):
+        if not (name.startswith("session-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                states.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Skipping snapshot {name}: {e}")
+    return sorted(states, key=lambda state: state['sid'])
+
+
+class ParkedMatch:
+    """A restored match waiting for its players to come back."""
+
+    def __init__(self, state):
+        self.state = state
+        self.departed = set(state['departed'])
+        self.seats = {}     # player index -> (conn, wfile)
+        self.started = False
+
+    def missing(self) -> int:
+        return len(self.state['tokens']) - len(self.departed) - len(self.seats)
+
+
+class ResumeRegistry:
+    """
+    Restored matches keyed by resume token. start_match(conns, session_id,
+    restore) runs a full match; conns are the returning players in seat
+    order, without the seats of players who had already left.
+    """
+
+    def __init__(self, start_match, states=(), timeout=RESUME_TIMEOUT):
+        self.start_match = start_match
+        self.lock = threading.Lock()
+        self.tokens = {}    # token -> (ParkedMatch, player index)
+        for state in states:
+            match = ParkedMatch(state)
+            for idx, token in enumerate(state['tokens']):
+                if idx not in match.departed:
+                    self.tokens[token] = (match, idx)
+        self.count = len(states)
+        if self.tokens:
+            timer = threading.Timer(timeout, self.expire)
+            timer.daemon = True
+            timer.start()
+
+    def claim(self, token, conn, wfile) -> None:
+        """Seat a returning player, or tell them why not."""
+        with self.lock:
+            entry = self.tokens.pop(token, None)
+            if entry is None:
+                protocol.send(wfile, "[ERROR] Unknown or expired resume token.")
+                conn.close()
+                return
+            match, idx = entry
+            match.seats[idx] = (conn, wfile)
+            ready = match.missing() == 0
+            if ready:
+                match.started = True
+        if not ready:
+            protocol.send(wfile, f"[INFO] Rejoined match {match.state['sid']} as Player {idx+1}. "
+                                 f"Waiting for {match.missing()} more player(s)…")
+            return
+        conns = [match.seats[i][0] for i in sorted(match.seats)]
+        print(f"[INFO] Resuming session {match.state['sid']}")
+        self.start_match(conns, match.state['sid'], match.state)
+
+    def expire(self) -> None:
+        """Give up on matches that did not get all their players back."""
+        with self.lock:
+            stale = {id(match): match for match, _ in self.tokens.values() if not match.started}
+            self.tokens.clear()
+        for match in stale.values():
+            print(f"[INFO] Session {match.state['sid']} was not resumed in time")
+            for conn, wfile in match.seats.values():
+                try:
+                    protocol.send(wfile, "[EXIT] The other players did not come back.")
+                    conn.close()
+                except OSError:
+                    pass
+            remove_snapshot(match.state['sid'])
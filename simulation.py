@@ -0,0 +1,231 @@
+"""
+simulation.py
+
+Headless self-play for tuning AI opponents:
+ - Shooter strategies that pick a cell and learn from the result, with no I/O
+ - play_game() to run one complete game between two strategies
+ - simulate() to run large batches across a multiprocessing pool, one seed per chunk
+
+Example:
+    python simulation.py --games 200000 --workers 8 random hunt
+    python simulation.py --games 20000 density hunt   (needs NumPy)
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from battleship import BOARD_SIZE, SHIPS, Board
+
+
+class Shooter:
+    """
+    Base class for a firing strategy.
+    next_shot() returns the (row, col) to fire at next; observe() is then
+    called with the outcome from Board.fire_at().
+    """
+
+    def __init__(self, size=BOARD_SIZE, ships=SHIPS, rng=random):
+        self.size = size
+        self.ships = ships
+        self.rng = rng
+
+    def next_shot(self):
+        raise NotImplementedError
+
+    def observe(self, row, col, result, sunk_ship_name):
+        pass
+
+
+class RandomShooter(Shooter):
+    """Fires at every cell once, in random order."""
+
+    def __init__(self, size=BOARD_SIZE, ships=SHIPS, rng=random):
+        super().__init__(size, ships, rng)
+        self.cells = [(r, c) for r in range(size) for c in range(size)]
+        rng.shuffle(self.cells)
+
+    def next_shot(self):
+        return self.cells.pop()
+
+
+class HuntTargetShooter(Shooter):
+    """
+    Hunts on a checkerboard (every ship covers at least one of its cells),
+    then works through the neighbours of each hit until the ship sinks.
+    """
+
+    def __init__(self, size=BOARD_SIZE, ships=SHIPS, rng=random):
+        super().__init__(size, ships, rng)
+        self.unknown = {(r, c) for r in range(size) for c in range(size)}
+        self.hunt = [(r, c) for (r, c) in self.unknown if (r + c) % 2 == 0]
+        rng.shuffle(self.hunt)
+        self.targets = []
+
+    def next_shot(self):
+        while self.targets:
+            cell = self.targets.pop()
+            if cell in self.unknown:
+                return cell
+        while self.hunt:
+            cell = self.hunt.pop()
+            if cell in self.unknown:
+                return cell
+        return next(iter(self.unknown))
+
+    def observe(self, row, col, result, sunk_ship_name):
+        self.unknown.discard((row, col))
+        if result == 'hit' and not sunk_ship_name:
+            for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                cell = (row + dr, col + dc)
+                if cell in self.unknown:
+                    self.targets.append(cell)
+
+
+STRATEGIES = {
+    'random': RandomShooter,
+    'hunt': HuntTargetShooter,
+}
+# strategies with optional dependencies, imported on first use: name -> (module, class)
+OPTIONAL_STRATEGIES = {
+    'density': ('ai', 'DensityShooter'),
+}
+
+
+def get_strategy(name):
+    if name not in STRATEGIES and name in OPTIONAL_STRATEGIES:
+        module_name, class_name = OPTIONAL_STRATEGIES[name]
+        module = __import__(module_name)
+        STRATEGIES[name] = getattr(module, class_name)
+    return STRATEGIES[name]
+
+
+def random_board(size=BOARD_SIZE, ships=SHIPS, rng=random):
+    board = Board(size)
+    board.place_ships_randomly(ships, rng)
+    return board
+
+
+def play_game(strategies, rng, size=BOARD_SIZE, ships=SHIPS, first=None):
+    """
+    Play one game between two shooter classes; seat 'first' fires first
+    (a random seat if None). Returns (winner_index, shots_fired_by_winner).
+    """
+    boards = [random_board(size, ships, rng), random_board(size, ships, rng)]
+    shooters = [cls(size, ships, rng) for cls in strategies]
+    shots = [0, 0]
+    turn = rng.randrange(2) if first is None else first
+    while True:
+        shooter = shooters[turn]
+        row, col = shooter.next_shot()
+        result, sunk, fleet_sunk = boards[1 - turn].fire(row, col)
+        shooter.observe(row, col, result, sunk)
+        shots[turn] += 1
+        if fleet_sunk:
+            return turn, shots[turn]
+        turn = 1 - turn
+
+
+def run_chunk(job):
+    """
+    Worker entry point: play 'games' games with its own seed; return partial
+    totals. Game number 'start + i' overall is opened by seat (start + i) % 2,
+    so each seat fires first in half the games however the work is chunked.
+    """
+    seed, start, games, names, size, ships = job
+    rng = random.Random(seed)
+    strategies = [get_strategy(name) for name in names]
+    wins = Counter()
+    first_wins = 0
+    shots_to_win = Counter()
+    for i in range(start, start + games):
+        first = i % 2
+        winner, shots = play_game(strategies, rng, size, ships, first)
+        wins[names[winner]] += 1
+        first_wins += winner == first
+        shots_to_win[shots] += 1
+    return wins, first_wins, shots_to_win
+
+
+def simulate(games, names=('hunt', 'random'), workers=None, seed=0, size=BOARD_SIZE, chunk=1000,
+             ships=SHIPS):
+    """
+    Run 'games' games of names[0] vs names[1] across a process pool, the
+    seats taking turns to fire first. Returns a dict with games, seconds,
+    games_per_sec, wins (a Counter by strategy name), first_wins (games won
+    by whoever fired first) and the shots_to_win Counter.
+    """
+    jobs = []
+    remaining = games
+    while remaining > 0:
+        n = min(chunk, remaining)
+        jobs.append((seed + len(jobs), games - remaining, n, tuple(names), size, tuple(ships)))
+        remaining -= n
+
+    wins = Counter()
+    first_wins = 0
+    shots_to_win = Counter()
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        for part_wins, part_first, part_shots in pool.imap_unordered(run_chunk, jobs):
+            wins.update(part_wins)
+            first_wins += part_first
+            shots_to_win.update(part_shots)
+    elapsed = time.perf_counter() - start
+    return {
+        'games': games,
+        'seconds': elapsed,
+        'games_per_sec': games / elapsed if elapsed else float('inf'),
+        'wins': wins,
+        'first_wins': first_wins,
+        'shots_to_win': shots_to_win,
+    }
+
+
+def percentile(counter, fraction):
+    """Value at the given fraction (0..1) of a Counter used as a histogram."""
+    total = sum(counter.values())
+    target = fraction * total
+    seen = 0
+    for value in sorted(counter):
+        seen += counter[value]
+        if seen >= target:
+            return value
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Battleship self-play")
+    parser.add_argument('strategies', nargs='*', default=['hunt', 'random'],
+                        help=f"two of: {', '.join(list(STRATEGIES) + list(OPTIONAL_STRATEGIES))}")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help="default: one per CPU")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=BOARD_SIZE)
+    args = parser.parse_args()
+
+    names = (args.strategies * 2)[:2]
+    for name in names:
+        try:
+            get_strategy(name)
+        except KeyError:
+            parser.error(f"unknown strategy '{name}'")
+        except ImportError as e:
+            parser.error(f"strategy '{name}' is unavailable: {e}")
+
+    stats = simulate(args.games, names, args.workers, args.seed, args.size)
+    shots = stats['shots_to_win']
+    print(f"{stats['games']} games in {stats['seconds']:.1f}s "
+          f"({stats['games_per_sec']:.0f} games/s, {stats['games_per_sec'] * 3600:.0f} games/h)")
+    for name in dict.fromkeys(names):
+        print(f"  {name}: {stats['wins'][name] / stats['games']:.1%} wins")
+    print(f"  first to fire: {stats['first_wins'] / stats['games']:.1%} wins")
+    mean = sum(k * v for k, v in shots.items()) / stats['games']
+    print(f"  shots to win: mean {mean:.1f}, min {min(shots)}, p50 {percentile(shots, 0.5)}, "
+          f"p90 {percentile(shots, 0.9)}, max {max(shots)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+The density AI plays whole games: it never repeats a shot, never fires
+into the water it ruled out around a sunk ship, and sinks every fleet.
+Skipped where NumPy is not installed.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+pytest.importorskip('numpy')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ai import DensityShooter
+from battleship import BOARD_SIZE, SHIPS
+from simulation import HuntTargetShooter, play_game, random_board
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_density_shooter_sinks_a_whole_fleet(seed):
+    rng = random.Random(seed)
+    board = random_board(BOARD_SIZE, SHIPS, rng)
+    ship_cells = {(r, c) for r, row in enumerate(board.hidden_grid)
+                  for c, cell in enumerate(row) if cell == 'S'}
+    shooter = DensityShooter(BOARD_SIZE, SHIPS, rng)
+    fired = set()
+    ruled_out = set()
+    sunk = 0
+    while True:
+        row, col = shooter.next_shot()
+        assert 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+        assert (row, col) not in fired | ruled_out
+        fired.add((row, col))
+        result, sunk_ship, fleet_sunk = board.fire(row, col)
+        assert result == ('hit' if (row, col) in ship_cells else 'miss')
+        shooter.observe(row, col, result, sunk_ship)
+        if sunk_ship:
+            sunk += 1
+            # ships never touch: the water around the one that sank is empty
+            stack, wreck = [(row, col)], set()
+            while stack:
+                r, c = stack.pop()
+                wreck.add((r, c))
+                for cell in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    if cell in ship_cells and cell not in wreck:
+                        stack.append(cell)
+                    elif cell not in ship_cells:
+                        ruled_out.add(cell)
+        if fleet_sunk:
+            break
+    assert sunk == len(SHIPS)
+    assert ship_cells <= fired
+    assert len(fired) < BOARD_SIZE * BOARD_SIZE
+
+
+def test_density_shooter_plays_through_simulation():
+    rng = random.Random(7)
+    wins = [0, 0]
+    for _ in range(20):
+        winner, shots = play_game([DensityShooter, HuntTargetShooter], rng)
+        wins[winner] += 1
+        assert shots <= BOARD_SIZE * BOARD_SIZE
+    assert sum(wins) == 20
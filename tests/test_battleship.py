@@ -0,0 +1,177 @@
+"""
+The bitboard Board against a list-of-lists reference with the semantics of
+the original Board: placement checks, shots, sinking, the win check and the
+grid views must agree move for move.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from battleship import SHIPS, Board, random_fleets, random_layout
+
+
+class ReferenceBoard:
+    """The original grid-and-position-set Board, trimmed to what is compared."""
+
+    def __init__(self, size):
+        self.size = size
+        self.hidden_grid = [['.'] * size for _ in range(size)]
+        self.display_grid = [['.'] * size for _ in range(size)]
+        self.placed_ships = []
+
+    def can_place_ship(self, row, col, ship_size, orientation):
+        cells = [(row, col + k) if orientation == 0 else (row + k, col) for k in range(ship_size)]
+        if any(r >= self.size or c >= self.size for r, c in cells):
+            return False
+        for r, c in cells:
+            if self.hidden_grid[r][c] != '.':
+                return False
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < self.size and 0 <= nc < self.size and self.hidden_grid[nr][nc] == 'S':
+                    return False
+        return True
+
+    def place_ship(self, ship_name, row, col, ship_size, orientation):
+        positions = set()
+        for k in range(ship_size):
+            r, c = (row, col + k) if orientation == 0 else (row + k, col)
+            self.hidden_grid[r][c] = 'S'
+            positions.add((r, c))
+        self.placed_ships.append({'name': ship_name, 'positions': positions})
+
+    def fire_at(self, row, col):
+        cell = self.hidden_grid[row][col]
+        if cell in ('X', 'o'):
+            return ('already_shot', None)
+        if cell == '.':
+            self.hidden_grid[row][col] = self.display_grid[row][col] = 'o'
+            return ('miss', None)
+        self.hidden_grid[row][col] = self.display_grid[row][col] = 'X'
+        for ship in self.placed_ships:
+            if (row, col) in ship['positions']:
+                ship['positions'].remove((row, col))
+                return ('hit', None if ship['positions'] else ship['name'])
+        return ('hit', None)
+
+    def all_ships_sunk(self):
+        return all(not ship['positions'] for ship in self.placed_ships)
+
+
+def fleet(size):
+    """The standard fleet, repeated to keep bigger boards about as crowded."""
+    return [(f"{name}{i}", length) for i in range(max(1, size * size // 100)) for name, length in SHIPS]
+
+
+def placed_pair(size, seed):
+    board, ref = Board(size), ReferenceBoard(size)
+    for ship_name, row, col, ship_size, orientation in random_layout(size, fleet(size), random.Random(seed)):
+        board.place_ship(ship_name, row, col, ship_size, orientation)
+        ref.place_ship(ship_name, row, col, ship_size, orientation)
+    return board, ref
+
+
+def assert_same_views(board, ref):
+    assert board.hidden_grid == ref.hidden_grid
+    assert board.display_grid == ref.display_grid
+    for r in range(board.size):
+        assert board.row_symbols(r) == ref.hidden_grid[r]
+        assert board.row_symbols(r, hidden=False) == ref.display_grid[r]
+
+
+@pytest.mark.parametrize("size", [10, 15, 26])
+@pytest.mark.parametrize("seed", range(5))
+def test_can_place_ship_matches_reference(size, seed):
+    board, ref = placed_pair(size, seed)
+    # a few shots, so hit ship cells count as taken as well
+    rng = random.Random(seed)
+    for _ in range(size * 2):
+        r, c = rng.randrange(size), rng.randrange(size)
+        board.fire_at(r, c)
+        ref.fire_at(r, c)
+    for r in range(size):
+        for c in range(size):
+            for orientation in (0, 1):
+                for ship_size in (1, 2, 3, 5):
+                    assert board.can_place_ship(r, c, ship_size, orientation) == \
+                        ref.can_place_ship(r, c, ship_size, orientation), (r, c, ship_size, orientation)
+
+
+@pytest.mark.parametrize("size", [10, 15, 26])
+@pytest.mark.parametrize("seed", range(5))
+def test_shots_match_reference(size, seed):
+    board, ref = placed_pair(size, seed)
+    assert_same_views(board, ref)
+    rng = random.Random(seed)
+    cells = [(r, c) for r in range(size) for c in range(size)]
+    rng.shuffle(cells)
+    # every cell once, then a few again; fire() and fire_at() take turns
+    for i, (r, c) in enumerate(cells + cells[:10]):
+        expected = ref.fire_at(r, c)
+        result, sunk, fleet_sunk = board.fire(r, c) if i % 2 else (*board.fire_at(r, c), None)
+        assert (result, sunk) == expected, (r, c)
+        assert board.all_ships_sunk() == ref.all_ships_sunk()
+        if fleet_sunk is not None:
+            assert fleet_sunk == (result == 'hit' and ref.all_ships_sunk())
+        assert board.cell_state(r, c) == ref.hidden_grid[r][c]
+    assert board.all_ships_sunk()
+    assert_same_views(board, ref)
+
+
+def test_views_follow_every_shot():
+    board, ref = placed_pair(10, 42)
+    rng = random.Random(42)
+    for _ in range(60):
+        r, c = rng.randrange(10), rng.randrange(10)
+        board.fire_at(r, c)
+        ref.fire_at(r, c)
+        assert_same_views(board, ref)
+
+
+def test_sinking_each_ship_reports_its_name():
+    board = Board()
+    board.place_ship("Destroyer", 0, 0, 2, 0)
+    board.place_ship("Cruiser", 2, 0, 3, 1)
+    assert board.fire_at(0, 0) == ('hit', None)
+    assert board.fire_at(0, 1) == ('hit', 'Destroyer')
+    assert not board.all_ships_sunk()
+    assert board.fire(2, 0) == ('hit', None, False)
+    assert board.fire(3, 0) == ('hit', None, False)
+    assert board.fire(4, 0) == ('hit', 'Cruiser', True)
+    assert board.all_ships_sunk()
+    assert board.fire_at(4, 0) == ('already_shot', None)
+    assert board.fire_at(9, 9) == ('miss', None)
+
+
+def test_snapshot_restore_mid_game():
+    board, ref = placed_pair(15, 7)
+    cells = [(r, c) for r in range(15) for c in range(15)]
+    random.Random(7).shuffle(cells)
+    for r, c in cells[:100]:
+        board.fire_at(r, c)
+        ref.fire_at(r, c)
+    restored = Board.restore(board.snapshot())
+    assert_same_views(restored, ref)
+    for r, c in cells[100:]:
+        assert restored.fire_at(r, c) == ref.fire_at(r, c)
+        assert restored.all_ships_sunk() == ref.all_ships_sunk()
+    assert restored.all_ships_sunk()
+
+
+def test_fire_out_of_range():
+    with pytest.raises(ValueError):
+        Board().fire_at(10, 0)
+
+
+def test_more_ships_than_a_byte_can_number():
+    ships = [('d%d' % i, 2) for i in range(300)]
+    board, = random_fleets(1, size=60, ships=ships, seed=3)
+    assert len(board.placed_ships) == 300
+    for ship in board.placed_ships:
+        cells = [bit for bit in range(60 * 60) if ship['mask'] >> bit & 1]
+        for bit in cells[:-1]:
+            assert board.fire_at(*divmod(bit, 60)) == ('hit', None)
+        assert board.fire_at(*divmod(cells[-1], 60)) == ('hit', ship['name'])
+    assert board.all_ships_sunk()
@@ -0,0 +1,49 @@
+"""
+Replaying session logs, including a match that was resumed from a snapshot
+taken a few shots before the server went down.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from battleship import SHIPS, Board, format_coordinate, format_fleet, random_fleets
+from event_log import EventLog, Replay
+
+
+def play(log, boards, shots, turn_idx):
+    """Log two-player shots the way GameSession does; returns the next player to move."""
+    for r, c in shots:
+        target = 1 - turn_idx
+        result, sunk, _ = boards[target].fire(r, c)
+        log.append('shot', p=turn_idx, t=target, at=format_coordinate(r, c), res=result, sunk=sunk)
+        turn_idx = target
+        log.append('turn', p=turn_idx)
+    return turn_idx
+
+
+def test_resume_rewinds_to_the_snapshot(tmp_path):
+    path = str(tmp_path / "s1.jsonl")
+    boards = random_fleets(2, seed=5)
+    log = EventLog(path)
+    log.append('start', sid=1, players=2, size=10, ships=SHIPS)
+    log.append('placed', fleets=[format_fleet(board.fleet_placements()) for board in boards])
+    cells = [(r, c) for r in range(10) for c in range(10)]
+    turn = play(log, boards, [cells[i // 2] for i in range(6)], 0)
+    snapshot = [board.snapshot() for board in boards], turn
+    # logged, but lost with the server before the next snapshot
+    play(log, boards, [cells[i // 2] for i in range(6, 10)], turn)
+
+    boards, turn = [Board.restore(snap) for snap in snapshot[0]], snapshot[1]
+    log.append('resumed', shots=6, turn=turn, out=[])
+    play(log, boards, [cells[i // 2] for i in range(6, 12)], turn)
+    log.close()
+
+    replay = Replay(path)
+    assert replay.turns == 12
+    state = replay.state_at()
+    for replayed, live in zip(state.boards, boards):
+        assert replayed.display_grid == live.display_grid
+    assert state.turn_idx == 0
+    for replayed, snap in zip(replay.state_at(6).boards, snapshot[0]):
+        assert replayed.display_grid == Board.restore(snap).display_grid
@@ -0,0 +1,63 @@
+"""
+A threaded GameSession over socketpairs, driven line by line from the
+players' side.
+"""
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from handle_game import GameSession
+
+
+class Player:
+    """The client end of a player's socketpair, read one line at a time."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.settimeout(5)
+        self.buffer = b""
+        self.seen = []
+
+    def send(self, line):
+        self.sock.sendall(line.encode() + b"\n")
+
+    def wait_for(self, prefix):
+        """Read lines until one starts with 'prefix'; return it."""
+        while True:
+            while b"\n" not in self.buffer:
+                data = self.sock.recv(65536)
+                assert data, f"connection closed before {prefix!r}; saw {self.seen}"
+                self.buffer += data
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            line = line.decode()
+            self.seen.append(line)
+            if line.startswith(prefix):
+                return line
+
+
+def start_match():
+    pairs = [socket.socketpair() for _ in range(2)]
+    session = GameSession(*(a for a, _ in pairs))
+    session.start()
+    return session, [Player(b) for _, b in pairs]
+
+
+def test_chat_during_placement_reaches_every_player():
+    session, players = start_match()
+    for player in players:
+        player.wait_for("[REQUEST_PLACEMENT]")
+    # ten words on a 10x10 board: once mistaken for a placement row
+    players[0].send("[CHAT] good luck . . . . . . . .")
+    players[1].send("[CHAT] you too")
+    for player in players:
+        assert player.wait_for("[CHAT]") == "[CHAT] Player 1: good luck . . . . . . . ."
+        assert player.wait_for("[CHAT]") == "[CHAT] Player 2: you too"
+    assert not any(line.startswith("[ERROR]") for player in players for line in player.seen)
+    players[0].send("quit")
+    players[1].wait_for("[EXIT]")
+    session.join(5)
+    assert not session.is_alive()
+    for player in players:
+        player.sock.close()
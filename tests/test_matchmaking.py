@@ -0,0 +1,191 @@
+"""
+The lobby: rating windows and how they widen, putting players back after a
+group falls through, and telling live queued connections from ones that
+hung up.
+"""
+import io
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+from matchmaking import LobbyQueue, Matchmaker, hung_up
+from ratings import RatingBook
+
+
+class FakeConn:
+    """A queued connection that hangs up on request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.gone = False
+        self.closed = False
+
+    def hung_up(self):
+        return self.gone
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, session_id, conns, on_finish, restore=None):
+        self.session_id = session_id
+        self.conns = conns
+        self.spectators = []
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+
+def names(group):
+    return [entry.name for entry in group] if group is not None else None
+
+
+def test_match_within_window():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    queue.push('a', 'a', 1200, 0)
+    far = queue.push('far', 'far', 1500, 0)
+    assert queue.match(far, 0, 2) is None
+    near = queue.push('near', 'near', 1290, 1)
+    assert names(queue.match(near, 1, 2)) == ['a', 'near']
+    assert len(queue) == 1
+
+
+def test_window_widens_with_waiting():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    queue.push('a', 'a', 1200, 0)
+    b = queue.push('b', 'b', 1350, 0)
+    assert queue.match(b, 4, 2) is None     # windows of 140
+    assert names(queue.match(b, 5, 2)) == ['a', 'b']
+
+
+def test_window_stops_widening():
+    queue = LobbyQueue(window=100, widen=10, window_max=200)
+    queue.push('a', 'a', 1000, 0)
+    b = queue.push('b', 'b', 1250, 0)
+    assert queue.match(b, 1000, 2) is None
+    assert queue.sweep(1000, 2) == []
+
+
+def test_older_misfit_does_not_hide_a_fit_in_its_bucket():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    queue.push('x', 'x', 55, 0)
+    queue.push('y', 'y', 95, 1)
+    a = queue.push('a', 'a', 200, 2)
+    assert names(queue.match(a, 2, 2)) == ['y', 'a']
+
+
+def test_nearest_rating_is_matched_first():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    queue.push('a', 'a', 1200, 0)
+    queue.push('b', 'b', 1290, 1)
+    c = queue.push('c', 'c', 1280, 2)
+    assert names(queue.match(c, 2, 2)) == ['b', 'c']
+
+
+def test_requeue_keeps_the_old_place():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    queue.push('a', 'a', 1210, 0)
+    queue.push('b', 'b', 1220, 1)
+    c = queue.push('c', 'c', 1205, 2)
+    group = queue.match(c, 2, 2)
+    assert names(group) == ['a', 'c']
+    for entry in group:
+        queue.requeue(entry)
+    bucket = queue.buckets[queue._key(1210)]
+    assert bucket.oldest().name == 'a'
+    assert queue.oldest(10) == 10
+    assert names(queue.sweep(10, 2)[0]) == ['a', 'c']
+
+
+def test_players_leave_their_bucket_at_once():
+    queue = LobbyQueue(window=100, widen=10, window_max=1000)
+    for i in range(10):
+        queue.push(i, str(i), 1200 + i, i)
+    for i in range(0, 10, 2):
+        queue.remove(i)
+    bucket = queue.buckets[queue._key(1200)]
+    assert [entry.name for _, _, entry in bucket.by_rating] == ['1', '3', '5', '7', '9']
+    for i in range(1, 10, 2):
+        queue.remove(i)
+    assert queue.buckets == {} and queue.keys == [] and len(queue) == 0
+
+
+def test_matchmaker_drops_hung_up_players_and_requeues_the_rest():
+    mm = Matchmaker(FakeSession, players_per_match=2, ratings=RatingBook(None))
+    a, b, c = FakeConn('a'), FakeConn('b'), FakeConn('c')
+    assert mm.add_player(a) is None
+    a.gone = True
+    assert mm.add_player(b) is None
+    assert a.closed and mm.waiting_count() == 1
+    session = mm.add_player(c)
+    assert session.conns == [b, c]
+    assert mm.waiting_count() == 0
+
+
+def test_hung_up_tells_live_from_closed():
+    a, b = socket.socketpair()
+    try:
+        assert not hung_up(a)
+        b.sendall(b"x")
+        assert not hung_up(a)   # unread input is not a hang-up
+        assert a.recv(1) == b"x"
+        b.close()
+        assert hung_up(a)
+    finally:
+        a.close()
+
+
+def test_hung_up_on_high_fd():
+    # select() refuses fds >= FD_SETSIZE; a busy server gets there
+    a, b = socket.socketpair()
+    try:
+        fd = os.dup2(a.fileno(), 2000)
+    except OSError:
+        a.close()
+        b.close()
+        pytest.skip("cannot open fd 2000 here")
+    high = socket.socket(fileno=fd)
+    try:
+        assert not hung_up(high)
+        b.close()
+        assert hung_up(high)
+    finally:
+        high.close()
+        a.close()
+
+
+def test_sweep_drops_queued_sockets_that_hang_up():
+    ratings = RatingBook(None)
+    ratings.ratings['bob'] = 2500       # too far apart to be matched
+    mm = Matchmaker(FakeSession, players_per_match=2, ratings=ratings)
+    left, left_peer = socket.socketpair()
+    chatty, chatty_peer = socket.socketpair()
+    try:
+        assert mm.add_player(left, name='alice') is None
+        assert mm.add_player(chatty, name='bob') is None
+        left_peer.close()
+        chatty_peer.sendall(b"hello\n")     # input is not a hang-up
+        mm.sweep()
+        assert left.fileno() == -1
+        assert chatty.fileno() != -1
+        assert list(mm.queue.entries) == [chatty]
+    finally:
+        for sock in (left, chatty, chatty_peer):
+            sock.close()
+
+
+def test_names_keep_their_case():
+    mm = Matchmaker(FakeSession, players_per_match=2, ratings=RatingBook(None))
+    conn = FakeConn('a')
+    out = io.StringIO()
+    assert mm.admit(conn, out, "/PLAYER Alice_1\n") is False
+    assert [entry.name for entry in mm.queue.entries.values()] == ['Alice_1']
+    assert "[INFO] Waiting" in out.getvalue()
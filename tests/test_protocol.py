@@ -0,0 +1,342 @@
+"""
+The wire protocol: binary frames round-tripping through their decoders,
+broadcasts and the chat log encoding once per framing, the Broadcaster
+draining backed-up queues, handshakes profiled on the Handshaker's own
+thread, the high-water policies of Outbox and what a QueuedOutbox still
+sends when it is closed.
+"""
+import io
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import protocol
+from battleship import Board
+
+
+def frames(data):
+    """Every (opcode, payload) in a byte string of frames."""
+    rfile = io.BytesIO(data)
+    out = []
+    while True:
+        msg = protocol.read_frame(rfile)
+        if msg is None:
+            return out
+        out.append(msg)
+
+
+def test_frame_header_is_length_then_opcode():
+    assert protocol.frame(protocol.OP_TEXT, b"abc") == b"\x00\x04\x00abc"
+    assert frames(protocol.frame(protocol.OP_TURN)) == [(protocol.OP_TURN, b"")]
+    with pytest.raises(ValueError):
+        protocol.frame(protocol.OP_TEXT, b"x" * (protocol.MAX_FRAME_PAYLOAD + 1))
+    # the largest payload still fits the 2-byte length
+    big = protocol.frame(protocol.OP_TEXT, b"x" * protocol.MAX_FRAME_PAYLOAD)
+    assert frames(big) == [(protocol.OP_TEXT, b"x" * protocol.MAX_FRAME_PAYLOAD)]
+
+
+@pytest.mark.parametrize("line, op", [
+    ("HIT!", protocol.OP_HIT),
+    ("HIT! You sank Destroyer!", protocol.OP_HIT),
+    ("MISS!", protocol.OP_MISS),
+    ("[TURN] Your move, Player 1.", protocol.OP_TURN),
+    ("[CHAT] Player 2: good luck", protocol.OP_CHAT),
+    ("[INFO] You are Player 1.", protocol.OP_TEXT),
+    ("[END] You WIN! Fleet destroyed.", protocol.OP_TEXT),
+])
+def test_lines_round_trip(line, op):
+    (got_op, payload), = frames(protocol.encode_text(line, binary=True))
+    assert got_op == op
+    assert protocol.decode_line(got_op, payload) == line
+    assert protocol.encode_text(line) == (line + "\n").encode()
+
+
+@pytest.mark.parametrize("symbol", protocol.CELL_SYMBOLS)
+def test_cells_round_trip(symbol):
+    (op, payload), = frames(protocol.encode_cell(3, 27, 300, symbol, binary=True))
+    assert op == protocol.OP_CELL
+    assert protocol.unpack_cell(payload) == (3, 27, 300, symbol)
+
+
+@pytest.mark.parametrize("size", [1, 7, 10, 13])
+def test_boards_round_trip(size):
+    # 7x7 and 13x13 leave the last byte of the packed cells part-filled
+    board = Board(size)
+    board.place_ship("Boat", 0, 0, 1, 0)
+    if size > 2:
+        board.place_ship("Cruiser", size - 1, 0, 3 if size > 3 else 1, 0)
+    for r in range(size):
+        board.fire_at(r, (r * 3) % size)
+    (op, payload), = frames(protocol.encode_board(board, 2, binary=True))
+    assert op == protocol.OP_GRID
+    assert protocol.unpack_board(payload) == (2, board.display_grid)
+    (op, payload), = frames(protocol.encode_ship_grid(board, binary=True))
+    assert op == protocol.OP_SHIPS
+    assert protocol.unpack_board(payload) == (0, board.hidden_grid)
+    assert len(payload) == protocol.BOARD_HEADER.size + (size * size + 3) // 4
+
+
+class ChunkedSock:
+    """recv() side of a socket that hands out fixed chunks of a byte string."""
+
+    def __init__(self, data, chunk=8192):
+        self.data = data
+        self.chunk = chunk
+
+    def recv(self, limit):
+        piece, self.data = self.data[:min(limit, self.chunk)], self.data[min(limit, self.chunk):]
+        return piece
+
+
+def test_an_over_long_chat_line_is_cut_to_fit_a_frame():
+    reader = protocol.LineReader(ChunkedSock(b"[CHAT] " + b"x" * 200000 + b"\n[CHAT] next\n"))
+    line = reader.readline()
+    assert len(line) == protocol.MAX_LINE + 1 and line.endswith("\n")
+    chat = f"[CHAT] Player 1: {line[len('[CHAT]'):].strip()}"
+    (op, payload), = frames(protocol.encode_text(chat, binary=True))
+    assert protocol.decode_line(op, payload) == chat
+    # the rest of the long line is dropped, not read as more lines
+    assert reader.readline() == "[CHAT] next\n"
+    assert reader.readline() == ""
+
+
+def test_handshakes_are_profiled_on_the_handshaker_thread(monkeypatch):
+    seen = []
+
+    class Profiler:
+        @contextmanager
+        def phase(self, name):
+            seen.append((name, threading.current_thread()))
+            yield
+
+    def session_profiler(label, always=False):
+        seen.append((label, threading.current_thread()))
+        return Profiler()
+
+    monkeypatch.setattr(protocol.profiling, 'session_profiler', session_profiler)
+    lines = []
+    done = threading.Event()
+
+    def on_line(conn, wfile, line, accepted):
+        lines.append(line)
+        done.set()
+
+    handshaker = protocol.Handshaker(on_line, 5, profile_label='matchmaking')
+    handshaker.start()
+    a, b = socket.socketpair()
+    handshaker.add(a, None, 0.0)
+    b.sendall(b"/player\n")
+    assert done.wait(5)
+    assert lines == ["/player\n"]
+    assert seen == [('matchmaking', handshaker), ('handshake', handshaker)]
+    a.close()
+    b.close()
+
+
+class FakeOutbox(protocol.Outbox):
+    """An Outbox whose backlog the test sets; sends are recorded, not made."""
+
+    def __init__(self):
+        super().__init__(protocol.IOStats())
+        self.queued = 0
+        self.sent = []
+        self.aborted = False
+
+    def backlog(self):
+        return self.queued
+
+    def _send(self, data):
+        self.sent.append(data)
+
+    def abort(self):
+        self.aborted = True
+
+
+def put(outbox, size):
+    outbox.write_bytes(b"x" * size)
+    outbox.flush()
+
+
+def test_within_the_mark_every_write_goes_out():
+    outbox = FakeOutbox()
+    outbox.limit(100)
+    outbox.queued = 50
+    put(outbox, 40)
+    assert len(outbox.sent) == 1
+    assert outbox.stats.queue_peak == 90
+
+
+def test_an_idle_connection_takes_any_write():
+    outbox = FakeOutbox()
+    outbox.limit(100)
+    put(outbox, 1000)
+    assert outbox.sent == [b"x" * 1000]
+    assert not outbox.aborted
+
+
+def test_drop_policy_evicts_past_the_mark():
+    outbox = FakeOutbox()
+    outbox.limit(100, 'drop')
+    outbox.queued = 90
+    put(outbox, 20)
+    assert outbox.sent == [] and outbox.evicted and outbox.aborted
+    assert outbox.stats.evictions == 1
+    # nothing more is sent, even once the backlog is gone
+    outbox.queued = 0
+    put(outbox, 1)
+    assert outbox.sent == []
+
+
+def test_snapshot_policy_skips_until_caught_up():
+    outbox = FakeOutbox()
+    outbox.limit(100, 'snapshot')
+    outbox.queued = 90
+    put(outbox, 20)
+    assert outbox.sent == [] and outbox.lagging and not outbox.aborted
+    # still lagging until the backlog is down to half the mark
+    outbox.queued = 60
+    put(outbox, 5)
+    assert outbox.sent == []
+    assert outbox.stats.dropped_bytes == 25
+    outbox.queued = 50
+    put(outbox, 5)
+    assert outbox.sent == [b"x" * 5]
+    assert outbox.snapshot_due and not outbox.lagging
+
+
+def test_a_blocking_outbox_cannot_be_limited():
+    a, b = socket.socketpair()
+    try:
+        with pytest.raises(TypeError):
+            protocol.SocketOutbox(a).limit(100)
+    finally:
+        a.close()
+        b.close()
+
+
+def backed_up(size=1 << 20):
+    """A QueuedOutbox whose peer has not read anything yet, with bytes queued."""
+    a, b = socket.socketpair()
+    outbox = protocol.QueuedOutbox(a)
+    outbox.write_bytes(b"x" * size)
+    outbox.write_bytes(b"[END] bye\n")
+    outbox.flush()
+    assert outbox.backlog() > 0
+    return outbox, a, b
+
+
+def read_all(sock, into):
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        into.append(data)
+
+
+def test_close_sends_what_is_still_queued():
+    outbox, a, b = backed_up()
+    received = []
+    reader = threading.Thread(target=read_all, args=(b, received))
+    reader.start()
+    outbox.close()
+    a.close()
+    reader.join(5)
+    b.close()
+    data = b"".join(received)
+    assert len(data) == (1 << 20) + len(b"[END] bye\n")
+    assert data.endswith(b"[END] bye\n")
+
+
+def test_close_gives_up_on_a_peer_that_does_not_read():
+    outbox, a, b = backed_up()
+    outbox.close(timeout=0.1)
+    a.close()
+    b.close()
+
+
+def test_an_evicted_outbox_drops_its_queue():
+    outbox, a, b = backed_up()
+    outbox.abort()
+    assert outbox.backlog() == 0
+    outbox.close()
+    a.close()
+    b.close()
+
+
+def test_chat_log_encodes_each_framing_only_once_asked():
+    log = protocol.ChatLog(3)
+    for n in range(4):
+        log.append(f"[CHAT] Player 1: line {n}")
+    assert list(log) == [f"[CHAT] Player 1: line {n}" for n in (1, 2, 3)]
+    assert log.encoded == {}
+    text = FakeOutbox()
+    log.replay(text)
+    assert text.sent == [b"".join(protocol.encode_text(line) for line in log)]
+    assert list(log.encoded) == [False]
+    # a second joiner gets the cached backlog, not a new join
+    again = FakeOutbox()
+    log.replay(again)
+    assert again.sent[0] is text.sent[0]
+    binary = FakeOutbox()
+    binary.binary = True
+    log.replay(binary)
+    assert [protocol.decode_line(*msg) for msg in frames(binary.sent[0])] == list(log)
+    # a new line is encoded for both framings, and the ring drops the oldest
+    log.append("[CHAT] Player 2: hi")
+    assert log.backlog == {}
+    assert log.encode_last() == b"[CHAT] Player 2: hi\n"
+    assert frames(log.encode_last(binary=True)) == [(protocol.OP_CHAT, b"Player 2: hi")]
+    assert len(log.encoded[True]) == len(log.encoded[False]) == 3
+    log.replay(again)
+    assert again.sent[1] == b"".join(protocol.encode_text(line) for line in log)
+
+
+def test_broadcast_shares_one_buffer_per_framing_while_queues_drain():
+    broadcaster = protocol.Broadcaster()
+    broadcaster.start()
+    pairs = [socket.socketpair() for _ in range(4)]
+    outboxes = [protocol.QueuedOutbox(a, binary=n % 2 == 1, broadcaster=broadcaster)
+                for n, (a, _) in enumerate(pairs)]
+    framings = []
+
+    def encode(msg, binary=False):
+        framings.append(binary)
+        return protocol.encode_text(msg, binary)
+
+    # far more than a socketpair buffers, so every subscriber backs up
+    lines = [f"[INFO] {n} " + "x" * 60000 for n in range(40)]
+    for line in lines:
+        protocol.broadcast(outboxes, encode, line)
+    assert sorted(framings) == [False] * 40 + [True] * 40
+    assert all(outbox.backlog() > 0 for outbox in outboxes)
+    last = [outbox.queue[-1].obj for outbox in outboxes]
+    assert last[0] is last[2] and last[1] is last[3] and last[0] is not last[1]
+
+    # take part of the queue, then let the Broadcaster finish it
+    received = [[b.recv(100000)] for _, b in pairs]
+    readers = [threading.Thread(target=read_all, args=(b, into))
+               for (_, b), into in zip(pairs, received)]
+    for reader in readers:
+        reader.start()
+    deadline = time.monotonic() + 10
+    while any(outbox.backlog() for outbox in outboxes) or len(broadcaster.selector.get_map()) > 1:
+        assert time.monotonic() < deadline, "the Broadcaster did not drain every queue"
+        time.sleep(0.01)
+    for a, _ in pairs:
+        a.close()
+    for reader in readers:
+        reader.join(5)
+    for (_, b), outbox, into in zip(pairs, outboxes, received):
+        b.close()
+        data = b"".join(into)
+        if outbox.binary:
+            assert [protocol.decode_line(*msg) for msg in frames(data)] == lines
+        else:
+            assert data.decode().splitlines() == lines
@@ -0,0 +1,42 @@
+"""
+Self-play bookkeeping: a custom fleet reaches every game, wins are counted
+per strategy, and the seats take turns to fire first.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import simulation
+
+
+def test_run_chunk_plays_the_given_fleet(monkeypatch):
+    fleets = []
+    real = simulation.random_board
+
+    def random_board(size, ships, rng):
+        fleets.append(ships)
+        return real(size, ships, rng)
+
+    monkeypatch.setattr(simulation, 'random_board', random_board)
+    ships = (("Boat", 2), ("Raft", 1))
+    wins, first_wins, shots = simulation.run_chunk((1, 0, 10, ('hunt', 'random'), 5, ships))
+    assert fleets == [ships] * 20
+    # the winner sinks 3 cells, so never takes more than the 25 cells to do it
+    assert sum(shots.values()) == 10 and max(shots) <= 25
+
+
+def test_wins_are_counted_per_strategy_with_alternating_openers(monkeypatch):
+    openers = []
+
+    def play_game(strategies, rng, size, ships, first):
+        openers.append(first)
+        return first, 1    # whoever fires first wins
+
+    monkeypatch.setattr(simulation, 'play_game', play_game)
+    # an odd start: game 3 overall is opened by seat 1
+    wins, first_wins, _ = simulation.run_chunk((0, 3, 5, ('hunt', 'random'), 10, simulation.SHIPS))
+    assert openers == [1, 0, 1, 0, 1]
+    assert wins == {'random': 3, 'hunt': 2}
+    assert first_wins == 5
+    wins, _, _ = simulation.run_chunk((0, 0, 4, ('hunt', 'hunt'), 10, simulation.SHIPS))
+    assert wins == {'hunt': 4}